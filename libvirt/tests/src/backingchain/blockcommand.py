@@ -1,13 +1,11 @@
 import os
 import logging as log
-import re
 
 from avocado.utils import process
 
 from virttest import virsh
 from virttest import data_dir
 from virttest import gluster
-from virttest import libvirt_storage
 from virttest import utils_misc
 from virttest.libvirt_xml import vm_xml
 from virttest.staging import lv_utils
@@ -16,32 +14,25 @@ from virttest.libvirt_xml.devices.disk import Disk
 
 from virttest.utils_test import libvirt
 
+from provider.backingchain import image_chain
+
 
 # Using as lower capital is not the best way to do, but this is just a
 # workaround to avoid changing the entire file.
 logging = log.getLogger('avocado.' + __name__)
 
 
-def check_backingchain(img_list, img_info):
+def check_backingchain(img_list, chain):
     """
     Check backing chain info through qemu-img info
 
     :param img_list: expected backingchain list
-    :param img_info: actual qemu-img info output
+    :param chain: actual backing chain got by image_chain.get_chain()
     :return: bool, meets expectation or not
     """
-    pattern = ''
-    chain_length = len(img_list)
-    for i in range(chain_length):
-        pattern += 'image: ' + img_list[i]
-        if i + 1 < chain_length:
-            pattern += '.*backing file: ' + img_list[i + 1]
-        pattern += '.*'
-
-    logging.debug(pattern)
-    exist = re.search(pattern, img_info, re.DOTALL)
-    logging.debug(exist)
-    return exist
+    logging.debug("Expected chain: %s, actual chain: %s",
+                  img_list, chain.filenames())
+    return chain.match(img_list)
 
 
 def check_bc_base_top(command, vmxml, dev, bc_chain):
@@ -242,10 +233,7 @@ def run(test, params, env):
                 if line.lstrip().startswith(('hd', 'sd', 'vd')):
                     file_to_del.append(line.split()[-1])
 
-        qemu_img_cmd = 'qemu-img info --backing-chain %s' % snapshot_image_list[-1]
-        if libvirt_storage.check_qemu_image_lock_support():
-            qemu_img_cmd += " -U"
-        bc_info = process.run(qemu_img_cmd, verbose=True, shell=True).stdout_text
+        bc_info = image_chain.get_chain(snapshot_image_list[-1])
 
         if not disk_type == 'block':
             bc_chain = snapshot_image_list[::-1] + [new_image, disk_target]
@@ -254,7 +242,7 @@ def run(test, params, env):
         bc_result = check_backingchain(bc_chain, bc_info)
         if not bc_result:
             test.fail('qemu-img info output of backing chain is not correct: %s'
-                      % bc_info)
+                      % bc_info.filenames())
 
         # Generate blockpull/blockcommit options
         virsh_blk_cmd = eval('virsh.%s' % blockcommand)
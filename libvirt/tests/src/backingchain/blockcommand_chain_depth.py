@@ -0,0 +1,117 @@
+import json
+import logging
+import os
+import time
+
+from virttest import virsh
+from virttest.libvirt_xml import vm_xml
+from virttest.utils_libvirt import libvirt_disk
+
+from provider.backingchain import blockcommand_base
+from provider.backingchain import check_functions
+from provider.virtual_disk import disk_base
+
+LOG = logging.getLogger('avocado.' + __name__)
+
+
+def run(test, params, env):
+    """
+    Benchmark blockcommit and blockpull time against backing chain depth.
+
+    1) Prepare a file disk.
+    2) For every chain depth:
+        build a snapshot chain of this depth with reused overlays
+        write data into the top layer in guest
+        do the block command and record its time
+        remove the layers which are not used any more
+    3) Report the time of building chains and of block commands.
+    """
+
+    def write_top_layer():
+        """
+        Write data into the top layer so the block command has data to move
+        """
+        if not write_size:
+            return
+        session = vm.wait_for_login()
+        try:
+            session.cmd("dd if=/dev/urandom of=/dev/%s bs=1M count=%s "
+                        "oflag=direct" % (target_disk, write_size),
+                        timeout=600)
+        finally:
+            session.close()
+
+    def run_block_command(depth):
+        """
+        Build a chain of depth layers and do the block command on it
+
+        :param depth: chain depth
+        :return: dict of the result
+        """
+        begin = time.time()
+        paths = test_obj.build_snapshot_chain(
+            depth, os.path.join(test_obj.tmp_dir,
+                                "%s_depth%s_" % (block_cmd, depth)),
+            extra=snap_extra)
+        build_time = time.time() - begin
+        check_obj.check_backingchain(paths[::-1])
+        write_top_layer()
+
+        begin = time.time()
+        getattr(virsh, block_cmd)(vm_name, target_disk, block_option,
+                                  ignore_status=False, debug=True)
+        command_time = time.time() - begin
+
+        current_source = test_obj.get_disk_source()
+        for path in paths:
+            if path != current_source and os.path.exists(path):
+                os.remove(path)
+        result = {'depth': depth,
+                  'build_time': build_time,
+                  'build_time_per_layer': build_time / depth,
+                  'command_time': command_time}
+        LOG.info("%s with chain depth %s: built in %.2fs (%.3fs per layer), "
+                 "%s took %.2fs", block_cmd, depth, build_time,
+                 result['build_time_per_layer'], block_cmd, command_time)
+        return result
+
+    vm_name = params.get("main_vm")
+    target_disk = params.get('target_disk')
+    disk_type = params.get('disk_type')
+    disk_dict = eval(params.get('disk_dict', '{}'))
+    block_cmd = params.get('block_cmd')
+    block_option = params.get('block_option', '')
+    snap_extra = params.get('snap_extra', '')
+    chain_depths = [int(depth) for depth in
+                    params.get('chain_depths', '10 50 100').split()]
+    write_size = int(params.get('write_size', 0))
+
+    vm = env.get_vm(vm_name)
+    vmxml = vm_xml.VMXML.new_from_inactive_dumpxml(vm_name)
+    bkxml = vmxml.copy()
+
+    test_obj = blockcommand_base.BlockCommand(test, vm, params)
+    check_obj = check_functions.Checkfunction(test, vm, params)
+    disk_obj = disk_base.DiskBase(test, vm, params)
+    test_obj.original_disk_source = libvirt_disk.get_first_disk_source(vm)
+
+    try:
+        test_obj.new_image_path = disk_obj.add_vm_disk(disk_type, disk_dict)
+        if not vm.is_alive():
+            vm.start()
+        vm.wait_for_login().close()
+
+        results = [run_block_command(depth) for depth in chain_depths]
+        LOG.info("%-8s %-12s %-16s %-12s", "depth", "build(s)",
+                 "per layer(s)", block_cmd + "(s)")
+        for result in results:
+            LOG.info("%-8s %-12.2f %-16.3f %-12.2f", result['depth'],
+                     result['build_time'], result['build_time_per_layer'],
+                     result['command_time'])
+        with open(os.path.join(test.debugdir,
+                               "%s_chain_depth.json" % block_cmd), 'w') as f:
+            json.dump(results, f, indent=2)
+    finally:
+        test_obj.backingchain_common_teardown()
+        bkxml.sync()
+        disk_obj.cleanup_disk_preparation(disk_type)
@@ -7,6 +7,7 @@ from virttest.utils_libvirt import libvirt_disk
 from virttest.utils_test import libvirt
 
 from provider.backingchain import blockcommand_base
+from provider.backingchain import blockjob_monitor
 
 
 def run(test, params, env):
@@ -72,6 +73,8 @@ def run(test, params, env):
                     lambda: libvirt.check_blockjob(
                         vm.name, target_disk, "bandwidth", bandwith_value), 10, step=0.2):
                 test.fail('Bandwidth should return: %s' % bandwith_value)
+            blockjob_monitor.check_throughput_from_params(
+                vm.name, target_disk, bandwith_value, params, test.debugdir)
 
     # Process cartesian parameters
     vm_name = params.get("main_vm")
@@ -6,6 +6,7 @@ from virttest.libvirt_xml import vm_xml
 from virttest.utils_test import libvirt
 
 from provider.backingchain import blockcommand_base
+from provider.backingchain import blockjob_monitor
 
 
 def run(test, params, env):
@@ -34,7 +35,11 @@ def run(test, params, env):
         virsh_session.sendline(cmd)
         test.log.debug("Blockcopy cmd:%s" % cmd)
 
-        check_blockjob_bandwidth()
+        bandwith_value = check_blockjob_bandwidth()
+        blockjob_monitor.check_throughput_from_params(
+            vm_name, target_disk, bandwith_value, params, test.debugdir)
+        if check_pivot:
+            check_ready_and_pivot()
 
     def run_negative_test():
         """
@@ -71,6 +76,25 @@ def run(test, params, env):
                 lambda: libvirt.check_blockjob(
                     vm.name, target_disk, "bandwidth", bandwith_value), 10):
             test.fail('Bandwidth should return: %s' % bandwith_value)
+        return bandwith_value
+
+    def check_ready_and_pivot():
+        """
+        Lift the bandwidth cap, then check time to ready and pivot latency.
+        """
+        test.log.info("TEST_STEP: Check time to ready and pivot latency")
+        monitor = blockjob_monitor.BlockJobMonitor(vm_name, target_disk)
+        monitor.start()
+        try:
+            virsh.blockjob(vm_name, target_disk, "--bandwidth 0",
+                           ignore_status=False, debug=True)
+            time_to_ready = monitor.wait_for_ready(ready_timeout)
+            test.log.info("Time to ready after lifting the cap: %.2fs",
+                          time_to_ready)
+            monitor.pivot()
+        finally:
+            monitor.stop()
+            monitor.save(test.debugdir, prefix="blockcopy_pivot")
 
     # Process cartesian parameters
     vm_name = params.get("main_vm")
@@ -79,6 +103,8 @@ def run(test, params, env):
     blockcopy_options = params.get('blockcopy_options')
     copy_image = params.get('copy_image')
     err_msg = params.get('err_msg')
+    check_pivot = params.get('check_pivot', 'no') == 'yes'
+    ready_timeout = int(params.get('ready_timeout', 600))
 
     vm = env.get_vm(vm_name)
     vmxml = vm_xml.VMXML.new_from_inactive_dumpxml(vm_name)
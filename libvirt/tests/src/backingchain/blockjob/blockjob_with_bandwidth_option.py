@@ -9,6 +9,7 @@ from virttest.utils_libvirt import libvirt_disk
 from virttest.utils_test import libvirt
 
 from provider.backingchain import blockcommand_base
+from provider.backingchain import blockjob_monitor
 
 
 def run(test, params, env):
@@ -48,6 +49,8 @@ def run(test, params, env):
                                                    "bandwidth", bandwidth_value),
                     10, step=0.1):
                 test.fail('Bandwidth should return: %s' % bandwidth_value)
+            blockjob_monitor.check_throughput_from_params(
+                vm_name, target_disk, bandwidth_value, params, test.debugdir)
 
     def teardown_test():
         """
@@ -7,6 +7,7 @@ from virttest.utils_libvirt import libvirt_disk
 from virttest.utils_test import libvirt
 
 from provider.backingchain import blockcommand_base
+from provider.backingchain import blockjob_monitor
 
 
 def run(test, params, env):
@@ -75,6 +76,8 @@ def run(test, params, env):
                         vm.name, target_disk, "bandwidth", bandwidth_value), 5, step=0.05):
                 test.fail('Bandwidth should return: %s,  but get :%s' % (
                     bandwidth_value, virsh_session.get_stripped_output()))
+            blockjob_monitor.check_throughput_from_params(
+                vm.name, target_disk, bandwidth_value, params, test.debugdir)
 
     # Process cartesian parameters
     vm_name = params.get("main_vm")
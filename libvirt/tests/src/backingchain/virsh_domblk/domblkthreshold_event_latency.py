@@ -0,0 +1,158 @@
+import os
+import time
+
+from virttest import utils_misc
+from virttest import virsh
+from virttest.libvirt_xml import vm_xml
+
+from provider.backingchain import blockcommand_base
+from provider.backingchain import threshold_monitor
+from provider.libvirt_bench import libvirt_bench_base
+from provider.virtual_disk import disk_base
+
+
+def run(test, params, env):
+    """
+    Measure the delay between the allocation crossing a threshold and the
+    block-threshold event, while the guest writes at a controlled rate.
+
+    1) Prepare a qcow2 disk, and optionally a snapshot on it.
+    2) Start sampling the allocation by domstats and watching events.
+    3) Write the disk in guest at the target rate.
+    4) Set a threshold above the current allocation, wait for the event,
+       and record the delay from crossing to event. Repeat it, like a
+       thin provisioning daemon does.
+    5) Report the latency percentiles.
+    """
+    def setup():
+        """
+        Prepare active domain with the test disk
+        """
+        test.log.info("Setup env.")
+        test_obj.new_image_path = disk_obj.add_vm_disk(disk_type, disk_dict,
+                                                       size=disk_size)
+        test_obj.backingchain_common_setup(create_snap=snap_num > 0,
+                                           snap_num=snap_num, extra=snap_extra)
+
+    def measure_threshold(threshold):
+        """
+        Set a threshold and measure its event latency
+
+        :param threshold: threshold in bytes
+        :return: dict of the result
+        """
+        since = time.time()
+        virsh.domblkthreshold(vm_name, target_disk, threshold,
+                              ignore_status=False, debug=True)
+        event = watcher.wait_for_event(target_disk, threshold, event_timeout)
+        if not event:
+            test.fail("No block-threshold event of %s in %ss"
+                      % (threshold, event_timeout))
+        event_time, excess = event
+        crossing_time = utils_misc.wait_for(
+            lambda: sampler.get_crossing_time(target_disk, threshold, since),
+            10, step=sample_interval)
+        if crossing_time is None:
+            test.fail("Allocation of %s is not sampled over %s"
+                      % (target_disk, threshold))
+        result = {'threshold': threshold, 'crossing_time': crossing_time,
+                  'event_time': event_time,
+                  'latency': event_time - crossing_time, 'excess': excess}
+        test.log.debug("Threshold event: %s", result)
+        return result
+
+    def run_test():
+        """
+        Write in guest and measure the threshold events
+        """
+        test.log.info("TEST_STEP1: Write %sMiB/s to %s in guest",
+                      write_rate, target_disk)
+        sampler.start()
+        if not utils_misc.wait_for(
+                lambda: sampler.get_allocation(target_disk) is not None, 10):
+            test.error("Failed to get allocation of %s" % target_disk)
+        session = vm.wait_for_login()
+        session.cmd(threshold_monitor.get_rate_writer_cmd(
+            "/dev/%s" % target_disk, write_rate, write_size))
+        session.close()
+
+        test.log.info("TEST_STEP2: Measure %s threshold events",
+                      threshold_count)
+        results = []
+        for _ in range(threshold_count):
+            threshold = sampler.get_allocation(target_disk) + threshold_step
+            result = measure_threshold(threshold)
+            results.append(result)
+            recorder.record('threshold_event', result['latency'])
+        recorder.stop()
+        sampler.stop()
+
+        test.log.info("TEST_STEP3: Report latency")
+        write_rate_bps = sampler.get_write_rate(target_disk)
+        test.log.info("Achieved allocation growth: %.2f MiB/s",
+                      (write_rate_bps or 0) / 1048576.0)
+        recorder.log_summary("Block threshold event latency")
+        recorder.dump(os.path.join(test.debugdir, "threshold_latency.json"))
+        threshold_monitor.save_latencies(
+            results, os.path.join(test.debugdir, "threshold_latency.csv"))
+        sampler.save(os.path.join(test.debugdir, "allocation.csv"))
+        p95 = recorder.summary()['threshold_event']['p95']
+        if max_latency and p95 > max_latency:
+            test.fail("P95 latency of block-threshold event %.3fs is over "
+                      "%ss" % (p95, max_latency))
+
+    def teardown():
+        """
+        Clean env
+        """
+        sampler.stop()
+        if watcher:
+            watcher.close()
+        session = vm.wait_for_login()
+        session.cmd_status("pkill -f 'of=/dev/%s'" % target_disk)
+        session.close()
+        test_obj.backingchain_common_teardown()
+        bkxml.sync()
+        disk_obj.cleanup_disk_preparation(disk_type)
+
+    # Process cartesian parameters
+    vm_name = params.get("main_vm")
+    vm = env.get_vm(vm_name)
+    target_disk = params.get('target_disk')
+    disk_dict = eval(params.get('disk_dict', '{}'))
+    disk_type = params.get("disk_type")
+    disk_size = params.get("disk_size")
+    snap_num = int(params.get("snap_num", 0))
+    snap_extra = params.get("snap_extra")
+    write_rate = int(params.get("write_rate", 50))
+    write_size = int(params.get("write_size", 4096))
+    threshold_step = int(params.get("threshold_step", 268435456))
+    threshold_count = int(params.get("threshold_count", 10))
+    # Every threshold is one step above the current allocation, keep one
+    # step of margin for the data written before the first threshold
+    max_threshold_count = max(1, write_size * 1048576 // threshold_step - 1)
+    if threshold_count > max_threshold_count:
+        test.log.warning("Writing %sMiB can only cross %s thresholds of %s "
+                         "bytes, reduce threshold_count from %s",
+                         write_size, max_threshold_count, threshold_step,
+                         threshold_count)
+        threshold_count = max_threshold_count
+    sample_interval = float(params.get("sample_interval", 0.1))
+    event_timeout = int(params.get("event_timeout", 60))
+    max_latency = float(params.get("max_event_latency", 0))
+
+    test_obj = blockcommand_base.BlockCommand(test, vm, params)
+    disk_obj = disk_base.DiskBase(test, vm, params)
+    vmxml = vm_xml.VMXML.new_from_inactive_dumpxml(vm_name)
+    bkxml = vmxml.copy()
+    sampler = threshold_monitor.AllocationSampler(vm_name, sample_interval)
+    recorder = libvirt_bench_base.LatencyRecorder()
+    watcher = None
+
+    try:
+        setup()
+        watcher = threshold_monitor.ThresholdEventWatcher(vm_name)
+        run_test()
+
+    finally:
+        teardown()
@@ -1,13 +1,20 @@
 import os
 import logging as log
+import time
 
 from virttest import virsh
 from virttest import data_dir
 from virttest import utils_backup
+from virttest import utils_disk
+from virttest import utils_misc
 from virttest import libvirt_version
 from virttest.libvirt_xml import vm_xml
 from virttest.utils_test import libvirt
 
+from provider.backup import backup_bench
+from provider.backup import nbd_reader
+from provider.libvirt_bench import libvirt_bench_base
+
 
 # Using as lower capital is not the best way to do, but this is just a
 # workaround to avoid changing the entire file.
@@ -24,8 +31,29 @@ def run(test, params, env):
     3. Attach disk_2 to vm
     4. Do incremental backup for disk_1 and full backup for disk_2
     5. Repeat step 3~4 if having more test disks
+
+    Scaling mode, for every disk count in disk_counts:
+    1. Attach disks until the count is reached, and create a checkpoint
+    2. Dirty every disk in guest
+    3. Do incremental backup of all the disks, read their exports
+       concurrently, and record per-disk and job wall time
     """
 
+    def get_disk_target(index):
+        """
+        Get the target of a test disk, the first one is vdb, then vdc ...
+        vdz, vdaa, vdab ...
+
+        :param index: index of the test disk
+        :return: target name of the disk
+        """
+        index += 1
+        name = ''
+        while index >= 0:
+            name = chr(ord('a') + index % 26) + name
+            index = index // 26 - 1
+        return 'vd' + name
+
     def get_disks_need_backup(disk_dict):
         """
         Get the disks which need to be backuped
@@ -57,6 +85,16 @@ def run(test, params, env):
     set_export_name = "yes" == params.get("set_export_name")
     set_export_bitmap = "yes" == params.get("set_export_bitmap")
 
+    # Scaling setting
+    backup_scaling = "yes" == params.get("backup_scaling")
+    disk_counts = [int(count) for count in
+                   params.get("disk_counts", "1 2 4 8 16 32").split()]
+    dirty_ratio = float(params.get("dirty_ratio", 0.1))
+    parallel_nbd_read = "yes" == params.get("parallel_nbd_read")
+    nbd_connections = int(params.get("nbd_connections", 4))
+    if backup_scaling:
+        total_test_disk = max(disk_counts)
+
     try:
         vm_name = params.get("main_vm")
         vm = env.get_vm(vm_name)
@@ -73,11 +111,9 @@ def run(test, params, env):
         # This will generate a dict as:
         # {'vdb': {'path': '', 'is_attached': False, 'checkpoints': []},
         #  'vdc': {'path': '', 'is_attached': False, 'checkpoints': []}}
-        test_disk_prefix = 'vd'
-        test_disk_sequence = 'b'
         test_disk_dict = {}
         for i in range(total_test_disk):
-            test_disk_name = test_disk_prefix + chr(i + ord(test_disk_sequence))
+            test_disk_name = get_disk_target(i)
             test_disk_dict[test_disk_name] = {'path': '',
                                               'is_attached': False,
                                               'checkpoints': []}
@@ -98,6 +134,7 @@ def run(test, params, env):
             test.cancel("We only test nbd export via tcp/ip fow now.")
         backup_params["backup_server"] = backup_server_dict
         test_disk_list = list(test_disk_dict.keys())
+        backup_file_driver = "raw" if parallel_nbd_read else "qcow2"
 
         def prepare_disk_img(test_disk):
             """
@@ -204,41 +241,166 @@ def run(test, params, env):
                                                                 disk_param_list)
             return checkpoint_name, checkpoint_xml
 
-        for test_disk in test_disk_list:
-            if checkpoint_list:
-                enable_incremental_backup = True
-                backup_params["backup_incremental"] = checkpoint_list[-1]
-            # Prepare disk image
-            image_path = prepare_disk_img(test_disk)
-            # Prepare disk xml to be hotplugged
-            test_disk_xml = prepare_disk_xml(test_disk, image_path)
-            # Hotplug disk
-            virsh.attach_device(vm_name, test_disk_xml, debug=True,
-                                ignore_status=False)
-            test_disk_dict[test_disk]['path'] = image_path
-            test_disk_dict[test_disk]['is_attached'] = True
-            # Now we use attached disk as backup disks
-            backup_disks = get_disks_need_backup(test_disk_dict)
+        def read_disk_backup(test_disk, is_incremental, disk_results):
+            """
+            Read the backup data of a disk and record the read time
+
+            :param test_disk: The vm's disk, such as 'vdb'
+            :param is_incremental: True for incremental backup
+            :param disk_results: dict to save the result of the disk
+            """
+            nbd_params = {"nbd_protocol": nbd_protocol,
+                          "nbd_hostname": "localhost",
+                          "nbd_tcp_port": nbd_tcp_port,
+                          "nbd_export": test_disk + "_custom_exp"
+                          if set_export_name else test_disk}
+            bitmap_name = (test_disk + "_custom_bitmap" if set_export_bitmap
+                           else "backup-" + test_disk)
+            backup_file_path = os.path.join(
+                tmp_dir, "scaling_backup_%s.%s" % (test_disk,
+                                                   backup_file_driver))
+            begin = time.time()
+            if parallel_nbd_read:
+                read_stats = nbd_reader.pull_backup_to_file(
+                    nbd_params, backup_file_path,
+                    bitmap_name if is_incremental else None, nbd_connections)
+                duration = time.time() - begin
+                transferred = read_stats['bytes']
+            else:
+                if is_incremental:
+                    utils_backup.pull_incremental_backup_to_file(
+                        nbd_params, backup_file_path, bitmap_name,
+                        test_disk_size)
+                else:
+                    utils_backup.pull_full_backup_to_file(nbd_params,
+                                                          backup_file_path)
+                duration = time.time() - begin
+                transferred = backup_bench.get_image_data_bytes(
+                    backup_file_path)
+            os.remove(backup_file_path)
+            disk_results[test_disk] = {'duration': duration,
+                                       'transferred': transferred}
+
+        def run_backup_job(backup_disks, read_data=False):
+            """
+            Run one pull mode backup job with a new checkpoint
+
+            :param backup_disks: List of the disks to be backuped
+            :param read_data: Read the exports concurrently if True
+            :return: tuple of the job wall time and the per-disk results
+            """
+            nonlocal checkpoint_round
             vmxml = vm_xml.VMXML.new_from_dumpxml(vm_name)
             all_vm_disks = list(vmxml.get_disk_all().keys())
-            # Prepare backup xml
+            is_incremental = {disk: bool(test_disk_dict[disk]['checkpoints'])
+                              for disk in backup_disks}
             backup_xml = prepare_backup_xml(backup_disks, all_vm_disks)
-            logging.debug("ROUND_%s Backup xml: %s",
-                          checkpoint_round, backup_xml)
-            # Prepare checkpoint xml
-            checkpoint_name, checkpoint_xml = prepare_checkpoint_xml(backup_disks,
-                                                                     all_vm_disks)
-            logging.debug("ROUND_%s Checkpoint Xml: %s",
-                          checkpoint_round, checkpoint_xml)
-            # Start backup job
+            checkpoint_name, checkpoint_xml = prepare_checkpoint_xml(
+                backup_disks, all_vm_disks)
             backup_options = backup_xml.xml + " " + checkpoint_xml.xml
+            disk_results = {}
+            begin = time.time()
             virsh.backup_begin(vm_name, backup_options, debug=True,
                                ignore_status=False)
-            # Abort backup job
-            virsh.domjobabort(vm_name, debug=True, ignore_status=False)
-
+            try:
+                if read_data:
+                    errors = libvirt_bench_base.run_in_threads(
+                        read_disk_backup,
+                        [(disk, is_incremental[disk], disk_results)
+                         for disk in backup_disks])
+                    if errors:
+                        test.fail("Failed to read backup data: %s"
+                                  % errors[0])
+            finally:
+                virsh.domjobabort(vm_name, debug=True, ignore_status=False)
+            wall_time = time.time() - begin
             checkpoint_list.append(checkpoint_name)
             checkpoint_round += 1
+            return wall_time, disk_results
+
+        def run_scaling_test():
+            """
+            Run incremental backup of a growing number of disks
+            """
+            disk_size_mb = int(float(utils_misc.normalize_data_size(
+                test_disk_size, 'M')))
+            bench = backup_bench.MultiDiskBenchmark(disk_size_mb * 1048576)
+            session = vm.wait_for_login()
+            guest_devs = {}
+            try:
+                for step, disk_count in enumerate(disk_counts):
+                    for test_disk in test_disk_list[:disk_count]:
+                        if test_disk_dict[test_disk]['is_attached']:
+                            continue
+                        old_parts = utils_disk.get_parts_list(session)
+                        image_path = prepare_disk_img(test_disk)
+                        virsh.attach_device(
+                            vm_name, prepare_disk_xml(test_disk, image_path),
+                            debug=True, ignore_status=False)
+                        added_parts = utils_misc.wait_for(
+                            lambda: utils_disk.get_added_parts(session,
+                                                               old_parts), 30)
+                        if not added_parts:
+                            test.fail("Disk %s is not found in guest"
+                                      % test_disk)
+                        guest_devs[test_disk] = "/dev/%s" % added_parts[0]
+                        test_disk_dict[test_disk]['path'] = image_path
+                        test_disk_dict[test_disk]['is_attached'] = True
+                    backup_disks = test_disk_list[:disk_count]
+                    logging.info("Checkpoint %s disks", disk_count)
+                    run_backup_job(backup_disks)
+                    for test_disk in backup_disks:
+                        backup_bench.dirty_guest_disk(
+                            session, guest_devs[test_disk], disk_size_mb,
+                            dirty_ratio, offset=step)
+                    logging.info("Incremental backup of %s disks", disk_count)
+                    wall_time, disk_results = run_backup_job(backup_disks,
+                                                             read_data=True)
+                    bench.add(disk_count, wall_time, disk_results)
+            finally:
+                session.close()
+            bench.log()
+            bench.save(os.path.join(test.debugdir,
+                                    "multidisk_backup_scaling.json"))
+
+        if backup_scaling:
+            run_scaling_test()
+        else:
+            for test_disk in test_disk_list:
+                if checkpoint_list:
+                    enable_incremental_backup = True
+                    backup_params["backup_incremental"] = checkpoint_list[-1]
+                # Prepare disk image
+                image_path = prepare_disk_img(test_disk)
+                # Prepare disk xml to be hotplugged
+                test_disk_xml = prepare_disk_xml(test_disk, image_path)
+                # Hotplug disk
+                virsh.attach_device(vm_name, test_disk_xml, debug=True,
+                                    ignore_status=False)
+                test_disk_dict[test_disk]['path'] = image_path
+                test_disk_dict[test_disk]['is_attached'] = True
+                # Now we use attached disk as backup disks
+                backup_disks = get_disks_need_backup(test_disk_dict)
+                vmxml = vm_xml.VMXML.new_from_dumpxml(vm_name)
+                all_vm_disks = list(vmxml.get_disk_all().keys())
+                # Prepare backup xml
+                backup_xml = prepare_backup_xml(backup_disks, all_vm_disks)
+                logging.debug("ROUND_%s Backup xml: %s",
+                              checkpoint_round, backup_xml)
+                # Prepare checkpoint xml
+                checkpoint_name, checkpoint_xml = prepare_checkpoint_xml(backup_disks,
+                                                                         all_vm_disks)
+                logging.debug("ROUND_%s Checkpoint Xml: %s",
+                              checkpoint_round, checkpoint_xml)
+                # Start backup job
+                backup_options = backup_xml.xml + " " + checkpoint_xml.xml
+                virsh.backup_begin(vm_name, backup_options, debug=True,
+                                   ignore_status=False)
+                # Abort backup job
+                virsh.domjobabort(vm_name, debug=True, ignore_status=False)
+
+                checkpoint_list.append(checkpoint_name)
+                checkpoint_round += 1
 
         # Destroy vm to make sure correct info can be read from images
         if vm.is_alive():
@@ -20,6 +20,8 @@ from virttest.utils_conn import TLSConnection
 from virttest.utils_libvirt import libvirt_secret
 from virttest.utils_test import libvirt
 
+from provider.backup import backup_bench
+from provider.backup import nbd_reader
 
 # Using as lower capital is not the best way to do, but this is just a
 # workaround to avoid changing the entire file.
@@ -60,6 +62,14 @@ def run(test, params, env):
     backup_rounds = int(params.get("backup_rounds", 3))
     backup_error = "yes" == params.get("backup_error")
     expect_backup_canceled = "yes" == params.get("expect_backup_canceled")
+    # Benchmark config
+    backup_benchmark = "yes" == params.get("backup_benchmark")
+    initial_fill_ratio = float(params.get("initial_fill_ratio", 0.5))
+    dirty_ratio = float(params.get("dirty_ratio", 0.1))
+    # Read the backup data by parallel nbd connections instead of qemu-img
+    parallel_nbd_read = "yes" == params.get("parallel_nbd_read")
+    nbd_connections = int(params.get("nbd_connections", 4))
+    backup_file_driver = "raw" if parallel_nbd_read else "qcow2"
     # NBD service config
     nbd_protocol = params.get("nbd_protocol", "unix")
     nbd_socket = params.get("nbd_socket", "/tmp/pull_backup.socket")
@@ -228,6 +238,12 @@ def run(test, params, env):
         checkpoint_list = []
         is_incremental = False
         backup_file_list = []
+        if backup_benchmark:
+            disk_size_mb = int(float(utils_misc.normalize_data_size(
+                original_disk_size, "M")))
+            bench = backup_bench.BackupBenchmark(
+                "pull", "tls" if tls_enabled else nbd_protocol,
+                disk_size_mb * 1048576)
         for backup_index in range(backup_rounds):
             # Prepare backup xml
             backup_params = {"backup_mode": "pull"}
@@ -323,12 +339,18 @@ def run(test, params, env):
                           backup_index, checkpoint_xml)
 
             # Create some data in vdb
-            dd_count = "1"
-            dd_seek = str(backup_index * 10 + 10)
-            dd_bs = "1M"
             session = vm.wait_for_login()
-            utils_disk.dd_data_to_vm_disk(session, test_disk_in_vm, dd_bs,
-                                          dd_seek, dd_count)
+            if backup_benchmark:
+                guest_written = backup_bench.dirty_guest_disk(
+                    session, test_disk_in_vm, disk_size_mb,
+                    dirty_ratio if backup_index else initial_fill_ratio,
+                    offset=backup_index)
+            else:
+                dd_count = "1"
+                dd_seek = str(backup_index * 10 + 10)
+                dd_bs = "1M"
+                utils_disk.dd_data_to_vm_disk(session, test_disk_in_vm, dd_bs,
+                                              dd_seek, dd_count)
             session.close()
             # Start backup
             backup_options = backup_xml.xml + " " + checkpoint_xml.xml
@@ -351,7 +373,8 @@ def run(test, params, env):
                 elif expect_backup_canceled:
                     test.fail("Backup job should be canceled but not.")
             backup_file_path = os.path.join(
-                    tmp_dir, "backup_file_%s.qcow2" % str(backup_index))
+                    tmp_dir, "backup_file_%s.%s" % (str(backup_index),
+                                                    backup_file_driver))
             backup_file_list.append(backup_file_path)
             nbd_params = {"nbd_protocol": nbd_protocol,
                           "nbd_export": nbd_export_name}
@@ -364,7 +387,24 @@ def run(test, params, env):
                     nbd_params["tls_dir"] = pki_path
                     nbd_params["tls_server_ip"] = tls_server_ip
             time.sleep(10)
-            if not is_incremental:
+            bitmap_dirty = None
+            if backup_benchmark and is_incremental:
+                bitmap_dirty = backup_bench.get_dirty_bitmap_bytes(
+                    nbd_params, nbd_bitmap_name)
+            backup_start = time.time()
+            if parallel_nbd_read:
+                try:
+                    read_stats = nbd_reader.pull_backup_to_file(
+                        nbd_params, backup_file_path,
+                        nbd_bitmap_name if is_incremental else None,
+                        nbd_connections)
+                except Exception as details:
+                    if tls_enabled and tls_error:
+                        raise utils_backup.BackupTLSError(details)
+                    raise
+                logging.debug("Backup to: %s, %s", backup_file_path,
+                              read_stats)
+            elif not is_incremental:
                 # Do full backup
                 try:
                     utils_backup.pull_full_backup_to_file(nbd_params,
@@ -380,6 +420,13 @@ def run(test, params, env):
                 utils_backup.pull_incremental_backup_to_file(
                         nbd_params, backup_file_path, nbd_bitmap_name,
                         original_disk_size)
+            if backup_benchmark:
+                bench.add(backup_index,
+                          "incremental" if is_incremental else "full",
+                          time.time() - backup_start,
+                          backup_bench.get_image_data_bytes(
+                              backup_file_path, backup_file_driver),
+                          bitmap_dirty, guest_written)
             # Check if scratch file encrypted
             if scratch_luks_encrypted and scratch_path:
                 cmd = "qemu-img info -U %s" % scratch_path
@@ -394,16 +441,25 @@ def run(test, params, env):
         if vm.is_alive():
             vm.destroy(gracefully=False)
 
-        # Compare the backup data and original data
-        original_data_file = os.path.join(tmp_dir, "original_data.qcow2")
-        cmd = "qemu-img convert -f qcow2 %s -O qcow2 %s" % (disk_path, original_data_file)
-        process.run(cmd, shell=True, verbose=True)
-        for backup_file in backup_file_list:
-            if not utils_backup.cmp_backup_data(original_data_file, backup_file):
-                test.fail("Backup and original data are not identical for"
-                          "'%s' and '%s'" % (disk_path, backup_file))
-            else:
-                logging.debug("'%s' contains correct backup data", backup_file)
+        if backup_benchmark:
+            bench.log()
+            bench.save(os.path.join(test.debugdir,
+                                    "pull_backup_benchmark.json"))
+            # Dumping gigabytes of data to compare them takes too long
+            logging.info("Skip comparing backup data in benchmark mode")
+        else:
+            # Compare the backup data and original data
+            original_data_file = os.path.join(tmp_dir, "original_data.qcow2")
+            cmd = "qemu-img convert -f qcow2 %s -O qcow2 %s" % (disk_path, original_data_file)
+            process.run(cmd, shell=True, verbose=True)
+            for backup_file in backup_file_list:
+                if not utils_backup.cmp_backup_data(
+                        original_data_file, backup_file,
+                        backup_file_driver=backup_file_driver):
+                    test.fail("Backup and original data are not identical for"
+                              "'%s' and '%s'" % (disk_path, backup_file))
+                else:
+                    logging.debug("'%s' contains correct backup data", backup_file)
     except utils_backup.BackupBeginError as detail:
         if backup_error:
             logging.debug("Backup failed as expected.")
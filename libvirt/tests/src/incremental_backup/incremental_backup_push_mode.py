@@ -1,6 +1,7 @@
 import logging as log
 import os
 import signal
+import time
 
 from avocado.utils import process
 
@@ -15,6 +16,7 @@ from virttest import virsh
 from virttest.libvirt_xml import vm_xml
 from virttest.utils_test import libvirt
 
+from provider.backup import backup_bench
 
 # Using as lower capital is not the best way to do, but this is just a
 # workaround to avoid changing the entire file.
@@ -66,6 +68,11 @@ def run(test, params, env):
     backup_rounds = int(params.get("backup_rounds", 3))
     backup_error = "yes" == params.get("backup_error")
     expect_backup_canceled = "yes" == params.get("expect_backup_canceled")
+    backup_timeout = int(params.get("backup_timeout", 60))
+    # Benchmark config
+    backup_benchmark = "yes" == params.get("backup_benchmark")
+    initial_fill_ratio = float(params.get("initial_fill_ratio", 0.5))
+    dirty_ratio = float(params.get("dirty_ratio", 0.1))
     tmp_dir = data_dir.get_data_dir()
     virsh_dargs = {'debug': True, 'ignore_status': True}
 
@@ -181,6 +188,11 @@ def run(test, params, env):
         checkpoint_list = []
         is_incremental = False
         backup_path_list = []
+        if backup_benchmark:
+            disk_size_mb = int(float(utils_misc.normalize_data_size(
+                original_disk_size, "M")))
+            bench = backup_bench.BackupBenchmark("push", target_type,
+                                                 disk_size_mb * 1048576)
         for backup_index in range(backup_rounds):
             # Prepare backup xml
             backup_params = {"backup_mode": "push"}
@@ -253,16 +265,23 @@ def run(test, params, env):
             backup_options = backup_xml.xml + " " + checkpoint_xml.xml
 
             # Create some data in vdb
-            dd_count = params.get("dd_count", "1")
-            dd_seek = str(backup_index * 10 + 10)
-            dd_bs = "1M"
             session = vm.wait_for_login()
-            utils_disk.dd_data_to_vm_disk(session, test_disk_in_vm, dd_bs,
-                                          dd_seek, dd_count)
+            if backup_benchmark:
+                guest_written = backup_bench.dirty_guest_disk(
+                    session, test_disk_in_vm, disk_size_mb,
+                    dirty_ratio if backup_index else initial_fill_ratio,
+                    offset=backup_index)
+            else:
+                dd_count = params.get("dd_count", "1")
+                dd_seek = str(backup_index * 10 + 10)
+                dd_bs = "1M"
+                utils_disk.dd_data_to_vm_disk(session, test_disk_in_vm, dd_bs,
+                                              dd_seek, dd_count)
             session.close()
 
             if reuse_target_file:
                 backup_options += " --reuse-external"
+            backup_start = time.time()
             backup_result = virsh.backup_begin(vm_name, backup_options,
                                                debug=True)
             if backup_result.exit_status:
@@ -282,31 +301,49 @@ def run(test, params, env):
 
             # Wait for the backup job actually finished
             if not utils_misc.wait_for(
-                    lambda: backup_job_done(vm_name, original_disk_target), 60):
-                test.fail("Backup job not finished in 60s")
+                    lambda: backup_job_done(vm_name, original_disk_target),
+                    backup_timeout, step=0.1 if backup_benchmark else 1):
+                test.fail("Backup job not finished in %ss" % backup_timeout)
+            if backup_benchmark:
+                duration = time.time() - backup_start
+                job_stats = backup_bench.get_backup_job_stats(vm_name)
+                bench.add(backup_index,
+                          "incremental" if is_incremental else "full",
+                          duration, job_stats.get(
+                              "disk_processed",
+                              backup_bench.get_image_data_bytes(
+                                  backup_path_list[-1], target_driver)),
+                          job_stats.get("disk_total"), guest_written)
 
         for checkpoint_name in checkpoint_list:
             virsh.checkpoint_delete(vm_name, checkpoint_name, debug=True)
         if vm.is_alive():
             vm.destroy(gracefully=False)
 
-        # Compare the backup data and original data
-        original_data_file = os.path.join(tmp_dir, "original_data.qcow2")
-        cmd = "qemu-img convert -f qcow2 %s -O qcow2 %s" % (disk_path, original_data_file)
-        process.run(cmd, shell=True, verbose=True)
-
-        for backup_path in backup_path_list:
-            if target_driver == "qcow2":
-                # Clear backup image's backing file before comparison
-                qemu_cmd = ("qemu-img rebase -u -f qcow2 -b '' -F qcow2 %s"
-                            % backup_path)
-                process.run(qemu_cmd, shell=True, verbose=True)
-            if not utils_backup.cmp_backup_data(original_data_file, backup_path,
-                                                backup_file_driver=target_driver):
-                test.fail("Backup and original data are not identical for"
-                          "'%s' and '%s'" % (disk_path, backup_path))
-            else:
-                logging.debug("'%s' contains correct backup data", backup_path)
+        if backup_benchmark:
+            bench.log()
+            bench.save(os.path.join(test.debugdir,
+                                    "push_backup_benchmark.json"))
+            # Dumping gigabytes of data to compare them takes too long
+            logging.info("Skip comparing backup data in benchmark mode")
+        else:
+            # Compare the backup data and original data
+            original_data_file = os.path.join(tmp_dir, "original_data.qcow2")
+            cmd = "qemu-img convert -f qcow2 %s -O qcow2 %s" % (disk_path, original_data_file)
+            process.run(cmd, shell=True, verbose=True)
+
+            for backup_path in backup_path_list:
+                if target_driver == "qcow2":
+                    # Clear backup image's backing file before comparison
+                    qemu_cmd = ("qemu-img rebase -u -f qcow2 -b '' -F qcow2 %s"
+                                % backup_path)
+                    process.run(qemu_cmd, shell=True, verbose=True)
+                if not utils_backup.cmp_backup_data(original_data_file, backup_path,
+                                                    backup_file_driver=target_driver):
+                    test.fail("Backup and original data are not identical for"
+                              "'%s' and '%s'" % (disk_path, backup_path))
+                else:
+                    logging.debug("'%s' contains correct backup data", backup_path)
     except utils_backup.BackupBeginError as details:
         if backup_error:
             logging.debug("Backup failed as expected.")
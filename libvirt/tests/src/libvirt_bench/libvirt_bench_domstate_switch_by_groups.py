@@ -1,61 +1,78 @@
+import os
+
 from avocado.core import exceptions
 
 from virttest import utils_test
 
+from provider.libvirt_bench import libvirt_bench_base
+
 
 def run(test, params, env):
     """
     Test steps:
 
     1) Get the params from params.
-    2) Divide vms into two groups and run sub test for each group.
-    3) clean up.
+    2) Divide vms into groups and run sub test for each group.
+    3) Report the latency of all groups.
+    4) clean up.
     """
     # Get VMs.
     vms = env.get_all_vms()
-    if len(vms) < 2:
-        test.cancel("We need at least 2 vms for this test.")
+    group_count = int(params.get("LB_domstate_switch_group_count", 2))
+    if group_count < 2:
+        test.error("LB_domstate_switch_group_count should be at least 2.")
+    if len(vms) < group_count:
+        test.cancel("We need at least %s vms for this test." % group_count)
     timeout = params.get("LB_domstate_switch_loop_time", 600)
-    # Divide vms into two groups.
-    odd_group_vms = []
-    even_group_vms = []
-    for index in range(len(vms)):
-        if (index % 2):
-            even_group_vms.append(vms[index])
-        else:
-            odd_group_vms.append(vms[index])
-
-    # Run sub test for odd_group_vms.
-    odd_env = env.copy()
-    # Unregister vm which belong to even_group from odd_env.
-    for vm in even_group_vms:
-        odd_env.unregister_vm(vm.name)
-    odd_bt = utils_test.BackgroundTest(utils_test.run_virt_sub_test,
-                                       params=[test, params, odd_env,
-                                               "libvirt_bench_domstate_switch_in_loop"])
-    odd_bt.start()
-
-    # Run sub test for even_group_vms.
-    even_env = env.copy()
-    # Unregister vm which belong to odd_group from even_env.
-    for vm in odd_group_vms:
-        even_env.unregister_vm(vm.name)
-    even_bt = utils_test.BackgroundTest(utils_test.run_virt_sub_test,
-                                        params=[test, params, even_env,
-                                                "libvirt_bench_domstate_switch_in_loop"])
-    even_bt.start()
+    # Divide vms into groups.
+    groups = libvirt_bench_base.split_into_groups(vms, group_count)
+
+    background_tests = []
+    result_files = []
+    for index, group_vms in enumerate(groups):
+        group_env = env.copy()
+        # Unregister vms which do not belong to this group from group_env.
+        for vm in vms:
+            if vm not in group_vms:
+                group_env.unregister_vm(vm.name)
+        group_params = params.copy()
+        result_file = os.path.join(test.debugdir,
+                                   "domstate_switch_group_%s.json" % index)
+        group_params["LB_domstate_switch_result_file"] = result_file
+        result_files.append(result_file)
+        group_bt = utils_test.BackgroundTest(
+            utils_test.run_virt_sub_test,
+            params=[test, group_params, group_env,
+                    "libvirt_bench_domstate_switch_in_loop"])
+        group_bt.start()
+        background_tests.append(group_bt)
 
     # Wait for background_tests joining.
     err_msg = ""
-    try:
-        odd_bt.join(int(timeout) * 2)
-    except exceptions.TestFail as detail:
-        err_msg += ("Group odd_group failed to run sub test.\n"
-                    "Detail: %s." % detail)
-    try:
-        even_bt.join(int(timeout) * 2)
-    except exceptions.TestFail as detail:
-        err_msg += ("Group even_group failed to run sub test.\n"
-                    "Detail: %s." % detail)
+    for index, group_bt in enumerate(background_tests):
+        try:
+            group_bt.join(int(timeout) * 2)
+        except exceptions.TestFail as detail:
+            err_msg += ("Group %s failed to run sub test.\n"
+                        "Detail: %s." % (index, detail))
+
+    # Aggregate the latency of all groups, the groups run in parallel so
+    # the elapsed time is the one of the slowest group.
+    total_recorder = None
+    for result_file in result_files:
+        if not os.path.exists(result_file):
+            continue
+        group_recorder = libvirt_bench_base.LatencyRecorder.load(result_file)
+        if total_recorder is None:
+            total_recorder = group_recorder
+            continue
+        elapsed = max(total_recorder.elapsed(), group_recorder.elapsed())
+        total_recorder.merge(group_recorder.samples)
+        total_recorder.end_time = total_recorder.start_time + elapsed
+    if total_recorder:
+        total_recorder.log_summary("Domain state switch latency of %s groups"
+                                   % len(groups))
+        total_recorder.dump(os.path.join(test.debugdir,
+                                         "domstate_switch_total.json"))
     if err_msg:
         test.fail(err_msg)
@@ -5,6 +5,8 @@ from avocado.core import exceptions
 
 from virttest import virsh
 
+from provider.libvirt_bench import libvirt_bench_base
+
 
 # Using as lower capital is not the best way to do, but this is just a
 # workaround to avoid changing the entire file.
@@ -34,21 +36,58 @@ def run(test, params, env):
         :Param state_list: States to verify the result of virsh_func.
                            None means do not check the state.
         """
-        vm_names = []
-        for vm in vms:
-            vm_names.append(vm.name)
-        for vm_name in vm_names:
-            cmd_result = virsh_func(vm_name)
+        def _switch_state(vm_name):
+            if persistent:
+                # Reuse the connection of the persistent virsh session.
+                func = getattr(virsh_sessions[vm_name], virsh_func.__name__)
+            else:
+                func = virsh_func
+            since = time.time()
+            cmd_result = recorder.timeit(virsh_func.__name__, func, vm_name)
             if cmd_result.exit_status:
                 test.fail(cmd_result)
-            if state_list is None:
-                continue
+            if event_watcher:
+                # The lifecycle event tells both the state and the real
+                # transition latency.
+                event = event_watcher.OPERATION_EVENTS[virsh_func.__name__]
+                latency = event_watcher.wait_for_event(vm_name, event, since,
+                                                       event_timeout)
+                if latency is None:
+                    test.fail("Command %s succeed, but event %s of %s is not "
+                              "received in %ss." % (virsh_func.__name__,
+                                                    event, vm_name,
+                                                    event_timeout))
+                recorder.record("%s_event" % virsh_func.__name__, latency)
+                return
+            if state_list is None or persistent:
+                return
             actual_state = virsh.domstate(vm_name).stdout.strip()
+            _check_state(vm_name, actual_state)
+
+        def _check_state(vm_name, actual_state):
             if actual_state not in state_list:
-                test.fail("Command %s succeed, but the state is %s,"
+                test.fail("Command %s succeed, but the state of %s is %s,"
                           "but not %s." %
-                          (virsh_func.__name__, actual_state,
+                          (virsh_func.__name__, vm_name, actual_state,
                            str(state_list)))
+
+        vm_names = []
+        for vm in vms:
+            vm_names.append(vm.name)
+        if concurrent:
+            errors = libvirt_bench_base.run_in_threads(
+                _switch_state, [(vm_name,) for vm_name in vm_names])
+            if errors:
+                test.fail("\n".join([str(err) for err in errors]))
+        else:
+            for vm_name in vm_names:
+                _switch_state(vm_name)
+        if persistent and state_list is not None and not event_watcher:
+            # Verify the states of all vms with one query.
+            domain_states = libvirt_bench_base.get_domain_states(
+                virsh_sessions[None])
+            for vm_name in vm_names:
+                _check_state(vm_name, domain_states.get(vm_name))
         logging.debug("Operation %s on %s succeed.",
                       virsh_func.__name__, vm_names)
 
@@ -71,6 +110,33 @@ def run(test, params, env):
     resume_in_loop = ("yes" == params.get("LB_domstate_switch_resume", "no"))
     resume_post_state = params.get("LB_domstate_switch_resume_post_state",
                                    "running").split(',')
+    # Whether to switch the states of vms concurrently.
+    concurrent = ("yes" == params.get("LB_domstate_switch_concurrent", "no"))
+    # File to save the latency samples, used by the group test.
+    result_file = params.get("LB_domstate_switch_result_file")
+    # Issue the operations through persistent virsh sessions instead of
+    # forking virsh and connecting to the daemon for every call.
+    persistent = ("yes" == params.get("LB_domstate_switch_persistent", "no"))
+    virsh_sessions = {}
+    # Unique sessions to close, VirshPersistent is a dict so not hashable.
+    opened_sessions = []
+    if persistent:
+        virsh_sessions[None] = virsh.VirshPersistent()
+        opened_sessions.append(virsh_sessions[None])
+        for vm in vms:
+            # Every concurrent worker needs a session of its own.
+            if concurrent:
+                virsh_sessions[vm.name] = virsh.VirshPersistent()
+                opened_sessions.append(virsh_sessions[vm.name])
+            else:
+                virsh_sessions[vm.name] = virsh_sessions[None]
+    # Verify the states by waiting for lifecycle events instead of polling
+    # the states of vms.
+    event_watcher = None
+    if "yes" == params.get("LB_domstate_switch_event", "no"):
+        event_watcher = libvirt_bench_base.LifecycleEventWatcher()
+    event_timeout = int(params.get("LB_domstate_switch_event_timeout", "240"))
+    recorder = libvirt_bench_base.LatencyRecorder()
     # Get the loop_time.
     loop_time = int(params.get("LB_domstate_switch_loop_time", "600"))
     current_time = int(time.time())
@@ -112,6 +178,15 @@ def run(test, params, env):
             test.fail("Succeed for %s loop, and got an error.\n"
                       "Detail: %s." % (loop_counter, detail))
     finally:
+        recorder.stop()
+        recorder.log_summary("Domain state switch latency of %s"
+                             % [vm.name for vm in vms])
+        if result_file:
+            recorder.dump(result_file)
+        for virsh_session in opened_sessions:
+            virsh_session.close_session()
+        if event_watcher:
+            event_watcher.close()
         # Resume vm if vm is paused.
         for vm in vms:
             if vm.is_paused():
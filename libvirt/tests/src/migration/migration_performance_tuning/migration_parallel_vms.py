@@ -0,0 +1,70 @@
+import json
+import os
+
+from provider.migration import base_steps
+from provider.migration import migration_base
+
+
+def run(test, params, env):
+    """
+    Test migrating multiple vms concurrently, e.g. to evacuate a host.
+
+    :param test: test object
+    :param params: Dictionary with the test parameters
+    :param env: Dictionary with test environment.
+    """
+    def setup_test():
+        """
+        Setup connection and all vms
+
+        """
+        test.log.info("Setup for migrating vms in parallel.")
+        migration_objs[0].setup_connection()
+        for migration_obj in migration_objs[1:]:
+            migration_obj.setup_default()
+
+    def verify_test(result):
+        """
+        Verify the result of all migrations
+
+        :param result: dict, returned by do_parallel_migration()
+        """
+        result_file = os.path.join(test.debugdir, "parallel_migration.json")
+        with open(result_file, "w") as json_file:
+            json.dump(result, json_file, indent=2)
+        failed_vms = dict((vm_name, vm_result['error']) for vm_name, vm_result
+                          in result['vms'].items() if vm_result['error'])
+        if failed_vms:
+            test.fail("Failed to migrate vms: %s" % failed_vms)
+        if max_evacuation_time and result['total_time'] > float(max_evacuation_time):
+            test.fail("Migrating %s vms takes %.2fs, more than %ss"
+                      % (len(vms), result['total_time'], max_evacuation_time))
+
+    vm_names = params.get("migrate_vms", params.get("vms", "")).split()
+    dest_uri = params.get("virsh_migrate_desturi")
+    options = params.get("virsh_migrate_options", "--live --verbose")
+    extra = params.get("virsh_migrate_extra", "")
+    virsh_options = params.get("virsh_options", "")
+    parallel = int(params.get("migrate_parallel_num", "2"))
+    bandwidth_budget = params.get("migrate_bandwidth_budget")
+    max_evacuation_time = params.get("max_evacuation_time")
+
+    if len(vm_names) < 2:
+        test.cancel("At least 2 vms are required in migrate_vms.")
+    vms = [env.get_vm(vm_name) for vm_name in vm_names]
+    migration_objs = []
+    for vm in vms:
+        vm_params = params.copy()
+        vm_params.update({"migrate_main_vm": vm.name, "main_vm": vm.name})
+        migration_objs.append(base_steps.MigrationBase(test, vm, vm_params))
+
+    try:
+        setup_test()
+        result = migration_base.do_parallel_migration(
+            vms, dest_uri, options, extra, virsh_options, parallel,
+            bandwidth_budget)
+        verify_test(result)
+    finally:
+        for migration_obj in migration_objs[1:]:
+            migration_obj.cleanup_default()
+        migration_objs[0].cleanup_connection()
@@ -65,6 +65,8 @@ def run(test, params, env):
             comp_info = "Compression cache: %.3f MiB" % (int(cache_size)/(1024*1024))
             if comp_info not in jobinfo:
                 test.fail("Not found '%s' in domjobinfo." % comp_info)
+        if "yes" == params.get("migration_benchmark", "no"):
+            migration_obj.verify_benchmark()
 
     test_case = params.get('test_case', '')
     vm_name = params.get("migrate_main_vm")
@@ -1,4 +1,6 @@
+import glob
 import logging as log
+import os
 import time
 import threading
 import re
@@ -12,6 +14,8 @@ from virttest import libvirt_vm
 from virttest.libvirt_xml import vm_xml
 from virttest.utils_test import libvirt as utlv
 
+from provider.virtual_network import network_throughput
+
 
 # Using as lower capital is not the best way to do, but this is just a
 # workaround to avoid changing the entire file.
@@ -84,39 +88,88 @@ def get_vhost_pids(test, vm):
     return output.splitlines()
 
 
-def top_vhost(test, pids, expected_running_vhosts=1, timeout=15):
+def get_vhost_tasks(test, vm):
+    """
+    Get the vhost threads of vm.
+
+    They are the tasks named "vhost-<qemu pid>", either of the vhost kernel
+    threads, or of the qemu process with vhost tasks on newer kernels.
+
+    :return: list of /proc/<pid>/task/<tid> paths
     """
-    Use top tool to get vhost state.
+    vmpid = vm.get_pid()
+    tasks = []
+    for pid in get_vhost_pids(test, vm) + [str(vmpid)]:
+        for task in glob.glob("/proc/%s/task/*" % pid):
+            try:
+                with open(os.path.join(task, "comm")) as comm_file:
+                    comm = comm_file.read().strip()
+            except IOError:
+                continue
+            if comm.startswith("vhost-"):
+                tasks.append(task)
+    return tasks
+
+
+def get_tasks_cpu_ticks(tasks):
     """
-    pids_str = ','.join(pids)
-    top_cmd = "top -n 1 -p %s -b" % pids_str
+    Get the cpu time of tasks from their stat files.
+
+    :param tasks: list of /proc/<pid>/task/<tid> paths
+    :return: dict, task path -> utime + stime in clock ticks
+    """
+    ticks = {}
+    for task in tasks:
+        try:
+            with open(os.path.join(task, "stat")) as stat_file:
+                stat = stat_file.read()
+        except IOError:
+            continue
+        # The fields after comm start from the 3rd one, state
+        fields = stat.rsplit(")", 1)[1].split()
+        ticks[task] = int(fields[11]) + int(fields[12])
+    return ticks
+
+
+def get_tasks_cpu_usage(ticks_before, ticks_after, elapsed):
+    """
+    Get the cpu usage of tasks between two samples.
+
+    :return: dict, task path -> cpu usage in percent of one cpu
+    """
+    clock_ticks = os.sysconf("SC_CLK_TCK")
+    return {task: 100.0 * (ticks_after[task] - ticks_before[task]) /
+            clock_ticks / elapsed
+            for task in ticks_after if task in ticks_before}
+
+
+def top_vhost(test, vm, expected_running_vhosts=1, timeout=15):
+    """
+    Get vhost state from the cpu time of the vhost threads.
+    """
+    tasks = get_vhost_tasks(test, vm)
     timeout = int(timeout)
     while True:
-        output = process.run(top_cmd, shell=True).stdout_text.strip()
-        logging.debug(output)
-        process_cpus = []
-        for line in output.splitlines():
-            if line.count("vhost"):
-                process_cpus.append(line.split()[8])
-        if len(process_cpus) != len(pids):
+        ticks_before = get_tasks_cpu_ticks(tasks)
+        time.sleep(3)
+        ticks_after = get_tasks_cpu_ticks(tasks)
+        usage = get_tasks_cpu_usage(ticks_before, ticks_after, 3)
+        logging.debug("Cpu usage of vhost threads: %s", usage)
+        if len(usage) != len(tasks) or not tasks:
             test.fail("Couldn't get enough vhost processes.")
-        running_vhosts = 0
-        for cpu in process_cpus:
-            if float(cpu):
-                running_vhosts += 1
+        running_vhosts = len([cpu for cpu in usage.values() if cpu])
         if running_vhosts == int(expected_running_vhosts):
             break   # Got expected result
         else:
             if timeout > 0:
                 timeout -= 3
-                time.sleep(3)
                 logging.debug("Trying again to avoid occasional...")
                 continue
             else:
                 test.fail("Couldn't get enough running vhosts:%s "
                           "from all vhosts:%s, other CPU status of "
                           "vhost is 0."
-                          % (running_vhosts, len(pids)))
+                          % (running_vhosts, len(tasks)))
 
 
 def set_cpu_affinity(vm, affinity_cpu=0):
@@ -296,6 +349,59 @@ def start_iperf(test, vm, params):
     return host_session, client_sessions
 
 
+def run_scaling_sweep(test, vm, params):
+    """
+    Measure throughput and vhost cpu usage over queue and flow counts.
+    """
+    vcpu_count = int(params.get("vcpu_count", 1))
+    queue_counts = [int(count) for count in params.get(
+        "queue_counts", " ".join(str(count) for count in
+                                 range(1, vcpu_count + 1))).split()]
+    flow_counts = [int(count) for count in
+                   params.get("flow_counts", "1 2 4 8 16").split()]
+    backend = params.get("throughput_backend", "iperf3")
+    results = []
+    for queue_count in queue_counts:
+        params["queue_count"] = queue_count
+        prepare_vm_queue(test, vm, params)
+        tasks = get_vhost_tasks(test, vm)
+        # Count the packets of the vm only on the tap
+        server = network_throughput.Endpoint(
+            params.get("local_ip"), name="host",
+            iface=utlv.get_ifname_host(vm.name, vm.get_mac_address()))
+        session = vm.wait_for_login()
+        try:
+            client = network_throughput.Endpoint(vm.get_address(),
+                                                 session=session, name="vm")
+            network_throughput.install_backend(backend, server, client)
+            for flow_count in flow_counts:
+                ticks_before = get_tasks_cpu_ticks(tasks)
+                begin = time.time()
+                result = network_throughput.measure_from_params(
+                    params, server, client, streams=flow_count)
+                usage = get_tasks_cpu_usage(ticks_before,
+                                            get_tasks_cpu_ticks(tasks),
+                                            time.time() - begin)
+                result['queues'] = queue_count
+                result['vhost_cpu'] = sorted(usage.values(), reverse=True)
+                result['busy_vhosts'] = len([cpu for cpu in usage.values()
+                                             if cpu >= 1])
+                results.append(result)
+        finally:
+            session.close()
+
+    logging.info("Multiqueue scaling with %s vcpus:", vcpu_count)
+    logging.info("  %-7s %-6s %-8s %-12s %-12s %-s", "queues", "flows",
+                 "gbps", "pps", "busy_vhosts", "vhost_cpu")
+    for result in results:
+        logging.info("  %-7s %-6s %-8.3f %-12.0f %-12s %s",
+                     result['queues'], result['streams'], result['gbps'],
+                     result['pps'] or 0, result['busy_vhosts'],
+                     ["%.1f" % cpu for cpu in result['vhost_cpu']])
+    network_throughput.save_results(
+        results, os.path.join(test.debugdir, "multiqueue_scaling.json"))
+
+
 def run(test, params, env):
     """
     Test multi function of vm devices.
@@ -315,6 +421,10 @@ def run(test, params, env):
     host_session = None
     client_sessions = []
     try:
+        if params.get("application") == "scaling":
+            run_scaling_sweep(test, new_vm, params)
+            return
+
         # Config new vm for multiqueue
         try:
             prepare_vm_queue(test, new_vm, params)
@@ -346,7 +456,7 @@ def run(test, params, env):
 
         # Top to get vhost state or get cpu affinity
         if params.get("application") == "iperf":
-            top_vhost(test, vhost_pids, params.get("vcpu_count", 1))
+            top_vhost(test, new_vm, params.get("vcpu_count", 1))
         elif params.get("application") == "affinity":
             check_cpu_affinity(test, vm, affinity_cpu_number)
     finally:
@@ -1,6 +1,8 @@
+import json
 import logging
 import os
 
+from virttest import libvirt_version
 from virttest import utils_config
 from virttest import utils_libvirtd
 from virttest import utils_misc
@@ -15,6 +17,75 @@ LOG = logging.getLogger('avocado.test.' + __name__)
 VIRSH_ARGS = {'debug': True, 'ignore_status': False}
 
 
+def run_benchmark(test, params, vm, save_path):
+    """
+    Compare save and restore of formats with different guest memory sizes
+    and amounts of dirty memory
+
+    :param test: test object
+    :param params: Dictionary with the test parameters
+    :param vm: vm instance
+    :param save_path: path of the save file
+    """
+    formats = params.get('benchmark_formats', 'raw gzip bzip2 xz lzop').split()
+    mem_sizes = [int(size) for size in
+                 params.get('benchmark_mem_sizes', '1048576').split()]
+    fill_percents = [int(percent) for percent in
+                     params.get('benchmark_fill_percents', '0 50').split()]
+    parallel_channels = params.get('benchmark_parallel_channels')
+    # Pairs of save_image_format and save options
+    configs = [(save_format, '') for save_format in formats]
+    if parallel_channels:
+        if libvirt_version.version_compare(10, 6, 0):
+            configs.append(('sparse', f'--parallel --parallel-channels '
+                                      f'{parallel_channels}'))
+        else:
+            LOG.warning('Parallel save is not supported by this libvirt')
+
+    qemu_conf = utils_config.LibvirtQemuConfig()
+    libvirtd = utils_libvirtd.Libvirtd()
+    rows = []
+    try:
+        for save_format, save_options in configs:
+            qemu_conf.save_image_format = save_format
+            libvirtd.restart()
+            for mem_size in mem_sizes:
+                if vm.is_alive():
+                    vm.destroy()
+                vmxml = vm_xml.VMXML.new_from_inactive_dumpxml(vm.name)
+                vmxml.memory = mem_size
+                vmxml.current_mem = mem_size
+                vmxml.sync()
+                for fill_percent in fill_percents:
+                    vm.start()
+                    save_base.fill_guest_memory(
+                        vm, mem_size // 1024 * fill_percent // 100)
+                    pid_ping, upsince = save_base.pre_save_setup(vm)
+                    result = save_base.save_restore_with_timing(
+                        vm, save_path, save_options)
+                    save_base.post_save_check(vm, pid_ping, upsince)
+                    vm.destroy()
+                    os.remove(save_path)
+                    result.update({
+                        'format': save_format + (' parallel' if save_options
+                                                 else ''),
+                        'mem_mib': mem_size // 1024,
+                        'fill_percent': fill_percent,
+                        'ratio': (mem_size * 1024.0 / result['bytes_written']
+                                  if result['bytes_written'] else None)})
+                    rows.append(result)
+    finally:
+        qemu_conf.restore()
+        libvirtd.restart()
+
+    save_base.log_table(rows, ['format', 'mem_mib', 'fill_percent',
+                               'save_time', 'restore_time', 'bytes_written',
+                               'ratio', 'save_mbps', 'restore_mbps'],
+                        'Save and restore of formats:')
+    with open(os.path.join(test.debugdir, 'save_formats.json'), 'w') as f:
+        json.dump(rows, f, indent=2)
+
+
 def run(test, params, env):
     """
     Test virsh save with different formats
@@ -37,6 +108,10 @@ def run(test, params, env):
         # Workaround bug: Remove multi-queue setting
         libvirt_vmxml.modify_vm_device(vmxml, 'interface', {'driver': None})
 
+        if 'yes' == params.get('benchmark', 'no'):
+            run_benchmark(test, params, vm, save_path)
+            return
+
         qemu_conf = utils_config.LibvirtQemuConfig()
         libvirtd = utils_libvirtd.Libvirtd()
         qemu_conf.save_image_format = save_format
@@ -0,0 +1,101 @@
+import json
+import logging
+import os
+
+from virttest import libvirt_version
+from virttest import utils_config
+from virttest import utils_libvirtd
+from virttest import utils_misc
+from virttest.libvirt_xml import vm_xml
+from virttest.utils_libvirt import libvirt_vmxml
+from virttest.utils_test import libvirt
+
+from provider.save import save_base
+
+LOG = logging.getLogger('avocado.test.' + __name__)
+
+
+def run(test, params, env):
+    """
+    Test parallel save and restore with different numbers of channels, and
+    record how save and restore time scale with the channels
+    """
+    vm_name = params.get('main_vm')
+    vm = env.get_vm(vm_name)
+
+    destination = params.get('destination', 'local')
+    channels_list = [int(num) for num in
+                     params.get('channels_list', '1 2 4 8').split()]
+    fill_size = int(params.get('fill_size', 0))
+    block_size = params.get('block_size', '10G')
+    rand_id = utils_misc.generate_random_string(3)
+
+    libvirt_version.is_libvirt_feature_supported(params)
+    vmxml = vm_xml.VMXML.new_from_inactive_dumpxml(vm_name)
+    bkxml = vmxml.copy()
+
+    qemu_conf = utils_config.LibvirtQemuConfig()
+    libvirtd = utils_libvirtd.Libvirtd()
+    save_path = None
+
+    try:
+        # Workaround bug: Remove multi-queue setting
+        libvirt_vmxml.modify_vm_device(vmxml, 'interface', {'driver': None})
+
+        # Parallel save needs the sparse format
+        qemu_conf.save_image_format = 'sparse'
+        libvirtd.restart()
+
+        if destination == 'nfs':
+            nfs = libvirt.setup_or_cleanup_nfs(is_setup=True)
+            save_path = os.path.join(nfs['mount_dir'],
+                                     f'{vm_name}_{rand_id}.save')
+        elif destination == 'block':
+            save_path = libvirt.setup_or_cleanup_iscsi(is_setup=True,
+                                                       image_size=block_size)
+        else:
+            save_path = f'/var/tmp/{vm_name}_{rand_id}.save'
+        LOG.debug(f'Save path on {destination}: {save_path}')
+
+        rows = []
+        for channels in channels_list:
+            vm.start()
+            save_base.fill_guest_memory(vm, fill_size)
+            pid_ping, upsince = save_base.pre_save_setup(vm)
+            options = f'--parallel --parallel-channels {channels}'
+            result = save_base.save_restore_with_timing(vm, save_path,
+                                                        options, options)
+            save_base.post_save_check(vm, pid_ping, upsince)
+            vm.destroy()
+            if os.path.isfile(save_path):
+                os.remove(save_path)
+            result['channels'] = channels
+            rows.append(result)
+
+        for row in rows:
+            row['save_speedup'] = rows[0]['save_time'] / row['save_time']
+            row['restore_speedup'] = (rows[0]['restore_time'] /
+                                      row['restore_time'])
+        save_base.log_table(rows, ['channels', 'save_time', 'restore_time',
+                                   'save_speedup', 'restore_speedup',
+                                   'bytes_written'],
+                            f'Parallel save and restore on {destination}:')
+        result_file = os.path.join(test.debugdir,
+                                   f'parallel_save_{destination}.json')
+        with open(result_file, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+    finally:
+        if vm.is_alive():
+            vm.destroy()
+        bkxml.sync()
+        if destination == 'nfs':
+            if save_path and os.path.exists(save_path):
+                os.remove(save_path)
+            libvirt.setup_or_cleanup_nfs(is_setup=False)
+        elif destination == 'block':
+            libvirt.setup_or_cleanup_iscsi(is_setup=False)
+        elif save_path and os.path.exists(save_path):
+            os.remove(save_path)
+        qemu_conf.restore()
+        libvirtd.restart()
@@ -7,6 +7,8 @@ from virttest.libvirt_xml import vm_xml
 from virttest.utils_stress import install_stressapptest
 from virttest import utils_misc
 
+from provider.migration import dirty_page_workload
+
 logging = log.getLogger('avocado.' + __name__)
 
 
@@ -31,7 +33,14 @@ def run(test, params, env):
         Load stress in vm
 
         :param vm: the vm to be installed with stressapptest
+        :return: DirtyPageWorkload object if dirtying at a target rate
         """
+        if target_dirty_rate:
+            # Dirty the pages at the exact rate instead of stressapptest
+            workload = dirty_page_workload.DirtyPageWorkload(
+                vm, target_dirty_rate, ram_size, num_of_sec)
+            workload.start()
+            return workload
         install_stressapptest(vm)
         session = vm.wait_for_login()
         try:
@@ -51,10 +60,14 @@ def run(test, params, env):
         else:
             tolerance = 0.75
 
-        if abs(int(dirty_rate)/int(ram_size) - 1) > tolerance:
+        if target_dirty_rate:
+            expected, expected_name = target_dirty_rate, "target dirty rate"
+        else:
+            expected, expected_name = ram_size, "ram size"
+        if abs(int(dirty_rate)/int(expected) - 1) > tolerance:
             logging.debug("Dirty rate calculated %s has a big difference "
-                          "with the ram size %s loaded in guest "
-                          % (dirty_rate, ram_size))
+                          "with the %s %s loaded in guest "
+                          % (dirty_rate, expected_name, expected))
             return False
         return True
 
@@ -101,9 +114,11 @@ def run(test, params, env):
     mode = params.get("mode")
     period = params.get("period", "1")
     ram_size = params.get("ram_size")
+    target_dirty_rate = params.get("dirty_rate")
     num_of_sec = params.get("num_of_sec", 10000)
     calc_status = params.get("calc_status", "2")
     dirty_ring_size = params.get("dirty_ring_size")
+    workload = None
 
     libvirt_version.is_libvirt_feature_supported(params)
 
@@ -119,7 +134,7 @@ def run(test, params, env):
         if mode:
             option += " --mode %s" % mode
 
-        load_stress(vm)
+        workload = load_stress(vm)
 
         if status_error:
             return
@@ -135,6 +150,11 @@ def run(test, params, env):
                 logging.debug("Dirty rate as expected.")
 
     finally:
+        if workload and vm.is_alive():
+            try:
+                workload.stop()
+            except Exception as detail:
+                logging.warning("Failed to stop dirtying pages: %s", detail)
         if vm.is_alive():
             vm.destroy()
         if mode == 'dirty-ring':
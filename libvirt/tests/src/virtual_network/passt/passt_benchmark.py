@@ -0,0 +1,187 @@
+import logging
+import os
+import shutil
+
+from virttest import libvirt_version
+from virttest import utils_misc
+from virttest import utils_net
+from virttest import utils_package
+from virttest import utils_selinux
+from virttest import virsh
+from virttest.libvirt_xml import vm_xml
+from virttest.staging import service
+
+from provider.virtual_network import network_base
+from provider.virtual_network import network_throughput
+from provider.virtual_network import passt
+from provider.virtual_network import passt_bench
+
+LOG = logging.getLogger('avocado.' + __name__)
+
+
+def prepare_vm(vm, packages, test):
+    """
+    Login vm, install the benchmark packages and stop the firewall in it
+
+    :param vm: vm instance
+    :param packages: list of packages to install
+    :param test: test instance
+    :return: tuple of vm session, mac and interface name in vm
+    """
+    session = vm.wait_for_serial_login(timeout=60)
+    if not utils_package.package_install(packages, session=session):
+        test.error(f'Failed to install {packages} in vm.')
+    session.cmd('systemctl stop firewalld', ignore_all_errors=True)
+    mac = vm.get_virsh_mac_address()
+    vm_iface = utils_net.get_linux_ifname(session, mac)
+    return session, mac, vm_iface
+
+
+def get_host_ip(iface, ip_ver):
+    """
+    Get the ip address of a host interface
+
+    :param iface: host interface
+    :param ip_ver: ip version
+    :return: ip address, None if there is not any
+    """
+    if ip_ver == 'ipv4':
+        return passt.get_iface_ip_and_prefix(iface)[0]
+    ips = passt.get_iface_ip_and_prefix(iface, ip_ver=ip_ver)
+    return ips[0][0] if ips else None
+
+
+def run(test, params, env):
+    """
+    Benchmark the passt interface against a bridged tap interface
+
+    1) Start vm with a passt interface which forwards a tcp and udp port
+       range to vm
+    2) For every ip version, measure tcp and udp throughput, connection
+       setup rate and request/response latency of:
+       - host_to_vm, from host to the forwarded port on localhost
+       - vm_to_host, from vm directly to host by the default gateway
+    3) Replace the interface with a tap one on a linux bridge of the same
+       host interface, and measure the same by the addresses of vm and host
+    4) Report passt relative to tap
+    """
+    libvirt_version.is_libvirt_feature_supported(params)
+    vm_name = params.get('main_vm')
+    vm = env.get_vm(vm_name)
+    log_dir = params.get('log_dir')
+    user_id = params.get('user_id')
+    iface_attrs = eval(params.get('iface_attrs'))
+    tap_iface_attrs = eval(params.get('tap_iface_attrs'))
+    port = int(params.get('port'))
+    ip_vers = params.get('ip_vers', 'ipv4 ipv6').split()
+    protocols = params.get('protocols', 'tcp udp').split()
+    backend = params.get('throughput_backend', 'netperf')
+    # Request/response tests always run by netperf
+    backends = sorted({'netperf', backend})
+    packages = [network_throughput.get_backend(name).package
+                for name in backends]
+    duration = int(params.get('bench_duration', 10))
+    min_relative = params.get('min_passt_relative')
+    host_iface = params.get('host_iface')
+    host_iface = host_iface if host_iface else utils_net.get_default_gateway(
+        iface_name=True, force_dhcp=True).split()[0]
+    bridge_name = 'br_' + utils_misc.generate_random_string(3)
+    iface_attrs['backend']['logFile'] = f'/run/user/{user_id}/passt.log'
+    iface_attrs['source']['dev'] = host_iface
+    tap_iface_attrs['source']['bridge'] = bridge_name
+
+    vmxml = vm_xml.VMXML.new_from_inactive_dumpxml(vm_name)
+    bkxml = vmxml.copy()
+    selinux_status = passt.ensure_selinux_enforcing()
+    firewalld = service.Factory.create_service("firewalld")
+    # passt reaches the sockets of host by loopback
+    host = network_throughput.Endpoint(name='host', iface='lo')
+    results = passt_bench.BenchResults()
+    session = None
+    bridge_created = False
+
+    def measure(iface_type, ip_ver, direction, path, server, client):
+        LOG.info(f'TEST_STEP: Measure {iface_type} {ip_ver} {direction} '
+                 f'by {path} path')
+        # Only the forwarded path needs the forwarded port. On the other
+        # paths, passt itself listens on it on host, so use the default
+        # ports of the backends.
+        values = passt_bench.measure_path(
+            server, client, protocols, backend, duration,
+            port if path == 'port_forward' else None)
+        results.add(iface_type, ip_ver, direction, path, values)
+
+    try:
+        firewalld.stop()
+        for name in backends:
+            network_throughput.install_backend(name, host)
+
+        passt.make_log_dir(user_id, log_dir)
+        passt.vm_add_iface(vmxml, iface_attrs, virsh)
+        vm.start()
+        LOG.debug(virsh.dumpxml(vm_name).stdout_text)
+        session, mac, vm_iface = prepare_vm(vm, packages, test)
+        for ip_ver in ip_vers:
+            # Port forwarded, host reaches vm by the port on localhost
+            local_ip = '127.0.0.1' if ip_ver == 'ipv4' else '::1'
+            measure('passt', ip_ver, 'host_to_vm', 'port_forward',
+                    network_throughput.Endpoint(local_ip, session=session),
+                    host)
+            # Direct, vm reaches host by its default gateway
+            vm_gw = utils_net.get_default_gateway(
+                session=session, ip_ver=ip_ver, force_dhcp=ip_ver == 'ipv4')
+            if not vm_gw:
+                LOG.warning(f'No {ip_ver} default gateway in vm, skip '
+                            f'vm_to_host of passt')
+                continue
+            gw_addr = vm_gw if ip_ver == 'ipv4' else f'{vm_gw}%{vm_iface}'
+            measure('passt', ip_ver, 'vm_to_host', 'direct',
+                    network_throughput.Endpoint(gw_addr),
+                    network_throughput.Endpoint(session=session))
+        session.close()
+        session = None
+        vm.destroy()
+
+        utils_net.create_linux_bridge_tmux(bridge_name, host_iface)
+        bridge_created = True
+        host = network_throughput.Endpoint(name='host', iface=bridge_name)
+        vmxml = vm_xml.VMXML.new_from_inactive_dumpxml(vm_name)
+        passt.vm_add_iface(vmxml, tap_iface_attrs, virsh)
+        vm.start()
+        LOG.debug(virsh.dumpxml(vm_name).stdout_text)
+        session, mac, vm_iface = prepare_vm(vm, packages, test)
+        for ip_ver in ip_vers:
+            vm_ip = network_base.get_vm_ip(session, mac, ip_ver)
+            host_ip = get_host_ip(bridge_name, ip_ver)
+            if not vm_ip or not host_ip:
+                LOG.warning(f'No {ip_ver} address of vm or host on the '
+                            f'bridge, skip {ip_ver} of tap')
+                continue
+            measure('tap', ip_ver, 'host_to_vm', 'direct',
+                    network_throughput.Endpoint(vm_ip, session=session),
+                    host)
+            measure('tap', ip_ver, 'vm_to_host', 'direct',
+                    network_throughput.Endpoint(host_ip),
+                    network_throughput.Endpoint(session=session))
+
+        results.log()
+        results.save(os.path.join(test.debugdir, 'passt_benchmark.json'))
+        if min_relative:
+            violations = results.get_violations(float(min_relative))
+            if violations:
+                test.fail(f'passt is below {min_relative} of tap in '
+                          f'{len(violations)} results: {violations}')
+
+    finally:
+        if session:
+            session.close()
+        for name in backends:
+            network_throughput.stop_server(name, host)
+        firewalld.start()
+        vm.destroy()
+        bkxml.sync()
+        if bridge_created:
+            utils_net.delete_linux_bridge_tmux(bridge_name, host_iface)
+        if os.path.exists(log_dir):
+            shutil.rmtree(log_dir)
+        utils_selinux.set_status(selinux_status)
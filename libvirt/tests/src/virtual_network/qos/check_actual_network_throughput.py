@@ -105,12 +105,13 @@ def run(test, params, env):
 
         network_base.check_throughput(
             vm_sess.cmd, lambda x: process.run(x).stdout_text,
-            vm_ip, inbound["average"], 'inbound'
+            vm_ip, inbound["average"], 'inbound', cli_iface=tap_device
         )
 
         network_base.check_throughput(
             lambda x: process.run(x).stdout_text,
-            vm_sess.cmd,  host_ip, outbound["average"], 'outbound'
+            vm_sess.cmd,  host_ip, outbound["average"], 'outbound',
+            serv_iface=tap_device
         )
         vm_sess.close()
         vm.destroy()
@@ -0,0 +1,164 @@
+import logging
+import os
+
+from virttest import utils_misc
+from virttest import utils_package
+from virttest.libvirt_xml import vm_xml
+from virttest.staging import service
+from virttest.utils_libvirt import libvirt_network
+from virttest.utils_libvirt import libvirt_vmxml
+from virttest.utils_test import libvirt
+
+from provider.libvirt_bench import libvirt_bench_base
+from provider.virtual_network import network_base
+from provider.virtual_network import network_throughput
+from provider.virtual_network import ping_matrix
+from provider.virtual_network import qos_sweep
+
+LOG = logging.getLogger('avocado.' + __name__)
+
+
+def run(test, params, env):
+    """
+    Check the accuracy of bandwidth shaping under contention
+
+    1) Create a nat network with QoS and put all the vms on it
+    2) For every bandwidth setting of the sweep, set it to all the vms by
+       domiftune
+    3) For inbound and outbound, measure the throughput of all the vms
+       in parallel, and ping them from host meanwhile to get the jitter
+    4) Report the shaping error against the configured rate
+    """
+    vms = params.get('vms').split()
+    rand_id = utils_misc.generate_random_string(3)
+    net_name = 'net_' + rand_id
+    net_attrs = eval(params.get('net_attrs', '{}'))
+    iface_attrs = eval(params.get('iface_attrs', '{}'))
+    averages = [int(average) for average in
+                params.get('sweep_averages', '1024 4096 16384').split()]
+    settings = qos_sweep.get_sweep_settings(
+        averages, float(params.get('peak_ratio', 2)),
+        int(params.get('burst', 1024)), float(params.get('floor_ratio', 0)))
+    directions = params.get('directions', 'inbound outbound').split()
+    backend = params.get('throughput_backend', 'netperf')
+    duration = int(params.get('throughput_duration', 10))
+    # Every vm gets its own server port if a server can not serve several
+    # clients at the same time, netperf also uses the next port for data
+    ports = {vm_name: None for vm_name in vms}
+    if not network_throughput.get_backend(backend).concurrent_clients:
+        base_port = int(params.get('throughput_base_port', 25201))
+        ports = {vm_name: base_port + 2 * index
+                 for index, vm_name in enumerate(vms)}
+    max_error = params.get('max_shaping_error')
+
+    bkxmls = [vm_xml.VMXML.new_from_inactive_dumpxml(vm_name).copy()
+              for vm_name in vms]
+    firewalld = service.Factory.create_service("firewalld")
+    sessions = {}
+    endpoints = {}
+    taps = {}
+    host = network_throughput.Endpoint(net_attrs['ips'][0]['address'],
+                                       name='host')
+
+    def measure_all(direction):
+        """
+        Measure the throughput of all the vms and ping them in parallel
+
+        :param direction: inbound or outbound
+        :return: tuple of dicts, vm name -> throughput and ping results
+        """
+        throughputs = {}
+        pings = {}
+        matrix = ping_matrix.PingMatrix(count=int(duration / 0.2),
+                                        deadline=duration + 5)
+        for vm_name in vms:
+            matrix.add('host', vm_name, endpoints[vm_name].ip)
+
+        def _run(vm_name):
+            if vm_name is None:
+                for result in matrix.run():
+                    pings[result['destination']] = result
+                return
+            # Count the packets of the vm only on its tap on host
+            vm_host = network_throughput.Endpoint(host.ip, name=host.name,
+                                                  iface=taps[vm_name])
+            if direction == 'inbound':
+                server, client = endpoints[vm_name], vm_host
+            else:
+                server, client = vm_host, endpoints[vm_name]
+            throughputs[vm_name] = network_throughput.measure(
+                backend, server, client, duration, manage_server=False,
+                port=ports[vm_name])
+
+        errors = libvirt_bench_base.run_in_threads(
+            _run, [(vm_name,) for vm_name in vms] + [(None,)])
+        if errors:
+            test.error('Failed to measure %s throughput: %s'
+                       % (direction, errors[0]))
+        return throughputs, pings
+
+    try:
+        libvirt_network.create_or_del_network(net_attrs)
+        for vm_name in vms:
+            vmxml = vm_xml.VMXML.new_from_inactive_dumpxml(vm_name)
+            vmxml.del_device('interface', by_tag=True)
+            libvirt_vmxml.modify_vm_device(vmxml, 'interface', iface_attrs)
+            env.get_vm(vm_name).start()
+
+        firewalld.stop()
+        network_throughput.install_backend(backend, host)
+        for vm_name in vms:
+            vm = env.get_vm(vm_name)
+            session = vm.wait_for_serial_login()
+            sessions[vm_name] = session
+            if not utils_package.package_install(
+                    network_throughput.get_backend(backend).package,
+                    session=session):
+                test.error(f'Failed to install {backend} on {vm_name}.')
+            session.cmd('systemctl stop firewalld', ignore_all_errors=True)
+            mac = network_base.get_iface_xml_inst(
+                vm_name, f'on VM:{vm_name}').mac_address
+            taps[vm_name] = libvirt.get_ifname_host(vm_name, mac)
+            endpoints[vm_name] = network_throughput.Endpoint(
+                network_base.get_vm_ip(session, mac), session=session,
+                name=vm_name)
+            network_throughput.start_server(backend, endpoints[vm_name],
+                                            ports[vm_name])
+        network_throughput.stop_server(backend, host)
+        for port in sorted(set(ports.values()), key=str):
+            network_throughput.start_server(backend, host, port,
+                                            restart=False)
+
+        results = qos_sweep.ShapingResults()
+        for setting in settings:
+            LOG.info(f'TEST_STEP: Set bandwidth of {len(vms)} vms: {setting}')
+            for vm_name in vms:
+                qos_sweep.set_bandwidth(vm_name, taps[vm_name], setting)
+            for direction in directions:
+                throughputs, pings = measure_all(direction)
+                for vm_name in vms:
+                    results.add(vm_name, direction, setting[direction],
+                                throughputs[vm_name], pings.get(vm_name),
+                                len(vms))
+
+        results.log()
+        results.save(os.path.join(test.debugdir, 'qos_shaping_sweep.csv'),
+                     os.path.join(test.debugdir, 'qos_shaping_sweep.json'))
+        if max_error:
+            violations = results.get_violations(float(max_error))
+            if violations:
+                test.fail(f'Shaping error is over {max_error} in '
+                          f'{len(violations)} results: {violations}')
+
+    finally:
+        network_throughput.stop_server(backend, host)
+        for vm_name, session in sessions.items():
+            session.close()
+        firewalld.start()
+        for vm_name in vms:
+            vm = env.get_vm(vm_name)
+            if vm.is_alive():
+                vm.destroy()
+        for bkxml in bkxmls:
+            bkxml.sync()
+        libvirt_network.create_or_del_network(net_attrs, is_del=True)
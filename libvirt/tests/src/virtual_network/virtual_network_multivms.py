@@ -16,6 +16,7 @@ from virttest.libvirt_xml import vm_xml
 from virttest.libvirt_xml.devices import interface
 
 from provider.virtual_network import network_base
+from provider.virtual_network import ping_matrix
 
 
 # Using as lower capital is not the best way to do, but this is just a
@@ -43,33 +44,37 @@ def create_bridge(br_name, iface_name):
     process.run(cmd, shell=True, verbose=True)
 
 
-def ping_func(session, **expect):
+def ping_func(session_expects):
     """
-    Check whether ping result meet expectation
+    Check whether ping results meet expectation, the pings from all the
+    sessions to all the ips run concurrently
 
-    :param session: session to ping from
-    :param expect: dict-type,
-                    {ip_1: True, ip_2: True}
-                    'ip - expectation' map of ping result expectations
+    :param session_expects: dict-type, {session_1: {ip_1: True, ip_2: True}}
+                            session - 'ip - expectation' map of ping result
+                            expectations
     :return: True if all ping results meet expectation, False if not
     """
-
-    def _ping_check(ip, session):
-        status, output = utils_net.ping(ip, count=5, timeout=10,
-                                        session=session, force_ipv4=True)
-        return True if status == 0 else False
-
-    ping_result = {k: None for k in expect.keys()}
+    sessions = {'vm%d' % index: session
+                for index, session in enumerate(session_expects)}
+    matrix = ping_matrix.PingMatrix(sessions)
+    for source, session in sessions.items():
+        for ip, expect in session_expects[session].items():
+            matrix.add(source, ip, ip, expect)
 
     result = True
-    for ip in expect.keys():
-        ping_result[ip] = _ping_check(ip, session)
-        logging.debug('Expect ping result to %s: %s', ip, expect[ip])
-        logging.debug('Actual ping result to %s: %s', ip, ping_result[ip])
-        if ping_result[ip] != expect[ip]:
+    for ping_result in matrix.run():
+        logging.debug('Expect ping result from %s to %s: %s',
+                      ping_result['source'], ping_result['ip'],
+                      ping_result['expect_pass'])
+        logging.debug('Actual ping result from %s to %s: %s',
+                      ping_result['source'], ping_result['ip'],
+                      ping_result['reachable'])
+        if not ping_result['passed']:
             result = False
-            logging.error('Ping result to %s does not match expectation', ip)
-
+            logging.error('Ping result from %s to %s does not match '
+                          'expectation', ping_result['source'],
+                          ping_result['ip'])
+    matrix.log()
     return result
 
 
@@ -376,16 +381,16 @@ def run(test, params, env):
                 if not vm_ip:
                     test.error("Got vm %s ip as None!" % vm_i.name)
 
-            # Check ping result from each vm's session
+            # Check ping result from each vm's session to the host, outside
+            # and the other vm
+            session_expects = {}
             for i in (0, 1):
                 sess = list(session_n_ip.keys())[i]
                 another_sess = list(session_n_ip.keys())[1 - i]
-                ping_expect[session_n_ip[another_sess]] = expect_ping_vm
-                if not ping_func(sess, **ping_expect):
-                    test.fail('Ping check failed')
-                # Remove the other session's ip from ping result, then the
-                # next round of ping check will not do a ping check to the vm itself
-                ping_expect.pop(session_n_ip[another_sess])
+                session_expects[sess] = dict(ping_expect)
+                session_expects[sess][session_n_ip[another_sess]] = expect_ping_vm
+            if not ping_func(session_expects):
+                test.fail('Ping check failed')
 
         # Some test steps after ping check
         if feature == 'port_isolated':
@@ -1,8 +1,19 @@
 from virttest.libvirt_xml import vm_xml
-from virttest import data_dir, utils_libvirtd, utils_sys
+from virttest import data_dir, utils_libvirtd, utils_sys, virsh
+
+from provider.libvirt_bench import libvirt_bench_base
+from provider.libvirtd import libvirtd_base
 
 import logging
+import multiprocessing
+import os
 import subprocess
+import time
+
+# Messages of failures kept by every worker, the others are only counted
+MAX_FAILURE_MESSAGES = 10
+# Seconds to wait after a failed operation before the next one
+FAILURE_BACKOFF = 0.5
 
 
 def create_scripts(vmxml, num_scripts, timeout):
@@ -60,6 +71,151 @@ def create_scripts(vmxml, num_scripts, timeout):
     return script_names
 
 
+def create_worker_xmls(vmxml, num_workers):
+    """
+    Create the xml files of transient VMs for the workers
+
+    Every worker gets a VM with its own name, so the workers do not
+    conflict with each other.
+
+    :param vmxml: Base xml for the VMs that will be created
+    :param num_workers: number of workers
+    :return: list of (xml path, vm name)
+    """
+    tmp_dir = data_dir.get_tmp_dir(public=False)
+    vm_name = vmxml.vm_name
+    # SELinux does not allow multiple VM operations the same qcow2 files
+    vmxml.remove_all_disk()
+    for item in ["loader", "nvram"]:
+        if item in str(vmxml):
+            vmxml.xmltreefile.remove_by_xpath("/os/%s" % item, remove_all=True)
+    vmxml.del_uuid()
+    logging.info("VM XML Contents: \n{}".format(str(vmxml)))
+    xml_template = str(vmxml)
+
+    worker_xmls = []
+    for i in range(num_workers):
+        worker_vm_name = "{}_{}".format(vm_name, i)
+        xml_path = os.path.join(tmp_dir, "xml_worker_{}.xml".format(i))
+        with open(xml_path, "w") as outfile:
+            outfile.write(xml_template.replace(
+                "<name>{}</name>".format(vm_name),
+                "<name>{}</name>".format(worker_vm_name), 1))
+        worker_xmls.append((xml_path, worker_vm_name))
+    logging.debug("Written vm xml files: {}".format(worker_xmls))
+    return worker_xmls
+
+
+def create_destroy_worker(worker_args):
+    """
+    Create and destroy a transient VM in a loop through one persistent
+    virsh session, so the worker keeps one connection to libvirt
+
+    A failed destroy is retried once, and the worker stops if the VM is
+    still running, since every later create would fail.
+
+    :param worker_args: tuple of (xml path, vm name, timeout)
+    :return: dict with the cycles, failures, first failure messages and
+             latencies of the worker
+    """
+    xml_path, vm_name, timeout = worker_args
+    result = {"vm_name": vm_name, "cycles": 0, "failures": 0,
+              "failure_messages": [], "create": [], "destroy": []}
+
+    def _add_failure(cmd_result):
+        result["failures"] += 1
+        if len(result["failure_messages"]) < MAX_FAILURE_MESSAGES:
+            result["failure_messages"].append(cmd_result.stderr_text.strip())
+        time.sleep(FAILURE_BACKOFF)
+
+    virsh_instance = virsh.VirshPersistent()
+    try:
+        end_time = time.time() + timeout
+        while time.time() < end_time:
+            begin = time.time()
+            cmd_result = virsh_instance.create(xml_path)
+            if cmd_result.exit_status:
+                _add_failure(cmd_result)
+                continue
+            result["create"].append(time.time() - begin)
+            begin = time.time()
+            cmd_result = virsh_instance.destroy(vm_name)
+            if cmd_result.exit_status:
+                _add_failure(cmd_result)
+                cmd_result = virsh_instance.destroy(vm_name)
+                if cmd_result.exit_status:
+                    _add_failure(cmd_result)
+                    break
+                continue
+            result["destroy"].append(time.time() - begin)
+            result["cycles"] += 1
+    finally:
+        try:
+            virsh_instance.destroy(vm_name, ignore_status=True)
+            virsh_instance.close_session()
+        except Exception as detail:
+            logging.warning("Failed to clean up worker of {}: {}"
+                            .format(vm_name, detail))
+    return result
+
+
+def run_workers(test, params, vmxml, num_workers, timeout):
+    """
+    Create and destroy VMs with a pool of worker processes and report
+    the cycles and latencies of every worker
+
+    :param test: Avocado test object
+    :param params: Test parameters
+    :param vmxml: Base xml for the VMs that will be created
+    :param num_workers: number of worker processes
+    :param timeout: amount of time to spend creating and destroying VMs
+    """
+    max_failure_rate = float(params.get("max_failure_rate", 0))
+    latency_buckets = [float(bound) for bound in
+                       params.get("latency_buckets",
+                                  "0.1,0.25,0.5,1,2,5").split(",")]
+
+    worker_args = [(xml_path, worker_vm_name, timeout) for
+                   xml_path, worker_vm_name in
+                   create_worker_xmls(vmxml, num_workers)]
+    recorder = libvirt_bench_base.LatencyRecorder()
+    pool = multiprocessing.Pool(num_workers)
+    try:
+        results = pool.map(create_destroy_worker, worker_args)
+    finally:
+        pool.close()
+        pool.join()
+    recorder.stop()
+
+    total_cycles = 0
+    total_failures = 0
+    for result in results:
+        logging.info("Worker of {} completed {} cycles with {} failures"
+                     .format(result["vm_name"], result["cycles"],
+                             result["failures"]))
+        for failure in set(result["failure_messages"]):
+            logging.debug("\t{}".format(failure))
+        recorder.merge({"create": result["create"],
+                        "destroy": result["destroy"]})
+        total_cycles += result["cycles"]
+        total_failures += result["failures"]
+
+    recorder.log_summary("Create/destroy latency of {} workers"
+                         .format(num_workers))
+    for operation, latencies in sorted(recorder.samples.items()):
+        logging.info("{} latency histogram(s): {}".format(
+            operation,
+            libvirt_bench_base.histogram(latencies, latency_buckets)))
+    recorder.dump(os.path.join(test.debugdir, "create_destroy_latency.json"))
+
+    failure_rate = float(total_failures) / max(total_cycles + total_failures, 1)
+    logging.info("Total cycles: {}, failures: {}, failure rate: {:.2%}"
+                 .format(total_cycles, total_failures, failure_rate))
+    if failure_rate > max_failure_rate:
+        test.fail("Failure rate {:.2%} is larger than {:.2%}".format(
+            failure_rate, max_failure_rate))
+
+
 def get_pids_for(names):
     """
     Given a list of names, retrieve the
@@ -91,26 +247,15 @@ def get_libvirt_pids(test, daemon):
     return get_pids_for(daemon.service_list)
 
 
-def run(test, params, env):
+def run_scripts(test, vmxml, num_threads, wait_time):
     """
-    This test ensures that VMs can be created concurrently.
-    Test Process:
-        1) Create bash scripts to create and destroy transient VMs
-        2) Execute the scripts simultaneously for a given number of seconds
-        3) Check that libvirt daemon(s) have not changed PID
-        4) Check to ensure there are no orphan VMs
-    """
-
-    daemon = utils_libvirtd.Libvirtd()
-    pids_before_test = get_libvirt_pids(test, daemon)
+    Execute the bash scripts to create and destroy VMs simultaneously
 
-    vm_name = params.get("main_vm")
-    vm = env.get_vm(vm_name)
-
-    num_threads = int(params.get("num_threads", 3))
-    wait_time = int(params.get("run_time", 60))
-
-    vmxml = vm_xml.VMXML.new_from_inactive_dumpxml(vm_name)
+    :param test: Avocado test object
+    :param vmxml: Base xml for the VMs that will be created
+    :param num_threads: number of scripts to execute
+    :param wait_time: amount of time to spend creating and destroying VMs
+    """
     scripts = create_scripts(vmxml, num_threads, wait_time)
 
     processes = []
@@ -130,6 +275,44 @@ def run(test, params, env):
     if [x for x in exit_codes if x != 0] != []:
         test.fail("Test Failed with script errors")
 
+
+def run(test, params, env):
+    """
+    This test ensures that VMs can be created concurrently.
+    Test Process:
+        1) Create bash scripts to create and destroy transient VMs, or
+           start a pool of worker processes which do it through their own
+           connections
+        2) Execute the scripts or the workers simultaneously for a given
+           number of seconds
+        3) Check that libvirt daemon(s) have not changed PID
+        4) Check to ensure there are no orphan VMs
+        5) Check that the resource usage of libvirt daemon(s) does not
+           grow more than the limits
+    """
+
+    daemon = utils_libvirtd.Libvirtd()
+    pids_before_test = get_libvirt_pids(test, daemon)
+
+    vm_name = params.get("main_vm")
+    vm = env.get_vm(vm_name)
+
+    num_threads = int(params.get("num_threads", 3))
+    wait_time = int(params.get("run_time", 60))
+
+    vmxml = vm_xml.VMXML.new_from_inactive_dumpxml(vm_name)
+    sampler = libvirtd_base.DaemonResourceSampler(
+        daemon.service_list, params.get("sample_interval", 1))
+    sampler.start()
+    try:
+        if params.get("create_destroy_driver", "script") == "process_pool":
+            run_workers(test, params, vmxml, num_threads, wait_time)
+        else:
+            run_scripts(test, vmxml, num_threads, wait_time)
+    finally:
+        sampler.stop()
+        sampler.save(test.debugdir)
+
     pids_after_test = get_libvirt_pids(test, daemon)
     if pids_before_test != pids_after_test:
         logging.debug("Pids Before Test: {}".format(pids_before_test))
@@ -139,3 +322,11 @@ def run(test, params, env):
     vm_pids = get_pids_for([vm_name])
     if vm_pids != []:
         test.fail("Orphan VM(s): PID(s) {} belonging to {}".format(vm_pids, vm_name))
+
+    max_rss_growth = params.get("max_rss_growth")
+    max_fd_growth = params.get("max_fd_growth")
+    max_thread_growth = params.get("max_thread_growth")
+    sampler.check_growth(
+        float(max_rss_growth) if max_rss_growth else None,
+        int(max_fd_growth) if max_fd_growth else None,
+        int(max_thread_growth) if max_thread_growth else None)
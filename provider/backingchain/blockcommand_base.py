@@ -14,6 +14,9 @@ from virttest.libvirt_xml import vm_xml
 from virttest.libvirt_xml.devices.disk import Disk
 from virttest.utils_libvirt import libvirt_secret
 
+from provider.backingchain import image_chain
+from provider.backingchain import image_hash
+
 LOG = logging.getLogger('avocado.' + __name__)
 
 
@@ -115,9 +118,67 @@ class BlockCommand(object):
             self.snap_path_list.append(path)
             self.snap_name_list.append(name)
 
-            if not utils_misc.wait_for(lambda: os.path.exists(path), 10, first=2):
+            if not utils_misc.wait_for(lambda: os.path.exists(path), 10,
+                                       step=0.1):
                 self.test.error("%s should be in snapshot list" % snap_name)
 
+    def get_disk_source(self):
+        """
+        Get the current source of the test disk
+
+        :return: source file or dev of self.new_dev
+        """
+        vmxml = vm_xml.VMXML.new_from_dumpxml(self.vm.name)
+        source = vmxml.get_disk_all()[self.new_dev].find('source')
+        return source.get('file') or source.get('dev')
+
+    def build_snapshot_chain(self, chain_depth, path_prefix='', extra='',
+                             quiesce=False):
+        """
+        Build a deep chain of external snapshots on the test disk
+
+        The overlays are created with qemu-img in one shell call before the
+        snapshots, then the snapshots reuse them over one virsh session
+        without metadata, so every layer costs one qmp transaction only.
+
+        :param chain_depth: number of layers to create
+        :param path_prefix: prefix of the overlay paths, default is tmp_dir
+        :param extra: extra option to create snap, e.g. diskspec of other
+                      disks
+        :param quiesce: freeze guest filesystems by guest agent if True
+        :return: list of the new overlay paths, from base to top
+        """
+        path_prefix = path_prefix or os.path.join(self.tmp_dir, 'chain')
+        backing = self.get_disk_source()
+        backing_info = image_chain.get_image_info(backing)
+        paths = ['%s%d' % (path_prefix, i) for i in range(chain_depth)]
+        # Use -u since the active image is locked by qemu, so the size is
+        # given explicitly instead of being read from the backing file.
+        create_cmds = []
+        backing_format = backing_info['format']
+        for path in paths:
+            create_cmds.append("qemu-img create -q -f qcow2 -u -F %s -b %s %s %s"
+                               % (backing_format, backing, path,
+                                  backing_info['vsize']))
+            backing, backing_format = path, 'qcow2'
+        process.run(" && ".join(create_cmds), shell=True)
+
+        snap_option = "--disk-only --reuse-external --no-metadata"
+        if quiesce:
+            snap_option += " --quiesce"
+        virsh_session = virsh.VirshPersistent()
+        try:
+            for index, path in enumerate(paths):
+                virsh_session.snapshot_create_as(
+                    self.vm.name, "chain%d %s --diskspec %s,file=%s%s"
+                    % (index, snap_option, self.new_dev, path, extra),
+                    ignore_status=False)
+                self.snap_path_list.append(path)
+        finally:
+            virsh_session.close_session()
+        LOG.debug("Built %d layers on %s", chain_depth, self.new_dev)
+        return paths
+
     def convert_expected_chain(self, expected_chain_index):
         """
         Convert expected chain from "4>1>base" to "[/*snap4, /*snap1, /base.image]"
@@ -179,7 +240,8 @@ class BlockCommand(object):
 
     def get_hash_value(self, session=None, check_item=''):
         """
-        Get the hash value
+        Get the sha256 hex digest of a file or device in guest, the same
+        format as Checkfunction.check_hash_list() compares
 
         :param session: virsh session
         :param check_item: a file or device
@@ -188,10 +250,6 @@ class BlockCommand(object):
         if session is None:
             session = self.vm.wait_for_login()
 
-        status, _ = session.cmd_status_output("which sha256sum")
-        if status:
-            self.test.error("Not find sha256sum command on guest.")
-
         # If the target disk we tested changes to bootable disk in guest, then get another disk
         if check_item in session.cmd_output("df -h"):
             lsblk_cmd = "lsblk -l | grep -i disk | awk '{print $1}'"
@@ -200,9 +258,7 @@ class BlockCommand(object):
             disk_list.remove(target_disk)
             check_item = "/dev/" + disk_list[0]
 
-        ret, expected_hash = session.cmd_status_output("sha256sum %s" % check_item)
-        if ret:
-            self.test.error("Get sha256sum value failed")
+        expected_hash = image_hash.DIGESTS.get([check_item], session)[0][0]
 
         return expected_hash, check_item
 
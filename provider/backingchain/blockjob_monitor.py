@@ -0,0 +1,254 @@
+import json
+import logging
+import os
+import re
+import time
+
+from avocado.core import exceptions
+
+from virttest import utils_misc
+from virttest import virsh
+
+from provider.libvirt_bench import libvirt_bench_base
+
+LOG = logging.getLogger('avocado.' + __name__)
+
+
+class BlockJobMonitor(libvirt_bench_base.PeriodicSampler):
+    """
+    Sample the progress of a block job as a time series
+
+    The progress is polled with "blockjob --info --raw --bytes" over one
+    persistent virsh session in a background thread, so the interval can
+    be well below one second.
+
+    Usage:
+    monitor = BlockJobMonitor(vm_name, "vda", interval=0.05)
+    monitor.start()
+    ####
+    block job
+    ####
+    monitor.wait_for_ready()
+    monitor.pivot()
+    monitor.stop()
+    monitor.check_throughput(expected_bps)
+    """
+    FIELD_PATTERN = re.compile(r"^(\w+)=(.*)$")
+    need_virsh_session = True
+
+    def __init__(self, vm_name, target, interval=0.05, uri=None,
+                 start_time=None):
+        """
+        :param vm_name: name of the domain
+        :param target: target or source of the disk
+        :param interval: seconds between two polls
+        :param uri: uri to connect
+        :param start_time: time when the job was issued, used to get the
+                           time to ready, default is the time of start()
+        """
+        super(BlockJobMonitor, self).__init__(interval, uri, start_time)
+        self.vm_name = vm_name
+        self.target = target
+        # Samples are dict with time, cur, end and bandwidth
+        self.ready_time = None
+        self.pivot_latency = None
+        self.job_type = None
+
+    def describe(self):
+        return "block job of %s %s" % (self.vm_name, self.target)
+
+    def parse_info(self, output):
+        """
+        Parse the output of "blockjob --info --raw"
+
+        :param output: str, output of blockjob
+        :return: dict, field -> value, empty if there is no job
+        """
+        info = {}
+        for line in output.strip().splitlines():
+            match = self.FIELD_PATTERN.search(line.strip())
+            if not match:
+                continue
+            try:
+                info[match.group(1)] = int(match.group(2))
+            except ValueError:
+                info[match.group(1)] = match.group(2).strip()
+        return info if 'cur' in info else {}
+
+    def query(self, session):
+        """
+        Query the job info once
+
+        :param session: VirshSession object
+        :return: dict of job info, empty if there is no job
+        """
+        status, output = session.cmd_status_output(
+            "blockjob %s %s --info --raw --bytes" % (self.vm_name, self.target))
+        return self.parse_info(output) if not status else {}
+
+    def sample(self, session, timestamp):
+        """
+        Poll the job info once
+        """
+        info = self.query(session)
+        if not info:
+            return
+        if self.job_type is None:
+            self.job_type = info.get('type')
+        sample = {'time': timestamp, 'cur': info['cur'],
+                  'end': info.get('end'), 'bandwidth': info.get('bandwidth')}
+        self.add(sample)
+        if (self.ready_time is None and sample['end'] and
+                sample['cur'] == sample['end']):
+            self.ready_time = timestamp
+
+    def wait_for_ready(self, timeout=600):
+        """
+        Wait for the job to reach ready phase, i.e. cur equals end
+
+        :param timeout: seconds to wait
+        :return: seconds from the job start to ready
+        :raise: TestFail if the job is not ready in timeout
+        """
+        if not utils_misc.wait_for(lambda: self.ready_time, timeout,
+                                   step=self.interval):
+            raise exceptions.TestFail("Block job of %s %s is not ready in %ss"
+                                      % (self.vm_name, self.target, timeout))
+        return self.ready_time - self.start_time
+
+    def pivot(self, timeout=60):
+        """
+        Pivot the job and measure the time until the job is gone
+
+        :param timeout: seconds to wait for the job to be gone
+        :return: pivot latency in seconds
+        """
+        session = virsh.VirshSession(virsh_exec=virsh.VIRSH_EXEC,
+                                     uri=self.uri, auto_close=True)
+        try:
+            begin = time.time()
+            session.cmd_result("blockjob %s %s --pivot"
+                               % (self.vm_name, self.target),
+                               ignore_status=False)
+            if not utils_misc.wait_for(lambda: not self.query(session),
+                                       timeout, step=0.01):
+                raise exceptions.TestFail("Block job of %s %s is not gone "
+                                          "after pivot" % (self.vm_name,
+                                                           self.target))
+            self.pivot_latency = time.time() - begin
+        finally:
+            session.close()
+        LOG.info("Pivot latency of %s %s: %.3fs", self.vm_name, self.target,
+                 self.pivot_latency)
+        return self.pivot_latency
+
+    def get_throughput(self):
+        """
+        Get the achieved throughput while the job is copying data
+
+        Samples in ready phase are skipped, as cur only follows the guest
+        writes then.
+
+        :return: bytes per second, None if there are less than 2 samples
+        """
+        copying = [sample for sample in self.get_samples()
+                   if sample['end'] and sample['cur'] < sample['end']]
+        if len(copying) < 2:
+            return None
+        first, last = copying[0], copying[-1]
+        if last['time'] == first['time']:
+            return None
+        return (last['cur'] - first['cur']) / (last['time'] - first['time'])
+
+    def get_summary(self):
+        """
+        Get the summary of the job
+
+        :return: dict with the number of samples, the bytes copied, the
+                 throughput, the last bandwidth, the time to ready and the
+                 pivot latency
+        """
+        samples = self.get_samples()
+        summary = {'type': self.job_type, 'samples': len(samples),
+                   'copied': samples[-1]['cur'] - samples[0]['cur']
+                   if samples else 0,
+                   'throughput': self.get_throughput(),
+                   'bandwidth': samples[-1]['bandwidth'] if samples else None,
+                   'time_to_ready': self.ready_time - self.start_time
+                   if self.ready_time else None,
+                   'pivot_latency': self.pivot_latency}
+        return summary
+
+    def check_throughput(self, expected_bps, tolerance=0.2):
+        """
+        Check the achieved throughput reaches the bandwidth cap
+
+        Only the lower bound is checked. Every job type counts some regions
+        without limiting them, e.g. mirror does not rate-limit zero and
+        discarded ranges, so a job on a sparse disk can go over the cap.
+        A job can only be slower if it reached the end of the data during
+        sampling.
+
+        :param expected_bps: bandwidth cap in bytes per second
+        :param tolerance: float, allowed deviation ratio
+        :raise: TestFail if the throughput is below the cap beyond tolerance
+        """
+        throughput = self.get_throughput()
+        LOG.info("%s job throughput is %s bytes/s, cap is %s bytes/s",
+                 self.job_type, throughput, expected_bps)
+        if throughput is None:
+            LOG.warning("Not enough samples to check the throughput")
+            return
+        if throughput > expected_bps * (1 + tolerance):
+            LOG.debug("Throughput is over the cap, the job skipped "
+                      "unallocated or zero regions")
+        if self.ready_time is None and \
+                throughput < expected_bps * (1 - tolerance):
+            raise exceptions.TestFail("Block job throughput %s bytes/s is "
+                                      "below the cap %s bytes/s"
+                                      % (throughput, expected_bps))
+
+    def save(self, dir_path, prefix="blockjob"):
+        """
+        Save the samples as csv file and the summary as json file
+
+        :param dir_path: directory to save the files
+        :param prefix: prefix of the file names
+        :return: tuple of csv file path and json file path
+        """
+        csv_path = os.path.join(dir_path, "%s.csv" % prefix)
+        json_path = os.path.join(dir_path, "%s.json" % prefix)
+        samples = self.get_samples()
+        self.save_csv(csv_path, ['time', 'cur', 'end', 'bandwidth'], samples)
+        summary = self.get_summary()
+        with open(json_path, 'w') as json_file:
+            json.dump({'summary': summary, 'samples': samples}, json_file,
+                      indent=2)
+        LOG.info("Block job summary: %s", summary)
+        return csv_path, json_path
+
+
+def check_throughput_from_params(vm_name, target, expected_bps, params,
+                                 dir_path):
+    """
+    Sample a running block job for a while and check its throughput
+
+    :param vm_name: name of the domain
+    :param target: target of the disk
+    :param expected_bps: bandwidth cap in bytes per second
+    :param params: dict, get check_throughput, job_sample_interval,
+                   job_sample_time(s) and throughput_tolerance
+    :param dir_path: directory to save the samples
+    :return: BlockJobMonitor object, None if check_throughput is not yes
+    """
+    if params.get("check_throughput", "no") != "yes":
+        return None
+    monitor = BlockJobMonitor(vm_name, target,
+                              params.get("job_sample_interval", 0.05))
+    monitor.start()
+    time.sleep(float(params.get("job_sample_time", 10)))
+    monitor.stop()
+    monitor.save(dir_path, prefix="blockjob_%s_%s" % (target, int(expected_bps)))
+    monitor.check_throughput(int(expected_bps),
+                             float(params.get("throughput_tolerance", 0.2)))
+    return monitor
@@ -1,12 +1,10 @@
 import logging
 import re
 
-from avocado.utils import process
-
-from virttest import libvirt_storage
-from virttest import utils_misc
 from virttest.libvirt_xml import vm_xml
 from provider.virtual_disk.disk_base import DiskBase
+from provider.backingchain import image_chain
+from provider.backingchain import image_hash
 
 LOG = logging.getLogger('avocado.' + __name__)
 
@@ -68,8 +66,10 @@ class Checkfunction(object):
 
         :param expected_value: image size that setting in cfg file.
         """
-        expected_number = int(re.findall(r'\d+', expected_value)[0])
-        expected_unit = re.findall(r"\D+", expected_value)[0]
+        match = re.match(r"(\d+)(\D+)$", str(expected_value).strip())
+        if not match:
+            self.test.error("Unknown image size:%s" % expected_value)
+        expected_number, expected_unit = int(match.group(1)), match.group(2)
 
         if expected_unit == "kib":
             expected_value = expected_number * 1024
@@ -88,7 +88,7 @@ class Checkfunction(object):
         :param check_item: The item you want to check.
         :param expected_value: expected item value
         """
-        image_info = utils_misc.get_image_info(image_path)
+        image_info = image_chain.get_image_info(image_path)
 
         if image_info.get(check_item) is None:
             self.test.fail("The {} value:{} you checked is"
@@ -158,47 +158,54 @@ class Checkfunction(object):
         :param img_list: expected backingchain list
         :return: bool, meets expectation or not
         """
-        # Get actual backingchain list
-        qemu_img_cmd = 'qemu-img info --backing-chain %s' % img_list[0]
-        if libvirt_storage.check_qemu_image_lock_support():
-            qemu_img_cmd += " -U"
-        img_info = process.run(qemu_img_cmd, verbose=True, shell=True).stdout_text
-        # Set check pattern
-        pattern = ''
-        chain_length = len(img_list)
-        for i in range(chain_length):
-            pattern += 'image: ' + img_list[i]
-            if i + 1 < chain_length:
-                pattern += '.*backing file: ' + img_list[i + 1]
-            pattern += '.*'
-        LOG.debug('The pattern to match the current backing chain is:%s'
-                  % pattern)
-        # compare list
-        exist = re.search(pattern, img_info, re.DOTALL)
-        if not exist:
+        chain = image_chain.get_chain(img_list[0])
+        if not chain.match(img_list):
             self.test.fail('qemu-img info output of backing chain '
-                           'is not correct: %s' % img_info)
-        return exist
+                           'is not correct: %s' % chain.filenames())
+        return True
+
+    def get_hash_list(self, item_list, session=None):
+        """
+        Get the hash values of files or devices
+
+        The items are hashed in parallel, and the digests of every region
+        are kept, so check_hash_list() can report where an item changes.
+
+        :param item_list: files or devs
+        :param session: vm session if the items are in the vm, else they
+                        are on host
+        :return: hash value list
+        """
+        return [digest for digest, _ in
+                image_hash.DIGESTS.get(item_list, session)]
 
     def check_hash_list(self, item_list, hash_list, session=None):
         """
         Check the file list current hash value same as the hash value list
 
         :param item_list: file or dev need to check
-        :param hash_list: hash value list
-        :param session: The session object to the host
-        """
-
+        :param hash_list: hash value list, got by get_hash_list() or
+                          BlockCommand.get_hash_value()
+        :param session: vm session if the items are in the vm, else they
+                        are on host
+        """
+        previous = [image_hash.DIGESTS.peek(item, session)
+                    for item in item_list]
+        current = image_hash.DIGESTS.get(item_list, session)
         for index, item in enumerate(item_list):
-            if session:
-                ret, current_hash = session.cmd_status_output("sha256sum %s" % item)
-            else:
-                current_hash = process.run("sha256sum %s" % item).stdout_text.strip().split()[0]
-
+            current_hash = current[index][0]
             if current_hash != hash_list[index]:
+                offset = None
+                if previous[index] and previous[index][0] == hash_list[index]:
+                    offset = image_hash.first_mismatch(
+                        previous[index][1], current[index][1],
+                        image_hash.DIGESTS.region_size)
                 self.test.fail("File:%s hash :%s is different from hash before "
-                               "blockcommit:%s" % (item, current_hash,
-                                                   hash_list[index]))
+                               "blockcommit:%s%s" % (item, current_hash,
+                                                     hash_list[index],
+                                                     "" if offset is None else
+                                                     ", first mismatch at "
+                                                     "offset %s" % offset))
 
     def check_mirror_exist(self, vm, device, image_path):
         """
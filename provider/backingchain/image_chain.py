@@ -0,0 +1,167 @@
+import json
+import logging
+
+from avocado.utils import process
+
+from virttest import libvirt_storage
+
+LOG = logging.getLogger('avocado.' + __name__)
+
+
+class ImageNode(object):
+    """
+    One image of a backing chain, built from the json info of qemu-img
+    """
+
+    def __init__(self, info):
+        """
+        :param info: dict, json info of one image got from qemu-img
+        """
+        self.raw = info
+        self.filename = info.get('filename')
+        self.format = info.get('format')
+        self.virtual_size = info.get('virtual-size')
+        self.actual_size = info.get('actual-size')
+        self.cluster_size = info.get('cluster-size')
+        self.backing_filename = info.get('full-backing-filename',
+                                         info.get('backing-filename'))
+        self.backing_format = info.get('backing-filename-format')
+        self.format_specific = info.get('format-specific', {}).get('data', {})
+        self.dirty_bitmaps = [bitmap['name'] for bitmap in
+                              self.format_specific.get('bitmaps', [])]
+
+    @property
+    def info(self):
+        """
+        Image info with the keys of utils_misc.get_image_info()
+
+        :return: dict, e.g. {'format': 'qcow2', 'vsize': 1073741824, ...}
+        """
+        info = {'format': self.format,
+                'vsize': self.virtual_size,
+                'dsize': self.actual_size,
+                'csize': self.cluster_size,
+                'compat': self.format_specific.get('compat'),
+                'lcounts': self.format_specific.get('lazy-refcounts'),
+                'extended l2': self.format_specific.get('extended-l2')}
+        for key, value in info.items():
+            # The text output of qemu-img prints booleans as lower case
+            if isinstance(value, bool):
+                info[key] = str(value).lower()
+        return dict((key, value) for key, value in info.items()
+                    if value is not None)
+
+    def __repr__(self):
+        return "ImageNode(%s, %s)" % (self.filename, self.format)
+
+
+class BackingChain(object):
+    """
+    Backing chain of an image, from the top image to the base image
+
+    The chain is got with one "qemu-img info --backing-chain --output=json"
+    call, and every node is indexed by its file name, so checks on the
+    chain do not run qemu-img again.
+
+    Usage:
+    chain = BackingChain.from_image(top_image)
+    chain.filenames()
+    chain.get(base_image).virtual_size
+    """
+
+    def __init__(self, infos):
+        """
+        :param infos: list of dict, json info of every image in the chain
+        """
+        self.nodes = [ImageNode(info) for info in infos]
+        self._index = dict((node.filename, node) for node in self.nodes)
+
+    @classmethod
+    def from_image(cls, image_path, backing_chain=True):
+        """
+        Get the chain of an image with qemu-img
+
+        :param image_path: path of the top image
+        :param backing_chain: False to get the info of the image only
+        :return: BackingChain object
+        """
+        cmd = "qemu-img info --output=json %s" % image_path
+        if backing_chain:
+            cmd += " --backing-chain"
+        if libvirt_storage.check_qemu_image_lock_support():
+            cmd += " -U"
+        output = process.run(cmd, verbose=True, shell=True).stdout_text
+        infos = json.loads(output)
+        if isinstance(infos, dict):
+            infos = [infos]
+        return cls(infos)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def filenames(self):
+        """
+        Get the file names of the chain, from top to base
+
+        :return: list of file names
+        """
+        return [node.filename for node in self.nodes]
+
+    def get(self, filename):
+        """
+        Get the node of a file in the chain
+
+        :param filename: file name of the image
+        :return: ImageNode object, None if it is not in the chain
+        """
+        return self._index.get(filename)
+
+    def backing_of(self, filename):
+        """
+        Get the backing node of a file in the chain
+
+        :param filename: file name of the image
+        :return: ImageNode object, None if it is the base or not found
+        """
+        node = self.get(filename)
+        if node is None:
+            return None
+        position = self.nodes.index(node)
+        if position + 1 < len(self.nodes):
+            return self.nodes[position + 1]
+        return None
+
+    def match(self, expected_chain):
+        """
+        Check the chain starts with the expected images in order
+
+        :param expected_chain: list of file names, from top to base
+        :return: bool, meets expectation or not
+        """
+        return self.filenames()[:len(expected_chain)] == list(expected_chain)
+
+
+def get_chain(image_path):
+    """
+    Get the backing chain of an image
+
+    The chain is got again on every call, since qemu writes the images in
+    place and their size or mtime does not reliably change.
+
+    :param image_path: path of the top image
+    :return: BackingChain object
+    """
+    chain = BackingChain.from_image(image_path)
+    LOG.debug("Backing chain of %s: %s", image_path, chain.filenames())
+    return chain
+
+
+def get_image_info(image_path):
+    """
+    Get the info of one image, in the format of utils_misc.get_image_info()
+
+    :param image_path: path of the image
+    :return: dict of image info
+    """
+    return BackingChain.from_image(image_path,
+                                   backing_chain=False).nodes[0].info
@@ -0,0 +1,239 @@
+import base64
+import hashlib
+import inspect
+import json
+import logging
+import os
+import threading
+
+from multiprocessing.pool import ThreadPool
+
+from avocado.core import exceptions
+
+LOG = logging.getLogger('avocado.' + __name__)
+
+CHUNK_SIZE = 64 * 1024 * 1024
+GUEST_SCRIPT_PATH = "/tmp/image_hash.py"
+
+# Entry of the script run in vm, see get_guest_script()
+GUEST_MAIN = '''
+def main(region_size, paths):
+    results = {}
+
+    def _hash(path):
+        try:
+            results[path] = hash_file(path, region_size)
+        except (IOError, OSError) as detail:
+            results[path] = str(detail)
+
+    threads = [threading.Thread(target=_hash, args=(path,))
+               for path in paths]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for path in paths:
+        print(json.dumps([path, results[path]]))
+
+
+main(int(sys.argv[1]), sys.argv[2:])
+'''
+
+
+def hash_file(path, region_size=None, chunk_size=CHUNK_SIZE):
+    """
+    Get the sha256 digest of a file or a block device by reading it in
+    large chunks into one reused buffer
+
+    :param path: path of the file or the device
+    :param region_size: if set, also get the digest of every region of this
+                        size, it should be a multiple of chunk_size
+    :param chunk_size: size of every read
+    :return: tuple of (hex digest of the whole file, list of hex digests of
+             regions, or None if region_size is not set)
+    """
+    if region_size:
+        chunk_size = min(chunk_size, region_size)
+    total = hashlib.sha256()
+    region_digests = [] if region_size else None
+    region = hashlib.sha256()
+    region_filled = 0
+    buf = bytearray(chunk_size)
+    view = memoryview(buf)
+    with open(path, 'rb', buffering=0) as image:
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(image.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        while True:
+            size = image.readinto(buf)
+            if not size:
+                break
+            total.update(view[:size])
+            if region_size:
+                region.update(view[:size])
+                region_filled += size
+                if region_filled >= region_size:
+                    region_digests.append(region.hexdigest())
+                    region = hashlib.sha256()
+                    region_filled = 0
+    if region_size and region_filled:
+        region_digests.append(region.hexdigest())
+    return total.hexdigest(), region_digests
+
+
+def hash_files(paths, region_size=None, workers=None):
+    """
+    Hash files in parallel, hashlib releases the GIL on large buffers so
+    threads use several cores
+
+    :param paths: list of paths
+    :param region_size: see hash_file()
+    :param workers: number of threads, defaults to the number of cpus
+    :return: list of (digest, region digests), in the order of paths
+    """
+    workers = min(len(paths), workers or os.cpu_count() or 1)
+    if workers <= 1:
+        return [hash_file(path, region_size) for path in paths]
+    pool = ThreadPool(workers)
+    try:
+        return pool.map(lambda path: hash_file(path, region_size), paths)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def first_mismatch(old_regions, new_regions, region_size):
+    """
+    Get the offset of the first region which differs
+
+    :param old_regions: list of region digests
+    :param new_regions: list of region digests
+    :param region_size: size of every region
+    :return: offset in bytes, None if all regions are the same or there
+             are no region digests
+    """
+    if old_regions is None or new_regions is None:
+        return None
+    for index, (old, new) in enumerate(zip(old_regions, new_regions)):
+        if old != new:
+            return index * region_size
+    if len(old_regions) != len(new_regions):
+        return min(len(old_regions), len(new_regions)) * region_size
+    return None
+
+
+def get_guest_script():
+    """
+    Get the source of a script which runs hash_file() on the paths given
+    in its arguments in parallel threads, and prints one json line of
+    [path, [digest, region digests]] or [path, error] per path
+
+    :return: str, python source
+    """
+    return '\n'.join(['import hashlib', 'import json', 'import os',
+                      'import sys', 'import threading',
+                      'CHUNK_SIZE = %s' % CHUNK_SIZE, '',
+                      inspect.getsource(hash_file), GUEST_MAIN])
+
+
+def hash_in_session(session, paths, region_size=CHUNK_SIZE, timeout=600):
+    """
+    Hash files or devices in a vm with hash_file(), in parallel threads
+
+    Fall back to sha256sum without region digests if there is no python3
+    in the vm.
+
+    :param session: vm session
+    :param paths: list of paths in vm
+    :param region_size: see hash_file()
+    :param timeout: seconds to wait for the hashing
+    :return: list of (digest, region digests), in the order of paths
+    """
+    if session.cmd_status("which python3"):
+        LOG.debug("No python3 in vm, hash %s by sha256sum", paths)
+        results = []
+        for path in paths:
+            status, output = session.cmd_status_output("sha256sum %s" % path,
+                                                       timeout=timeout)
+            if status:
+                raise exceptions.TestError("Failed to get sha256sum of %s: "
+                                           "%s" % (path, output))
+            results.append((output.split()[0], None))
+        return results
+
+    script = base64.b64encode(get_guest_script().encode()).decode()
+    session.cmd("echo %s | base64 -d > %s" % (script, GUEST_SCRIPT_PATH))
+    output = session.cmd_output("python3 %s %s %s" % (
+        GUEST_SCRIPT_PATH, region_size, " ".join(paths)), timeout=timeout)
+    results = {}
+    for line in output.splitlines():
+        if line.startswith('["'):
+            path, result = json.loads(line)
+            results[path] = result
+    for path in paths:
+        if not isinstance(results.get(path), list):
+            raise exceptions.TestError("Failed to hash %s in vm: %s"
+                                       % (path, results.get(path, output)))
+    return [tuple(results[path]) for path in paths]
+
+
+class DigestHistory(object):
+    """
+    Last digests of files, on host or in a vm
+
+    Every call of get() hashes the files again, so a change is never
+    missed, and the last region digests of a file tell where it changes.
+    """
+
+    def __init__(self, region_size=None):
+        """
+        :param region_size: size of regions to keep digests of, None means
+                            keeping the digest of the whole file only
+        """
+        self.region_size = region_size
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(path, session):
+        return ("vm" if session else "host", path)
+
+    def get(self, paths, session=None):
+        """
+        Hash paths in parallel and record their digests
+
+        :param paths: list of paths
+        :param session: vm session if the paths are in a vm
+        :return: list of (digest, region digests), in the order of paths
+        """
+        LOG.debug("Hash %s", paths)
+        if session:
+            results = hash_in_session(session, paths,
+                                      self.region_size or CHUNK_SIZE)
+        else:
+            results = hash_files(paths, self.region_size)
+        with self._lock:
+            for path, result in zip(paths, results):
+                self._entries[self._key(path, session)] = result
+        return results
+
+    def peek(self, path, session=None):
+        """
+        Get the last digests of a path without hashing
+
+        :param path: path of file
+        :param session: vm session if the path is in a vm
+        :return: (digest, region digests), None if not hashed yet
+        """
+        with self._lock:
+            return self._entries.get(self._key(path, session))
+
+    def clear(self):
+        """
+        Drop all the recorded digests
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+# Shared by the checks of one test process
+DIGESTS = DigestHistory(region_size=CHUNK_SIZE)
@@ -0,0 +1,260 @@
+import csv
+import datetime
+import logging
+import re
+import threading
+
+from virttest import utils_misc
+from virttest import virsh
+
+from provider.libvirt_bench import libvirt_bench_base
+
+LOG = logging.getLogger('avocado.' + __name__)
+
+
+class AllocationSampler(libvirt_bench_base.PeriodicSampler):
+    """
+    Sample the allocation of the disks of a domain as a time series
+
+    The allocation is polled with "domstats --block" over one persistent
+    virsh session in a background thread.
+
+    Usage:
+    sampler = AllocationSampler(vm_name, interval=0.1)
+    sampler.start()
+    ####
+    write in guest
+    ####
+    sampler.stop()
+    sampler.get_crossing_time("vdb", threshold)
+    """
+    FIELD_PATTERN = re.compile(r"block\.(\d+)\.(name|backingIndex|"
+                               r"allocation)=(\S+)")
+    need_virsh_session = True
+
+    def __init__(self, vm_name, interval=0.1, uri=None, backing=False):
+        """
+        :param vm_name: name of the domain
+        :param interval: seconds between two polls
+        :param uri: uri to connect
+        :param backing: also sample the backing chain elements if True
+        """
+        super(AllocationSampler, self).__init__(interval, uri)
+        self.vm_name = vm_name
+        self.backing = backing
+        # Samples are (time, dict of disk name -> allocation)
+
+    def describe(self):
+        return "allocation of %s" % self.vm_name
+
+    def parse_domstats(self, output):
+        """
+        Parse the output of "domstats --block"
+
+        :param output: str, output of domstats
+        :return: dict, disk name -> allocation, the disk name is the
+                 target, and backing elements are named like "vdb[1]"
+        """
+        blocks = {}
+        for index, field, value in self.FIELD_PATTERN.findall(output):
+            blocks.setdefault(index, {})[field] = value
+        allocations = {}
+        for index in sorted(blocks, key=int):
+            block = blocks[index]
+            name = block.get('name')
+            if not name or 'allocation' not in block:
+                continue
+            if name in allocations:
+                # The first block of a name is the active layer
+                name = "%s[%s]" % (name, block.get('backingIndex', index))
+            allocations[name] = int(block['allocation'])
+        return allocations
+
+    def sample(self, session, timestamp):
+        """
+        Poll the allocation of the disks once
+        """
+        cmd = "domstats %s --block" % self.vm_name
+        if self.backing:
+            cmd += " --backing"
+        status, output = session.cmd_status_output(cmd)
+        if not status:
+            self.add((timestamp, self.parse_domstats(output)))
+
+    def get_allocation(self, disk):
+        """
+        Get the latest sampled allocation of a disk
+
+        :param disk: disk name, e.g. "vdb"
+        :return: allocation in bytes, None if not sampled
+        """
+        for _, allocations in reversed(self.get_samples()):
+            if disk in allocations:
+                return allocations[disk]
+        return None
+
+    def get_crossing_time(self, disk, threshold, since=0):
+        """
+        Get the time when the allocation of a disk crossed a threshold
+
+        The time is interpolated between the last sample below the
+        threshold and the first sample at or above it.
+
+        :param disk: disk name, e.g. "vdb"
+        :param threshold: threshold in bytes
+        :param since: only check samples after this time
+        :return: time in seconds since the epoch, None if not crossed
+        """
+        samples = [(sample_time, allocations[disk])
+                   for sample_time, allocations in self.get_samples()
+                   if sample_time >= since and disk in allocations]
+        previous = None
+        for sample_time, allocation in samples:
+            if allocation >= threshold:
+                if previous is None or previous[1] == allocation:
+                    return sample_time
+                ratio = float(threshold - previous[1]) / (allocation -
+                                                          previous[1])
+                return previous[0] + ratio * (sample_time - previous[0])
+            previous = (sample_time, allocation)
+        return None
+
+    def get_write_rate(self, disk):
+        """
+        Get the average growth rate of the allocation of a disk
+
+        :param disk: disk name, e.g. "vdb"
+        :return: bytes per second, None if there are less than 2 samples
+        """
+        samples = [(sample_time, allocations[disk])
+                   for sample_time, allocations in self.get_samples()
+                   if disk in allocations]
+        if len(samples) < 2 or samples[-1][0] == samples[0][0]:
+            return None
+        return ((samples[-1][1] - samples[0][1]) /
+                (samples[-1][0] - samples[0][0]))
+
+    def save(self, path):
+        """
+        Save the samples as a csv file
+
+        :param path: path of the csv file
+        """
+        samples = self.get_samples()
+        disks = sorted(set(disk for _, allocations in samples
+                           for disk in allocations))
+        self.save_csv(path, ['time'] + disks,
+                      [dict(allocations, time=sample_time)
+                       for sample_time, allocations in samples])
+
+
+class ThresholdEventWatcher(object):
+    """
+    Watch the block-threshold events of a domain with one "virsh event"
+    session, the events are timestamped by virsh
+    """
+    EVENT_CMD = "event {} --loop --timestamp --event block-threshold"
+    EVENT_PATTERN = re.compile(r"^(\S+ \S+): event 'block-threshold' for "
+                               r"domain '?(.+?)'?: dev: (\S+?)\((.*)\) "
+                               r"(\d+) (\d+)$")
+
+    def __init__(self, vm_name, uri=None):
+        self.vm_name = vm_name
+        self.session = virsh.EventTracker.start_get_event(
+            vm_name, event_cmd=self.EVENT_CMD, uri=uri)
+        # List of (timestamp, dev, path, threshold, excess)
+        self.events = []
+        self._offset = 0
+        self._lock = threading.Lock()
+
+    def _parse_output(self):
+        """
+        Parse the complete lines got since the last parsing
+        """
+        with self._lock:
+            output = self.session.get_output()
+            end = output.rfind("\n") + 1
+            new_lines = output[self._offset:end].splitlines()
+            self._offset = max(self._offset, end)
+            for line in new_lines:
+                match = self.EVENT_PATTERN.search(line.strip())
+                if not match:
+                    continue
+                timestamp = datetime.datetime.strptime(
+                    match.group(1), "%Y-%m-%d %H:%M:%S.%f%z").timestamp()
+                self.events.append((timestamp, match.group(3),
+                                    match.group(4), int(match.group(5)),
+                                    int(match.group(6))))
+
+    def find_event(self, dev, threshold):
+        """
+        Find the event of a threshold of a device
+
+        :param dev: device target, e.g. "vdb" or "vdb[1]"
+        :param threshold: threshold in bytes
+        :return: (timestamp, excess) of the event, None if not found
+        """
+        self._parse_output()
+        for timestamp, event_dev, _, event_threshold, excess in self.events:
+            if event_dev == dev and event_threshold == threshold:
+                return timestamp, excess
+        return None
+
+    def wait_for_event(self, dev, threshold, timeout=60):
+        """
+        Wait for the event of a threshold of a device
+
+        :param dev: device target
+        :param threshold: threshold in bytes
+        :param timeout: seconds to wait
+        :return: (timestamp, excess) of the event, None if not received
+        """
+        return utils_misc.wait_for(lambda: self.find_event(dev, threshold),
+                                   timeout, step=0.01)
+
+    def close(self):
+        """
+        Stop watching events
+        """
+        virsh.EventTracker.finish_get_event(self.session)
+
+
+def get_rate_writer_cmd(dev, rate, size, slice_time=0.1):
+    """
+    Get the shell command which writes a guest disk at a target rate
+
+    Every slice writes rate * slice_time MiB with direct io and sleeps for
+    the slice, so the achieved rate is a bit lower than the target when
+    the disk is slow.
+
+    :param dev: guest device, e.g. "/dev/vdb"
+    :param rate: target rate in MiB/s
+    :param size: MiB to write in total
+    :param slice_time: seconds of every slice
+    :return: str, command which runs in background
+    """
+    chunk = max(1, int(rate * slice_time))
+    count = int(size) // chunk
+    return ("nohup sh -c 'i=0; while [ $i -lt %d ]; do "
+            "dd if=/dev/zero of=%s bs=1M count=%d seek=$((i*%d)) "
+            "oflag=direct conv=notrunc 2>/dev/null; sleep %s; i=$((i+1)); "
+            "done' >/dev/null 2>&1 &" % (count, dev, chunk, chunk, slice_time))
+
+
+def save_latencies(latencies, path):
+    """
+    Save the threshold event latencies as a csv file
+
+    :param latencies: list of dict with threshold, crossing_time, event_time
+                      and latency
+    :param path: path of the csv file
+    """
+    with open(path, 'w', newline='') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=['threshold',
+                                                      'crossing_time',
+                                                      'event_time', 'latency',
+                                                      'excess'])
+        writer.writeheader()
+        writer.writerows(latencies)
+    LOG.debug("Threshold event latencies are saved to %s", path)
+
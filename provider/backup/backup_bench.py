@@ -0,0 +1,268 @@
+import json
+import logging
+import re
+
+from avocado.utils import process
+
+from virttest import utils_backup
+from virttest import virsh
+
+LOG = logging.getLogger('avocado.' + __name__)
+
+
+def dirty_guest_disk(session, dev, disk_size, ratio, chunk_size=1, offset=0,
+                     timeout=3600):
+    """
+    Overwrite a ratio of a guest disk in chunks spread evenly over the disk
+
+    Exactly int(disk_size / chunk_size * ratio) chunks are overwritten.
+
+    :param session: vm session
+    :param dev: guest device, e.g. "/dev/vdb"
+    :param disk_size: size of the disk in MiB
+    :param ratio: float, ratio of the disk to overwrite, 0-1
+    :param chunk_size: size of every chunk in MiB
+    :param offset: index of the first chunk, change it between rounds to
+                   dirty different chunks
+    :param timeout: seconds to wait for the writing
+    :return: bytes written
+    """
+    total_chunks = int(disk_size) // chunk_size
+    count = int(total_chunks * float(ratio))
+    if not count:
+        return 0
+    # Chunk i*total/count is the i-th one, shifted by offset, so the count
+    # is exact however close the ratio is to 1
+    cmd = ("for i in $(seq 0 %d); do j=$(((i*%d/%d+%d)%%%d)); "
+           "dd if=/dev/urandom of=%s bs=1M count=%d seek=$((j*%d)) "
+           "oflag=direct conv=notrunc 2>/dev/null; done; sync"
+           % (count - 1, total_chunks, count, offset, total_chunks, dev,
+              chunk_size, chunk_size))
+    LOG.info("Dirty %s chunks of %sMiB in %s", count, chunk_size, dev)
+    session.cmd(cmd, timeout=timeout)
+    return count * chunk_size * 1048576
+
+
+def get_dirty_bitmap_bytes(nbd_params, bitmap_name):
+    """
+    Get the size of the dirty areas of a bitmap exported by NBD
+
+    :param nbd_params: dict of the nbd service, the same as the one of
+                       utils_backup.pull_incremental_backup_to_file()
+    :param bitmap_name: name of the exported dirty bitmap
+    :return: dirty bytes
+    """
+    export = nbd_params.get("nbd_export", "vdb")
+    tls_dir = nbd_params.get("tls_dir")
+    if nbd_params.get("nbd_protocol", "tcp") == "unix":
+        server = "server.type=unix,server.path=%s" % nbd_params.get(
+            "nbd_socket", "/tmp/pull_backup.socket")
+    else:
+        server = "server.type=inet,server.host=%s,server.port=%s" % (
+            nbd_params.get("nbd_hostname", "127.0.0.1"),
+            nbd_params.get("nbd_tcp_port", "10809"))
+    image_opts = ("driver=nbd,export=%s,%s,x-dirty-bitmap=qemu:dirty-bitmap:%s"
+                  % (export, server, bitmap_name))
+    cmd = "qemu-img map --output=json -U"
+    if tls_dir:
+        image_opts += ",tls-creds=tls0"
+        cmd += (" --object tls-creds-x509,id=tls0,endpoint=client,dir=%s"
+                % tls_dir)
+    cmd += " --image-opts %s" % image_opts
+    output = process.run(cmd, shell=True).stdout_text
+    # With x-dirty-bitmap, the dirty areas are reported as not data
+    return sum(entry["length"] for entry in json.loads(output)
+               if not entry["data"])
+
+
+def get_image_data_bytes(image_path, driver="qcow2"):
+    """
+    Get the size of the allocated data of an image
+
+    :param image_path: path of the image
+    :param driver: format of the image
+    :return: bytes of data
+    """
+    return sum(entry["length"] for entry in
+               utils_backup.get_img_data_map(image_path, driver))
+
+
+def get_backup_job_stats(vm_name):
+    """
+    Get the raw statistics of the last completed backup job
+
+    :param vm_name: name of the domain
+    :return: dict, field -> value, empty if not available
+    """
+    result = virsh.domjobinfo(vm_name, extra="--completed --rawstats",
+                              ignore_status=True, debug=True)
+    stats = {}
+    if result.exit_status:
+        return stats
+    for line in result.stdout_text.splitlines():
+        match = re.search(r"^\s*(\w+)[:=]\s*(\d+)\s*$", line)
+        if match:
+            stats[match.group(1)] = int(match.group(2))
+    return stats
+
+
+class BackupBenchmark(object):
+    """
+    Results of the backup rounds of one benchmark run
+
+    Usage:
+    bench = BackupBenchmark("pull", "unix", disk_size)
+    bench.add(0, "full", duration, transferred, dirty_bytes, written)
+    bench.log()
+    bench.save(path)
+    """
+
+    COLUMNS = ['round', 'type', 'duration', 'guest_written', 'bitmap_dirty',
+               'transferred', 'throughput']
+
+    def __init__(self, mode, transport, disk_size):
+        """
+        :param mode: backup mode, "pull" or "push"
+        :param transport: nbd transport or target type, e.g. "unix", "tls"
+        :param disk_size: size of the disk in bytes
+        """
+        self.mode = mode
+        self.transport = transport
+        self.disk_size = disk_size
+        self.rounds = []
+
+    def add(self, round_index, backup_type, duration, transferred,
+            bitmap_dirty=None, guest_written=None):
+        """
+        Add the result of one backup round
+
+        :param round_index: index of the round
+        :param backup_type: "full" or "incremental"
+        :param duration: seconds the backup took
+        :param transferred: bytes read from the export or written to the
+                            target
+        :param bitmap_dirty: bytes marked dirty in the bitmap
+        :param guest_written: bytes written in guest before the round
+        """
+        result = {'round': round_index, 'type': backup_type,
+                  'duration': duration, 'guest_written': guest_written,
+                  'bitmap_dirty': bitmap_dirty, 'transferred': transferred,
+                  'throughput': transferred / 1048576.0 / duration
+                  if duration else None}
+        LOG.info("%s %s backup round %s: %s", self.mode, backup_type,
+                 round_index, result)
+        self.rounds.append(result)
+
+    def log(self):
+        """
+        Log the results as a table, sizes in MiB and throughput in MiB/s
+        """
+        LOG.info("%s mode backup over %s, disk size %.0fMiB:", self.mode,
+                 self.transport, self.disk_size / 1048576.0)
+        LOG.info("  %-6s %-12s %-10s %-10s %-10s %-12s %-10s", *self.COLUMNS)
+        for result in self.rounds:
+            values = [result[column] for column in self.COLUMNS]
+            for index in (3, 4, 5):
+                if values[index] is not None:
+                    values[index] = "%.1f" % (values[index] / 1048576.0)
+            for index in (2, 6):
+                if values[index] is not None:
+                    values[index] = "%.2f" % values[index]
+            LOG.info("  %-6s %-12s %-10s %-10s %-10s %-12s %-10s", *values)
+
+    def save(self, path):
+        """
+        Save the results as a json file
+
+        :param path: path of the json file
+        """
+        with open(path, 'w') as result_file:
+            json.dump({'mode': self.mode, 'transport': self.transport,
+                       'disk_size': self.disk_size, 'rounds': self.rounds},
+                      result_file, indent=2)
+        LOG.debug("Backup benchmark results are saved to %s", path)
+
+
+class MultiDiskBenchmark(object):
+    """
+    Results of backup jobs over a growing number of disks
+
+    Every job reads the exports of all its disks concurrently. The
+    concurrency of a job is the sum of the per-disk read times divided by
+    the job wall time, it is close to the disk count when the disks are
+    really read in parallel, and close to 1 when they are serialized.
+
+    Usage:
+    bench = MultiDiskBenchmark(disk_size)
+    bench.add(disk_count, wall_time, {'vdb': {'duration': 1.2,
+                                              'transferred': 104857600}})
+    bench.log()
+    bench.save(path)
+    """
+
+    def __init__(self, disk_size):
+        """
+        :param disk_size: size of every disk in bytes
+        """
+        self.disk_size = disk_size
+        self.jobs = []
+
+    def add(self, disk_count, wall_time, disk_results):
+        """
+        Add the result of one backup job
+
+        :param disk_count: number of disks in the job
+        :param wall_time: seconds from backup begin to job end
+        :param disk_results: dict, disk -> dict with duration and transferred
+        """
+        for result in disk_results.values():
+            result['throughput'] = (result['transferred'] / 1048576.0 /
+                                    result['duration']
+                                    if result['duration'] else None)
+        transferred = sum(result['transferred']
+                          for result in disk_results.values())
+        disk_time = sum(result['duration'] for result in disk_results.values())
+        job = {'disks': disk_count, 'wall_time': wall_time,
+               'transferred': transferred,
+               'throughput': transferred / 1048576.0 / wall_time
+               if wall_time else None,
+               'max_disk_time': max(result['duration']
+                                    for result in disk_results.values()),
+               'concurrency': disk_time / wall_time if wall_time else None,
+               'per_disk': disk_results}
+        if self.jobs and self.jobs[0]['throughput'] and job['throughput']:
+            job['relative_throughput'] = (job['throughput'] /
+                                          self.jobs[0]['throughput'])
+        else:
+            job['relative_throughput'] = 1.0
+        LOG.info("Backup job of %s disks: wall time %.2fs, %.1fMiB/s, "
+                 "concurrency %.2f", disk_count, wall_time,
+                 job['throughput'] or 0, job['concurrency'] or 0)
+        self.jobs.append(job)
+
+    def log(self):
+        """
+        Log the results as a table, sizes in MiB and throughput in MiB/s
+        """
+        LOG.info("Multi-disk backup scaling, disk size %.0fMiB:",
+                 self.disk_size / 1048576.0)
+        LOG.info("  %-6s %-10s %-12s %-10s %-14s %-12s %-10s", 'disks',
+                 'wall_time', 'transferred', 'throughput', 'max_disk_time',
+                 'concurrency', 'relative')
+        for job in self.jobs:
+            LOG.info("  %-6s %-10.2f %-12.1f %-10.1f %-14.2f %-12.2f %-10.2f",
+                     job['disks'], job['wall_time'],
+                     job['transferred'] / 1048576.0, job['throughput'] or 0,
+                     job['max_disk_time'], job['concurrency'] or 0,
+                     job['relative_throughput'])
+
+    def save(self, path):
+        """
+        Save the results as a json file
+
+        :param path: path of the json file
+        """
+        with open(path, 'w') as result_file:
+            json.dump({'disk_size': self.disk_size, 'jobs': self.jobs},
+                      result_file, indent=2)
+        LOG.debug("Multi-disk backup results are saved to %s", path)
@@ -0,0 +1,227 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+from avocado.core import exceptions
+
+try:
+    import nbd
+except ImportError:
+    nbd = None
+
+LOG = logging.getLogger('avocado.' + __name__)
+
+# Max length of one block status query
+BLOCK_STATUS_LENGTH = 1 << 30
+
+
+def uri_from_params(nbd_params):
+    """
+    Get the NBD URI of a backup export
+
+    :param nbd_params: dict of the nbd service, the same as the one of
+                       utils_backup.pull_full_backup_to_file()
+    :return: str, NBD URI
+    """
+    export = nbd_params.get("nbd_export", "vdb")
+    if nbd_params.get("nbd_protocol", "tcp") == "unix":
+        return "nbd+unix:///%s?socket=%s" % (
+            export, nbd_params.get("nbd_socket", "/tmp/pull_backup.socket"))
+    uri = "%s://%s:%s/%s" % ("nbds" if nbd_params.get("tls_dir") else "nbd",
+                             nbd_params.get("nbd_hostname", "127.0.0.1"),
+                             nbd_params.get("nbd_tcp_port", "10809"), export)
+    if nbd_params.get("tls_dir"):
+        uri += "?tls-certificates=%s" % nbd_params["tls_dir"]
+    return uri
+
+
+class ParallelNBDReader(object):
+    """
+    Read an NBD export over several connections in parallel
+
+    Only the extents which hold data, or which are dirty in a bitmap, are
+    read, as reported by block status on the first connection. They are
+    cut into requests and read by one thread per connection from a shared
+    queue, and written at their offsets to a sparse raw file.
+
+    Usage:
+    reader = ParallelNBDReader(uri, connections=4, bitmap="backup-vdb")
+    stats = reader.read_to_file("/tmp/backup.raw")
+    """
+
+    def __init__(self, uri, connections=4, bitmap=None,
+                 request_size=2 * 1024 * 1024):
+        """
+        :param uri: NBD URI of the export
+        :param connections: number of NBD connections
+        :param bitmap: name of the exported dirty bitmap, only the dirty
+                       extents are read if set
+        :param request_size: max bytes of every read request
+        """
+        if nbd is None:
+            raise exceptions.TestCancel("python3-libnbd is required to read "
+                                        "NBD exports in parallel")
+        self.uri = uri
+        self.connections = max(1, int(connections))
+        self.bitmap = bitmap
+        self.request_size = int(request_size)
+        self.handles = []
+
+    def connect(self):
+        """
+        Open all the connections
+        """
+        for _ in range(self.connections):
+            handle = nbd.NBD()
+            handle.add_meta_context("base:allocation")
+            if self.bitmap:
+                handle.add_meta_context("qemu:dirty-bitmap:%s" % self.bitmap)
+            handle.connect_uri(self.uri)
+            self.handles.append(handle)
+        if self.connections > 1 and not self.handles[0].can_multi_conn():
+            LOG.warning("%s does not advertise multi-conn, reading it over "
+                        "%s connections is only safe as the export is not "
+                        "written meanwhile", self.uri, self.connections)
+
+    def close(self):
+        """
+        Close all the connections
+        """
+        for handle in self.handles:
+            handle.shutdown()
+        self.handles = []
+
+    def get_extents(self):
+        """
+        Get the extents to read
+
+        :return: list of (offset, length)
+        """
+        handle = self.handles[0]
+        size = handle.get_size()
+        if self.bitmap:
+            context = "qemu:dirty-bitmap:%s" % self.bitmap
+        else:
+            context = "base:allocation"
+        extents = []
+        offset = 0
+        while offset < size:
+            entries = []
+
+            def _extent(metacontext, _offset, found, _error):
+                if metacontext == context:
+                    entries.extend(found)
+                return 0
+
+            handle.block_status(min(size - offset, BLOCK_STATUS_LENGTH),
+                                offset, _extent)
+            position = offset
+            for index in range(0, len(entries), 2):
+                length = min(entries[index], size - position)
+                flags = entries[index + 1]
+                if self.bitmap:
+                    # Bit 0 of the bitmap context means dirty
+                    wanted = flags & 1
+                else:
+                    wanted = not flags & nbd.STATE_ZERO
+                if wanted and length:
+                    if extents and extents[-1][0] + extents[-1][1] == position:
+                        extents[-1] = (extents[-1][0], extents[-1][1] + length)
+                    else:
+                        extents.append((position, length))
+                position += length
+            if position == offset:
+                raise exceptions.TestError("No block status of %s at %s"
+                                           % (self.uri, offset))
+            offset = position
+        return extents
+
+    def _read_worker(self, handle, requests, fd, stats, errors):
+        try:
+            while True:
+                try:
+                    offset, length = requests.get_nowait()
+                except queue.Empty:
+                    return
+                data = handle.pread(length, offset)
+                # Write the bytes got from libnbd as they are, without
+                # copying them into another buffer
+                os.pwrite(fd, data, offset)
+                stats['bytes'] += length
+                stats['requests'] += 1
+        except Exception as detail:
+            errors.append(detail)
+
+    def read_to_file(self, target_path):
+        """
+        Read the export into a sparse raw file
+
+        :param target_path: path of the raw file
+        :return: dict with bytes read, extents, duration, throughput(MiB/s)
+                 and the bytes read over every connection
+        """
+        begin = time.time()
+        self.connect()
+        try:
+            size = self.handles[0].get_size()
+            extents = self.get_extents()
+            requests = queue.Queue()
+            for offset, length in extents:
+                end = offset + length
+                while offset < end:
+                    requests.put((offset, min(self.request_size,
+                                              end - offset)))
+                    offset += self.request_size
+            fd = os.open(target_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                         0o644)
+            try:
+                os.ftruncate(fd, size)
+                conn_stats = [{'bytes': 0, 'requests': 0}
+                              for _ in self.handles]
+                errors = []
+                threads = [threading.Thread(target=self._read_worker,
+                                            args=(handle, requests, fd,
+                                                  conn_stats[index], errors))
+                           for index, handle in enumerate(self.handles)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            finally:
+                os.close(fd)
+            if errors:
+                raise exceptions.TestFail("Failed to read %s: %s"
+                                          % (self.uri, errors[0]))
+        finally:
+            self.close()
+        duration = time.time() - begin
+        total = sum(stats['bytes'] for stats in conn_stats)
+        result = {'bytes': total, 'size': size, 'extents': len(extents),
+                  'duration': duration,
+                  'throughput': total / 1048576.0 / duration
+                  if duration else None,
+                  'connections': conn_stats}
+        LOG.info("Read %s bytes in %s extents from %s over %s connections "
+                 "in %.2fs", total, len(extents), self.uri, self.connections,
+                 duration)
+        return result
+
+
+def pull_backup_to_file(nbd_params, target_path, bitmap_name=None,
+                        connections=4):
+    """
+    Dump pull-mode backup data to a sparse raw file over several NBD
+    connections
+
+    :param nbd_params: dict of the nbd service, see uri_from_params()
+    :param target_path: path of the raw file
+    :param bitmap_name: dirty bitmap of an incremental backup, None for a
+                        full backup
+    :param connections: number of NBD connections
+    :return: dict of stats, see ParallelNBDReader.read_to_file()
+    """
+    reader = ParallelNBDReader(uri_from_params(nbd_params), connections,
+                               bitmap_name)
+    return reader.read_to_file(target_path)
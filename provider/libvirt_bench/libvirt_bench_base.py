@@ -0,0 +1,436 @@
+import csv
+import datetime
+import json
+import logging
+import math
+import re
+import threading
+import time
+
+from virttest import utils_misc
+from virttest import virsh
+
+LOG = logging.getLogger('avocado.' + __name__)
+
+
+def split_into_groups(items, group_count):
+    """
+    Split items into group_count groups in a round-robin way
+
+    :param items: list of items, e.g. vm objects
+    :param group_count: number of groups, it is capped by len(items)
+    :return: list of non-empty lists
+    """
+    group_count = max(1, min(int(group_count), len(items)))
+    groups = [[] for _ in range(group_count)]
+    for index, item in enumerate(items):
+        groups[index % group_count].append(item)
+    return groups
+
+
+def percentile(values, percent):
+    """
+    Get the percentile of values with the nearest-rank method
+
+    :param values: list of numbers
+    :param percent: percentile to get, 0-100
+    :return: the percentile value, None if values is empty
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = int(math.ceil(percent / 100.0 * len(ordered)))
+    return ordered[max(rank, 1) - 1]
+
+
+class LatencyRecorder(object):
+    """
+    Thread-safe recorder of per-operation latencies
+    """
+
+    def __init__(self):
+        self.samples = {}
+        self.start_time = time.time()
+        self.end_time = None
+        self._lock = threading.Lock()
+
+    def record(self, operation, latency):
+        """
+        Record one latency sample of an operation
+
+        :param operation: str, name of the operation, e.g. "start"
+        :param latency: float, latency in seconds
+        """
+        with self._lock:
+            self.samples.setdefault(operation, []).append(latency)
+
+    def timeit(self, operation, func, *args, **kwargs):
+        """
+        Run func and record its latency under operation
+
+        :param operation: str, name of the operation
+        :param func: function to run
+        :return: the return value of func
+        """
+        begin = time.time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.record(operation, time.time() - begin)
+
+    def merge(self, samples):
+        """
+        Merge samples got from another recorder
+
+        :param samples: dict, operation -> list of latencies
+        """
+        with self._lock:
+            for operation, latencies in samples.items():
+                self.samples.setdefault(operation, []).extend(latencies)
+
+    def stop(self):
+        """
+        Stop the recorder, which fixes the elapsed time used by summary
+        """
+        self.end_time = time.time()
+
+    def elapsed(self):
+        """
+        Get the seconds elapsed since the recorder was created
+        """
+        return (self.end_time or time.time()) - self.start_time
+
+    def summary(self):
+        """
+        Get the statistics of every operation
+
+        :return: dict, operation -> dict of count, p50, p95, p99 and
+                 ops_per_sec
+        """
+        elapsed = self.elapsed()
+        result = {}
+        with self._lock:
+            for operation, latencies in self.samples.items():
+                result[operation] = {
+                    'count': len(latencies),
+                    'p50': percentile(latencies, 50),
+                    'p95': percentile(latencies, 95),
+                    'p99': percentile(latencies, 99),
+                    'ops_per_sec': len(latencies) / elapsed if elapsed else 0}
+        return result
+
+    def log_summary(self, title="Latency summary"):
+        """
+        Log the statistics of every operation
+        """
+        LOG.info("%s (elapsed %.2fs):", title, self.elapsed())
+        for operation, stats in sorted(self.summary().items()):
+            LOG.info("  %-10s count=%d p50=%.3fs p95=%.3fs p99=%.3fs "
+                     "ops/sec=%.2f", operation, stats['count'],
+                     stats['p50'], stats['p95'], stats['p99'],
+                     stats['ops_per_sec'])
+
+    def dump(self, path):
+        """
+        Dump the raw samples and the summary into a json file
+
+        :param path: path of the json file
+        """
+        with self._lock:
+            data = {'elapsed': self.elapsed(),
+                    'samples': dict(self.samples)}
+        data['summary'] = self.summary()
+        with open(path, 'w') as result_file:
+            json.dump(data, result_file, indent=2)
+        LOG.debug("Latency samples are saved to %s", path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a recorder from a json file written by dump()
+
+        :param path: path of the json file
+        :return: LatencyRecorder object
+        """
+        with open(path) as result_file:
+            data = json.load(result_file)
+        recorder = cls()
+        recorder.merge(data['samples'])
+        recorder.end_time = recorder.start_time + data['elapsed']
+        return recorder
+
+
+class PeriodicSampler(object):
+    """
+    Base of the samplers which poll something every interval in a
+    background thread and keep the samples as a time series
+
+    A subclass implements sample(), which takes one sample and adds it by
+    add(). With need_virsh_session set, sample() gets one persistent virsh
+    session for the whole run, so polling does not fork virsh or reconnect
+    to libvirt.
+
+    Usage:
+    sampler = SomeSampler(interval=0.1)
+    sampler.start()
+    ####
+    operations
+    ####
+    sampler.stop()
+    sampler.save_csv(path, fieldnames)
+    """
+    need_virsh_session = False
+
+    def __init__(self, interval=1.0, uri=None, start_time=None):
+        """
+        :param interval: seconds between two samples, can be less than 1
+        :param uri: uri of the virsh session
+        :param start_time: time the samples are relative to, default is
+                           the time of start()
+        """
+        self.interval = float(interval)
+        self.uri = uri
+        self.start_time = start_time
+        self.samples = []
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def describe(self):
+        """
+        Describe what is sampled in logs, e.g. "allocation of vm1"
+        """
+        return self.__class__.__name__
+
+    def sample(self, session, timestamp):
+        """
+        Take one sample and add it by add()
+
+        :param session: VirshSession object, None if need_virsh_session is
+                        not set
+        :param timestamp: time in seconds since the epoch of the sample
+        """
+        raise NotImplementedError
+
+    def add(self, sample):
+        """
+        Add one sample
+
+        :param sample: the sample, its type is up to the subclass
+        """
+        with self._lock:
+            self.samples.append(sample)
+
+    def get_samples(self):
+        """
+        Get a copy of the samples taken so far
+
+        :return: list of samples
+        """
+        with self._lock:
+            return list(self.samples)
+
+    def _run(self):
+        session = None
+        if self.need_virsh_session:
+            session = virsh.VirshSession(virsh_exec=virsh.VIRSH_EXEC,
+                                         uri=self.uri, auto_close=True)
+        try:
+            while not self._stop_event.is_set():
+                begin = time.time()
+                self.sample(session, begin)
+                self._stop_event.wait(
+                    max(0, self.interval - (time.time() - begin)))
+        finally:
+            if session:
+                session.close()
+
+    def start(self):
+        """
+        Start sampling in a background thread
+        """
+        if self.start_time is None:
+            self.start_time = time.time()
+        LOG.info("Start sampling %s every %ss", self.describe(),
+                 self.interval)
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop sampling
+        """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        LOG.info("Got %s samples of %s", len(self.samples), self.describe())
+
+    def save_csv(self, path, fieldnames, rows=None):
+        """
+        Save samples as a csv file, the fields which are not in fieldnames
+        are skipped and the missing ones are left empty
+
+        :param path: path of the csv file
+        :param fieldnames: list of the columns
+        :param rows: list of dict, default is the samples
+        """
+        rows = self.get_samples() if rows is None else rows
+        with open(path, 'w', newline='') as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=fieldnames,
+                                    restval='', extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(rows)
+        LOG.debug("Samples of %s are saved to %s", self.describe(), path)
+
+
+def run_in_threads(func, args_list):
+    """
+    Run func with each args in args_list concurrently, one thread per args
+
+    :param func: function to run
+    :param args_list: list of tuple, the arguments of each call
+    :return: list of exceptions raised by the calls
+    """
+    errors = []
+    lock = threading.Lock()
+
+    def _worker(*args):
+        try:
+            func(*args)
+        except Exception as detail:
+            with lock:
+                errors.append(detail)
+
+    threads = [threading.Thread(target=_worker, args=args)
+               for args in args_list]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+def get_domain_states(virsh_instance=virsh):
+    """
+    Get the states of all domains with one "virsh list --all" query
+
+    :param virsh_instance: virsh module or a VirshPersistent instance
+    :return: dict, domain name -> state
+    """
+    output = virsh_instance.dom_list("--all", ignore_status=False).stdout
+    states = {}
+    for line in output.strip().splitlines()[2:]:
+        fields = line.split(None, 2)
+        if len(fields) == 3:
+            states[fields[1]] = fields[2].strip()
+    return states
+
+
+class LifecycleEventWatcher(object):
+    """
+    Watch the lifecycle events of all domains with one "virsh event" session
+
+    The events are timestamped by virsh, so the latency between issuing an
+    operation and receiving its event is not limited by polling granularity,
+    and waiting for an event does not send any query to the daemon.
+    """
+    EVENT_CMD = "event --loop --timestamp --event lifecycle"
+    EVENT_PATTERN = re.compile(r"^(\S+ \S+): event 'lifecycle' for domain "
+                               r"'?(.+?)'?: (\S+)(?: (\S+))?$")
+    # The lifecycle event which is emitted when an operation is done.
+    OPERATION_EVENTS = {'start': 'Started',
+                        'shutdown': 'Stopped',
+                        'destroy': 'Stopped',
+                        'suspend': 'Suspended',
+                        'resume': 'Resumed'}
+
+    def __init__(self, uri=None):
+        self.session = virsh.EventTracker.start_get_event(
+            None, event_cmd=self.EVENT_CMD, uri=uri)
+        # List of (timestamp, domain name, event, detail)
+        self.events = []
+        self._offset = 0
+        self._lock = threading.Lock()
+
+    def _parse_output(self):
+        """
+        Parse the complete lines got since the last parsing
+        """
+        with self._lock:
+            output = self.session.get_output()
+            end = output.rfind("\n") + 1
+            new_lines = output[self._offset:end].splitlines()
+            self._offset = max(self._offset, end)
+            for line in new_lines:
+                match = self.EVENT_PATTERN.search(line.strip())
+                if not match:
+                    continue
+                timestamp = datetime.datetime.strptime(
+                    match.group(1), "%Y-%m-%d %H:%M:%S.%f%z").timestamp()
+                self.events.append((timestamp, match.group(2),
+                                    match.group(3), match.group(4)))
+
+    def find_event(self, vm_name, event, since=0):
+        """
+        Find the first event of a domain which happened after since
+
+        :param vm_name: name of the domain
+        :param event: str, the lifecycle event, e.g. "Started"
+        :param since: float, time in seconds since the epoch
+        :return: the timestamp of the event, None if not found
+        """
+        self._parse_output()
+        for timestamp, domain, event_name, _ in self.events:
+            if (domain == vm_name and event_name == event and
+                    timestamp >= since):
+                return timestamp
+        return None
+
+    def wait_for_event(self, vm_name, event, since, timeout=60):
+        """
+        Wait for an event of a domain which happened after since
+
+        :param vm_name: name of the domain
+        :param event: str, the lifecycle event, e.g. "Started"
+        :param since: float, time in seconds since the epoch when the
+                      operation was issued
+        :param timeout: seconds to wait for the event
+        :return: latency in seconds from since to the event, None if the
+                 event is not received in timeout
+        """
+        timestamp = utils_misc.wait_for(
+            lambda: self.find_event(vm_name, event, since),
+            timeout, step=0.05)
+        if timestamp is None:
+            return None
+        return timestamp - since
+
+    def close(self):
+        """
+        Stop watching events
+        """
+        virsh.EventTracker.finish_get_event(self.session)
+
+
+def histogram(values, bounds):
+    """
+    Count values into buckets
+
+    :param values: list of numbers
+    :param bounds: sorted list of the upper bounds of buckets
+    :return: list of (label, count), the last bucket counts the values
+             greater than the last bound
+    """
+    counts = [0] * (len(bounds) + 1)
+    for value in values:
+        for index, bound in enumerate(bounds):
+            if value <= bound:
+                counts[index] += 1
+                break
+        else:
+            counts[-1] += 1
+    labels = ["<=%s" % bound for bound in bounds] + [">%s" % bounds[-1]]
+    return list(zip(labels, counts))
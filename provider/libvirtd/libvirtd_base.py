@@ -1,10 +1,15 @@
 
+import json
 import logging
+import os
+import time
 
 from avocado.core import exceptions
 from virttest import virsh
 from virttest.staging import service
 
+from provider.libvirt_bench import libvirt_bench_base
+
 LOG = logging.getLogger('avocado.' + __name__)
 
 
@@ -52,3 +57,176 @@ def check_virsh_connection(msg):
     else:
         raise exceptions.TestFail(f'Virsh connection {msg} FAILED:\n'
                                   f'{conn_result.stderr_text}')
+
+
+def get_service_pids(service_names):
+    """
+    Get pids of the running services by the command names in /proc
+
+    :param service_names: list of service names, e.g. ['virtqemud']
+    :return: dict, service name -> list of pids
+    """
+    pids = dict((name, []) for name in service_names)
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/comm') as comm_file:
+                comm = comm_file.read().strip()
+        except (IOError, OSError):
+            continue
+        if comm in pids:
+            pids[comm].append(int(entry))
+    return pids
+
+
+def get_process_usage(pid):
+    """
+    Get the resource usage of a process from /proc
+
+    :param pid: pid of the process
+    :return: dict with rss_kb, fds, threads and cpu_seconds,
+             None if the process is gone
+    """
+    try:
+        with open(f'/proc/{pid}/status') as status_file:
+            status = dict(line.split(':', 1) for line in status_file
+                          if ':' in line)
+        with open(f'/proc/{pid}/stat') as stat_file:
+            # Fields after the command name, which may contain spaces
+            stat = stat_file.read().rsplit(')', 1)[1].split()
+        fds = len(os.listdir(f'/proc/{pid}/fd'))
+        # A zombie or exiting process has no VmRSS
+        rss_kb = int(status['VmRSS'].split()[0])
+    except (IOError, OSError, KeyError):
+        return None
+    clock_ticks = os.sysconf('SC_CLK_TCK')
+    return {'rss_kb': rss_kb,
+            'fds': fds,
+            'threads': int(status['Threads']),
+            # utime and stime are the 14th and 15th fields of stat
+            'cpu_seconds': (int(stat[11]) + int(stat[12])) / clock_ticks}
+
+
+class DaemonResourceSampler(libvirt_bench_base.PeriodicSampler):
+    """
+    Sample the resource usage of libvirt daemons in background
+
+    Usage:
+    sampler = DaemonResourceSampler(utils_libvirtd.Libvirtd().service_list)
+    sampler.start()
+    ####
+    stress operations
+    ####
+    sampler.stop()
+    sampler.save(test.debugdir)
+    sampler.check_growth(max_rss_growth=20, max_fd_growth=10)
+    """
+    METRICS = ['rss_kb', 'fds', 'threads', 'cpu_seconds']
+
+    def __init__(self, service_list, interval=1.0):
+        """
+        :param service_list: list of service names to sample
+        :param interval: seconds between two samples
+        """
+        super(DaemonResourceSampler, self).__init__(interval)
+        self.service_list = list(service_list)
+
+    def describe(self):
+        return f'resource usage of {self.service_list}'
+
+    def sample(self, session, timestamp):
+        """
+        Sample all running processes of the services once
+        """
+        service_pids = get_service_pids(self.service_list)
+        for service_name, pids in service_pids.items():
+            for pid in pids:
+                usage = get_process_usage(pid)
+                if usage is None:
+                    continue
+                usage.update({'time': round(timestamp - self.start_time, 3),
+                              'service': service_name, 'pid': pid})
+                self.add(usage)
+
+    def stop(self):
+        """
+        Stop sampling and take a last sample
+        """
+        super(DaemonResourceSampler, self).stop()
+        self.sample(None, time.time())
+
+    def save(self, dir_path, prefix='daemon_resource'):
+        """
+        Save the time series as csv and json files
+
+        :param dir_path: directory to save the files
+        :param prefix: prefix of the file names
+        :return: tuple of csv file path and json file path
+        """
+        csv_path = os.path.join(dir_path, f'{prefix}.csv')
+        json_path = os.path.join(dir_path, f'{prefix}.json')
+        self.save_csv(csv_path, ['time', 'service', 'pid'] + self.METRICS)
+        with open(json_path, 'w') as json_file:
+            json.dump({'samples': self.samples,
+                       'verdicts': self.get_growth()}, json_file, indent=2)
+        LOG.debug(f'Resource usage is saved to {csv_path} and {json_path}')
+        return csv_path, json_path
+
+    def get_growth(self, window=0.1):
+        """
+        Get the growth of every metric of every process
+
+        The growth is the difference between the median of the samples in
+        the last window and the one in the first window, so a single spike
+        does not look like a leak.
+
+        :param window: fraction of samples at both ends to compare
+        :return: dict, "service(pid)" -> dict, metric -> dict of first,
+                 last and growth
+        """
+        series = {}
+        for sample in self.samples:
+            series.setdefault(f"{sample['service']}({sample['pid']})",
+                              []).append(sample)
+        growth = {}
+        for key, process_samples in series.items():
+            count = max(1, int(len(process_samples) * window))
+            growth[key] = {}
+            for metric in self.METRICS:
+                values = [sample[metric] for sample in process_samples]
+                first = sorted(values[:count])[count // 2]
+                last = sorted(values[-count:])[count // 2]
+                growth[key][metric] = {'first': first, 'last': last,
+                                       'growth': last - first}
+        return growth
+
+    def check_growth(self, max_rss_growth=None, max_fd_growth=None,
+                     max_thread_growth=None):
+        """
+        Check the growth of resources against limits
+
+        :param max_rss_growth: max growth of rss in percent
+        :param max_fd_growth: max growth of the number of fds
+        :param max_thread_growth: max growth of the number of threads
+        :raise: TestFail if any resource grows more than its limit
+        """
+        err_msgs = []
+        for key, metrics in self.get_growth().items():
+            LOG.info(f'Resource usage of {key}: ' + ', '.join(
+                f"{metric} {value['first']}->{value['last']}"
+                for metric, value in metrics.items()))
+            rss = metrics['rss_kb']
+            if (max_rss_growth is not None and rss['first'] and
+                    rss['growth'] * 100.0 / rss['first'] > max_rss_growth):
+                err_msgs.append(f"RSS of {key} grows from {rss['first']}KiB "
+                                f"to {rss['last']}KiB")
+            for metric, limit in [('fds', max_fd_growth),
+                                  ('threads', max_thread_growth)]:
+                if limit is not None and metrics[metric]['growth'] > limit:
+                    err_msgs.append(f"{metric} of {key} grows from "
+                                    f"{metrics[metric]['first']} to "
+                                    f"{metrics[metric]['last']}")
+        if err_msgs:
+            raise exceptions.TestFail('Possible resource leak:\n' +
+                                      '\n'.join(err_msgs))
@@ -19,7 +19,9 @@ from virttest.utils_libvirt import libvirt_vmxml
 from virttest.utils_test import libvirt
 from virttest.libvirt_xml import vm_xml
 
+from provider.migration import dirty_page_workload
 from provider.migration import migration_base
+from provider.migration import migration_statistics
 
 
 class MigrationBase(object):
@@ -48,6 +50,8 @@ class MigrationBase(object):
                         self.params.get("migrate_source_host"))
         self.conn_list = []
         self.remote_libvirtd_log = None
+        self.jobinfo_recorder = None
+        self.dirty_workload = None
 
         migration_test = migration.MigrationTest()
         migration_test.check_parameters(params)
@@ -90,6 +94,10 @@ class MigrationBase(object):
             self.vm.start()
             self.vm.wait_for_login().close()
 
+        if self.vm.is_alive():
+            self.dirty_workload = dirty_page_workload.start_from_params(
+                self.vm, self.params)
+
     def run_migration(self):
         """
         Execute migration from source host to target host
@@ -171,7 +179,17 @@ class MigrationBase(object):
         do_mig_param = {"vm": self.vm, "mig_test": self.migration_test, "src_uri": None,
                         "dest_uri": dest_uri, "options": options, "virsh_options": virsh_options,
                         "extra": extra, "action_during_mig": action_during_mig, "extra_args": extra_args}
-        migration_base.do_migration(**do_mig_param)
+        jobinfo_record_interval = self.params.get("jobinfo_record_interval")
+        if jobinfo_record_interval:
+            self.jobinfo_recorder = migration_statistics.JobStatsRecorder(
+                vm_name, jobinfo_record_interval)
+            self.jobinfo_recorder.start()
+        try:
+            migration_base.do_migration(**do_mig_param)
+        finally:
+            if self.jobinfo_recorder:
+                self.jobinfo_recorder.stop()
+                self.jobinfo_recorder.save(self.test.debugdir)
 
     def run_migration_again(self):
         """
@@ -278,16 +296,61 @@ class MigrationBase(object):
         func_returns = dict(self.migration_test.func_ret)
         self.migration_test.func_ret.clear()
         self.test.log.debug("Migration returns function results:%s", func_returns)
-        if int(self.migration_test.ret.exit_status) == 0:
+        migrated = int(self.migration_test.ret.exit_status) == 0
+        self.stop_dirty_workload(dest_uri if migrated else None)
+        if migrated:
             self.migration_test.post_migration_check([self.vm], self.params,
                                                      dest_uri=dest_uri, src_uri=self.src_uri)
         self.check_local_and_remote_log()
+        if "yes" == self.params.get("migration_benchmark", "no"):
+            self.verify_benchmark()
+
+    def verify_benchmark(self):
+        """
+        Verify migration time, downtime and bandwidth against the baseline
+        of this host
+
+        """
+        vm_name = self.params.get("migrate_main_vm")
+        baseline_file = self.params.get(
+            "migration_baseline_file",
+            os.path.join(data_dir.get_data_dir(), "migration_baseline.json"))
+        config_name = self.params.get("benchmark_config_name",
+                                      self.params.get("shortname"))
+        tolerance = float(self.params.get("benchmark_tolerance", "0.2"))
+        update = "yes" == self.params.get("update_migration_baseline", "no")
+
+        metrics = migration_statistics.get_completed_job_metrics(
+            vm_name, uri=self.src_uri)
+        migration_statistics.check_baseline(metrics, baseline_file,
+                                            config_name, tolerance, update)
+
+    def stop_dirty_workload(self, uri=None):
+        """
+        Stop dirtying guest memory if the workload was started
+
+        :param uri: uri of the host where the vm runs, the source one if None
+        """
+        if not self.dirty_workload:
+            return
+        orig_uri = self.vm.connect_uri
+        self.vm.connect_uri = uri or self.src_uri
+        try:
+            if self.vm.is_alive():
+                self.dirty_workload.stop()
+        except Exception as detail:
+            self.test.log.warning("Failed to stop dirtying pages: %s",
+                                  detail)
+        finally:
+            self.vm.connect_uri = orig_uri
+            self.dirty_workload = None
 
     def cleanup_default(self):
         """
         Cleanup steps by default
 
         """
+        self.stop_dirty_workload()
         self.vm.connect_uri = self.src_uri
 
         dest_uri = self.params.get("virsh_migrate_desturi")
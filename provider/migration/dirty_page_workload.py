@@ -0,0 +1,158 @@
+import logging as log
+import os
+
+from avocado.core import exceptions
+
+from virttest import data_dir
+
+
+# Using as lower capital is not the best way to do, but this is just a
+# workaround to avoid changing the entire file.
+logging = log.getLogger('avocado.' + __name__)
+
+GUEST_SCRIPT_PATH = "/tmp/dirty_page_workload.py"
+
+# The script runs in guest. It writes one byte of every page of the working
+# set in slices of 10ms, and sleeps for the rest of each slice, so the pages
+# are dirtied at the target rate as long as the guest vcpu can keep up.
+DIRTIER_SCRIPT = '''
+import sys
+import time
+
+rate_mb, size_mb, duration, page_size = [int(arg) for arg in sys.argv[1:5]]
+buf = bytearray(size_mb * 1024 * 1024)
+pages = len(buf) // page_size
+slice_time = 0.01
+pages_per_slice = max(1, int(rate_mb * 1024 * 1024 / page_size * slice_time))
+end_time = time.time() + duration if duration else None
+page = 0
+value = 0
+next_slice = time.time()
+while end_time is None or time.time() < end_time:
+    value = (value + 1) % 256
+    todo = pages_per_slice
+    while todo:
+        count = min(todo, pages - page)
+        start = page * page_size
+        buf[start:start + count * page_size:page_size] = bytes([value]) * count
+        page = (page + count) % pages
+        todo -= count
+    next_slice += slice_time
+    delay = next_slice - time.time()
+    if delay > 0:
+        time.sleep(delay)
+    else:
+        next_slice = time.time()
+'''
+
+
+class DirtyPageWorkload(object):
+    """
+    Dirty guest memory at a target rate over a working set of fixed size
+
+    Usage:
+    workload = DirtyPageWorkload(vm, rate=500, working_set=1024)
+    workload.start()
+    ####
+    migration
+    ####
+    workload.stop()
+    """
+
+    def __init__(self, vm, rate, working_set, duration=0, page_size=4096):
+        """
+        :param vm: vm object
+        :param rate: int, target dirty rate in MiB/s
+        :param working_set: int, size of the dirtied memory in MiB
+        :param duration: int, seconds to run, 0 means until stopped
+        :param page_size: int, guest page size in bytes
+        """
+        self.vm = vm
+        self.rate = int(rate)
+        self.working_set = int(working_set)
+        self.duration = int(duration)
+        self.page_size = int(page_size)
+
+    def deploy(self, session):
+        """
+        Copy the dirtier script into guest
+
+        :param session: vm session
+        """
+        host_path = os.path.join(data_dir.get_tmp_dir(),
+                                 os.path.basename(GUEST_SCRIPT_PATH))
+        with open(host_path, "w") as script_file:
+            script_file.write(DIRTIER_SCRIPT)
+        self.vm.copy_files_to(host_path, GUEST_SCRIPT_PATH)
+        status, output = session.cmd_status_output("python3 --version")
+        if status:
+            raise exceptions.TestError("python3 is required in guest to "
+                                       "dirty pages: %s" % output)
+
+    def start(self, session=None):
+        """
+        Start dirtying pages in background in guest
+
+        :param session: vm session, a new one is created if None
+        """
+        own_session = session is None
+        if own_session:
+            session = self.vm.wait_for_login()
+        try:
+            self.deploy(session)
+            cmd = ("nohup python3 %s %s %s %s %s >/dev/null 2>&1 &"
+                   % (GUEST_SCRIPT_PATH, self.rate, self.working_set,
+                      self.duration, self.page_size))
+            logging.info("Dirty %sMiB/s over %sMiB in guest %s",
+                         self.rate, self.working_set, self.vm.name)
+            session.cmd(cmd)
+            if not self.is_running(session):
+                raise exceptions.TestError("Failed to start dirtying pages "
+                                           "in guest")
+        finally:
+            if own_session:
+                session.close()
+
+    def is_running(self, session):
+        """
+        Check whether the dirtier is running in guest
+
+        :param session: vm session
+        :return: True if running
+        """
+        return not session.cmd_status("pgrep -f %s" % GUEST_SCRIPT_PATH)
+
+    def stop(self, session=None):
+        """
+        Stop dirtying pages
+
+        :param session: vm session, a new one is created if None
+        """
+        own_session = session is None
+        if own_session:
+            session = self.vm.wait_for_login()
+        try:
+            session.cmd_status("pkill -f %s" % GUEST_SCRIPT_PATH)
+        finally:
+            if own_session:
+                session.close()
+
+
+def start_from_params(vm, params):
+    """
+    Start the dirty page workload configured in params
+
+    :param vm: vm object
+    :param params: dict, get dirty_rate(MiB/s), dirty_working_set(MiB),
+                   dirty_duration(s) and dirty_page_size(bytes)
+    :return: DirtyPageWorkload object, None if dirty_rate is not set
+    """
+    dirty_rate = params.get("dirty_rate")
+    if not dirty_rate:
+        return None
+    workload = DirtyPageWorkload(vm, dirty_rate,
+                                 params.get("dirty_working_set", "1024"),
+                                 params.get("dirty_duration", "0"),
+                                 params.get("dirty_page_size", "4096"))
+    workload.start()
+    return workload
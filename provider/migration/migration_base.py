@@ -2,6 +2,7 @@ import logging as log
 import types
 import re
 import signal                                        # pylint: disable=W0611
+import threading
 import time
 
 from avocado.core import exceptions
@@ -13,7 +14,6 @@ from virttest import utils_misc                      # pylint: disable=W0611
 from virttest import utils_libvirtd                  # pylint: disable=W0611
 from virttest import utils_conn
 
-from virttest.libvirt_xml import vm_xml
 from virttest.migration import MigrationTest
 from virttest.utils_libvirt import libvirt_disk      # pylint: disable=W0611
 from virttest.utils_libvirt import libvirt_memory
@@ -25,6 +25,7 @@ from virttest.utils_test import libvirt
 from virttest.staging import service
 
 from provider.migration import base_steps            # pylint: disable=W0611
+from provider.migration import migration_statistics
 
 # Using as lower capital is not the best way to do, but this is just a
 # workaround to avoid changing the entire file.
@@ -132,6 +133,75 @@ def do_migration(**kwargs):
                               **extra_args)
 
 
+def do_parallel_migration(vms, dest_uri, options, extra="", virsh_options="",
+                          parallel=2, bandwidth_budget=None):
+    """
+    Migrate vms concurrently with a limit of running migrations
+
+    :param vms: list of vm objects to migrate
+    :param dest_uri: target uri
+    :param options: migration options, e.g. "--live --p2p"
+    :param extra: extra options for migration
+    :param virsh_options: virsh options
+    :param parallel: int, max number of migrations running at the same time
+    :param bandwidth_budget: int, total bandwidth in MiB/s shared by the
+                             running migrations, None means no limit
+    :return: dict with "total_time" in seconds and "vms", which is a dict of
+             vm name -> dict of duration(s), downtime(ms) and error
+    """
+    parallel = max(1, min(int(parallel), len(vms)))
+    if bandwidth_budget:
+        # Every running migration gets an equal share of the budget.
+        extra = "%s --bandwidth %s" % (extra, int(bandwidth_budget) // parallel)
+    slots = threading.Semaphore(parallel)
+    results = {}
+
+    def _migrate(vm):
+        result = {'duration': None, 'downtime': None, 'error': None}
+        try:
+            with slots:
+                src_uri = vm.connect_uri
+                begin = time.time()
+                try:
+                    ret = vm.migrate(dest_uri, option=options, extra=extra,
+                                     virsh_opt=virsh_options,
+                                     ignore_status=True, debug=True)
+                finally:
+                    result['duration'] = time.time() - begin
+                if ret.exit_status:
+                    result['error'] = ret.stderr_text.strip()
+                    return
+                vm.connect_uri = dest_uri
+                try:
+                    metrics = migration_statistics.get_completed_job_metrics(
+                        vm.name, src_uri)
+                    result['downtime'] = metrics.get('downtime')
+                except (exceptions.TestError, process.CmdError) as detail:
+                    logging.warning("Failed to get downtime of %s: %s",
+                                    vm.name, detail)
+        except Exception as detail:
+            logging.error("Failed to migrate %s: %s", vm.name, detail)
+            result['error'] = str(detail) or repr(detail)
+        finally:
+            results[vm.name] = result
+
+    logging.info("Migrating %s vms with %s in parallel...",
+                 len(vms), parallel)
+    begin = time.time()
+    threads = [threading.Thread(target=_migrate, args=(vm,)) for vm in vms]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    total_time = time.time() - begin
+    for vm_name, result in sorted(results.items()):
+        logging.info("Migration of %s: %s", vm_name, result)
+    logging.info("Migrated %s vms in %.2fs",
+                 len([res for res in results.values() if not res['error']]),
+                 total_time)
+    return {'total_time': total_time, 'vms': results}
+
+
 def setup_conn_obj(conn_type, params, test):
     """
     Setup connection object, like TLS
@@ -289,30 +359,20 @@ def execute_statistics_command(params):
     """
     Execute statistics command
 
+    All the queries run over one virsh session, and the domain-wide ones
+    run only once. The parsed result is saved in params as
+    "statistics_result".
+
     :param params: dict, get vm name and disk type
     """
     vm_name = params.get("migrate_main_vm")
     disk_type = params.get("loop_disk_type")
 
-    vmxml = vm_xml.VMXML.new_from_dumpxml(vm_name)
-    if disk_type:
-        disks = vmxml.get_disk_all_by_expr('type==%s' % disk_type, 'device==disk')
-    else:
-        disks = vmxml.get_disk_all_by_expr('device==disk')
-    logging.debug("disks: %s", disks)
-    debug_kargs = {'ignore_status': False, 'debug': True}
-    for disk in list(disks.values()):
-        if disk_type:
-            disk_source = disk.find('source').get('dev')
-        else:
-            disk_source = disk.find('source').get('file')
-        disk_target = disk.find('target').get('dev')
-        logging.debug("disk_source: %s", disk_source)
-        logging.debug("disk_target: %s", disk_target)
-        virsh.domblkstat(vm_name, disk_target, "", **debug_kargs)
-        virsh.domblkinfo(vm_name, disk_source, **debug_kargs)
-        virsh.domstats(vm_name, **debug_kargs)
-        virsh.dommemstat(vm_name, **debug_kargs)
+    collector = migration_statistics.StatisticsCollector(vm_name)
+    try:
+        params["statistics_result"] = collector.collect(disk_type)
+    finally:
+        collector.close()
 
 
 def check_qemu_mem_lock_hard_limit(params):
@@ -0,0 +1,328 @@
+import json
+import logging as log
+import os
+import re
+import socket
+
+from avocado.core import exceptions
+
+from virttest import virsh
+
+from virttest.libvirt_xml import vm_xml
+
+from provider.libvirt_bench import libvirt_bench_base
+
+
+# Using as lower capital is not the best way to do, but this is just a
+# workaround to avoid changing the entire file.
+logging = log.getLogger('avocado.' + __name__)
+
+
+def parse_key_value(output, separator=None, skip_first=0):
+    """
+    Parse the lines of "key value" pairs in virsh output
+
+    :param output: str, virsh command output
+    :param separator: separator between key and value, None means spaces
+    :param skip_first: number of leading fields to skip in every line,
+                       e.g. domblkstat prints the disk name first
+    :return: dict, key -> value, the value is converted to int if possible
+    """
+    result = {}
+    for line in output.strip().splitlines():
+        fields = line.strip().split(separator)
+        fields = [field.strip() for field in fields[skip_first:]]
+        if len(fields) < 2 or not fields[0]:
+            continue
+        key, value = fields[0], (separator or " ").join(fields[1:]).strip()
+        try:
+            value = int(value)
+        except ValueError:
+            pass
+        result[key] = value
+    return result
+
+
+class StatisticsCollector(object):
+    """
+    Run the statistics queries of a domain over one persistent virsh session
+
+    The domain-wide queries (domstats and dommemstat) run once per collect
+    no matter how many disks the domain has, and the block queries run once
+    per disk, all without forking virsh or reconnecting to libvirt.
+
+    Usage:
+    collector = StatisticsCollector(vm_name)
+    stats = collector.collect(disk_type="block")
+    collector.close()
+    """
+
+    def __init__(self, vm_name, virsh_session=None, uri=None):
+        """
+        :param vm_name: name of the domain
+        :param virsh_session: VirshSession to reuse, a new one is created
+                              if None
+        :param uri: uri to connect when a new session is created
+        """
+        self.vm_name = vm_name
+        self._own_session = virsh_session is None
+        self.session = virsh_session or virsh.VirshSession(
+            virsh_exec=virsh.VIRSH_EXEC, uri=uri, auto_close=True)
+
+    def run(self, cmd):
+        """
+        Run one virsh command in the session
+
+        :param cmd: virsh command without "virsh", e.g. "domstats vm1"
+        :return: str, output of the command
+        :raise: process.CmdError if the command fails
+        """
+        return self.session.cmd_result(cmd, ignore_status=False,
+                                       debug=True).stdout_text
+
+    def get_disks(self, disk_type=None):
+        """
+        Get sources and targets of the disks of the domain
+
+        :param disk_type: type of disks to get, e.g. "block", None for all
+        :return: list of (source, target)
+        """
+        vmxml = vm_xml.VMXML.new_from_dumpxml(self.vm_name)
+        if disk_type:
+            disks = vmxml.get_disk_all_by_expr('type==%s' % disk_type,
+                                               'device==disk')
+        else:
+            disks = vmxml.get_disk_all_by_expr('device==disk')
+        disk_list = []
+        for disk in list(disks.values()):
+            source = disk.find('source')
+            disk_source = source.get('dev') or source.get('file')
+            disk_list.append((disk_source, disk.find('target').get('dev')))
+        logging.debug("disks: %s", disk_list)
+        return disk_list
+
+    def collect(self, disk_type=None):
+        """
+        Collect and parse the statistics of the domain
+
+        :param disk_type: type of disks to query, None for all disks
+        :return: dict with keys "domstats", "dommemstat" and "disks", and
+                 "disks" is a dict of disk target -> dict with keys
+                 "domblkstat" and "domblkinfo"
+        """
+        stats = {'domstats': parse_key_value(
+                     self.run("domstats %s" % self.vm_name), separator='='),
+                 'dommemstat': parse_key_value(
+                     self.run("dommemstat %s" % self.vm_name)),
+                 'disks': {}}
+        for disk_source, disk_target in self.get_disks(disk_type):
+            stats['disks'][disk_target] = {
+                'domblkstat': parse_key_value(
+                    self.run("domblkstat %s %s" % (self.vm_name, disk_target)),
+                    skip_first=1),
+                'domblkinfo': parse_key_value(
+                    self.run("domblkinfo %s %s" % (self.vm_name, disk_source)),
+                    separator=':')}
+        logging.debug("Statistics of %s: %s", self.vm_name, stats)
+        return stats
+
+    def close(self):
+        """
+        Close the session if it is created by the collector
+        """
+        if self._own_session:
+            self.session.close()
+
+
+class JobStatsRecorder(libvirt_bench_base.PeriodicSampler):
+    """
+    Record the job statistics of a migrating domain as a time series
+
+    The statistics are polled with "domjobinfo --rawstats" over one
+    persistent virsh session in a background thread, together with the
+    state reason of the domain, which tells when migration switches to
+    postcopy.
+
+    Usage:
+    recorder = JobStatsRecorder(vm_name, interval=0.2)
+    recorder.start()
+    ####
+    migration
+    ####
+    recorder.stop()
+    recorder.save(test.debugdir)
+    """
+    FIELD_PATTERN = re.compile(r"^(\w+)[:=]\s*(\S+)$")
+    need_virsh_session = True
+    # Fields saved in the csv file, all raw fields are kept in json file
+    CSV_FIELDS = ['time', 'state', 'time_elapsed', 'memory_total',
+                  'memory_processed', 'memory_remaining', 'memory_bps',
+                  'memory_dirty_rate', 'memory_page_size',
+                  'memory_iteration', 'memory_postcopy_requests',
+                  'downtime', 'auto_converge_throttle', 'data_remaining']
+
+    def __init__(self, vm_name, interval=0.5, uri=None):
+        """
+        :param vm_name: name of the domain
+        :param interval: seconds between two polls, can be less than 1
+        :param uri: uri of the source host
+        """
+        super(JobStatsRecorder, self).__init__(interval, uri)
+        self.vm_name = vm_name
+
+    def describe(self):
+        return "job stats of %s" % self.vm_name
+
+    def parse_jobinfo(self, output):
+        """
+        Parse the output of "domjobinfo --rawstats"
+
+        :param output: str, output of domjobinfo
+        :return: dict, raw field -> value, empty if there is no job
+        """
+        sample = {}
+        for line in output.strip().splitlines():
+            match = self.FIELD_PATTERN.search(line.strip())
+            if not match:
+                continue
+            try:
+                sample[match.group(1)] = int(match.group(2))
+            except ValueError:
+                sample[match.group(1)] = match.group(2)
+        return sample
+
+    def sample(self, session, timestamp):
+        """
+        Poll the job stats and the state reason of the domain once
+        """
+        status, output = session.cmd_status_output(
+            "domjobinfo %s --rawstats" % self.vm_name)
+        sample = self.parse_jobinfo(output) if not status else {}
+        if sample:
+            _, state = session.cmd_status_output(
+                "domstate %s --reason" % self.vm_name)
+            sample.update({'time': round(timestamp - self.start_time, 3),
+                           'state': state.strip()})
+            self.add(sample)
+
+    def get_summary(self):
+        """
+        Get the convergence summary of the recorded migration
+
+        :return: dict with the number of samples, the last iteration, the
+                 max dirty rate, throughput and auto converge throttle, the
+                 min memory remaining and the time of postcopy switch
+        """
+        def _values(field):
+            return [sample[field] for sample in self.samples
+                    if isinstance(sample.get(field), int)]
+
+        summary = {'samples': len(self.samples),
+                   'iterations': max(_values('memory_iteration'), default=0),
+                   'max_dirty_rate': max(_values('memory_dirty_rate'),
+                                         default=None),
+                   'max_memory_bps': max(_values('memory_bps'), default=None),
+                   'min_memory_remaining': min(_values('memory_remaining'),
+                                               default=None),
+                   'max_auto_converge_throttle': max(
+                       _values('auto_converge_throttle'), default=None),
+                   'postcopy_switch_time': None}
+        for sample in self.samples:
+            if 'post-copy' in sample.get('state', ''):
+                summary['postcopy_switch_time'] = sample['time']
+                break
+        return summary
+
+    def save(self, dir_path, prefix="jobinfo"):
+        """
+        Save the time series as csv and json files
+
+        :param dir_path: directory to save the files
+        :param prefix: prefix of the file names
+        :return: tuple of csv file path and json file path
+        """
+        csv_path = os.path.join(dir_path, "%s.csv" % prefix)
+        json_path = os.path.join(dir_path, "%s.json" % prefix)
+        self.save_csv(csv_path, self.CSV_FIELDS)
+        with open(json_path, 'w') as json_file:
+            json.dump({'summary': self.get_summary(),
+                       'samples': self.samples}, json_file, indent=2)
+        logging.info("Job stats summary: %s", self.get_summary())
+        logging.debug("Job stats are saved to %s and %s", csv_path, json_path)
+        return csv_path, json_path
+
+
+def get_completed_job_metrics(vm_name, uri=None):
+    """
+    Get the performance metrics of the last completed migration job
+
+    :param vm_name: name of the domain on source host
+    :param uri: uri of the source host
+    :return: dict with total_time(s), downtime(ms) and bandwidth(MiB/s)
+    """
+    ret = virsh.domjobinfo(vm_name, extra="--completed --rawstats", uri=uri,
+                           debug=True, ignore_status=False)
+    stats = JobStatsRecorder(vm_name).parse_jobinfo(ret.stdout_text)
+    time_elapsed = stats.get('time_elapsed')
+    if not time_elapsed:
+        raise exceptions.TestError("No completed job stats of %s: %s"
+                                   % (vm_name, ret.stdout_text))
+    data_processed = stats.get('data_processed',
+                               stats.get('memory_processed', 0))
+    metrics = {'total_time': time_elapsed / 1000.0,
+               'downtime': stats.get('downtime'),
+               'bandwidth': data_processed / 1048576.0 / (time_elapsed / 1000.0)}
+    logging.info("Migration metrics of %s: %s", vm_name, metrics)
+    return metrics
+
+
+def check_baseline(metrics, baseline_file, config_name, tolerance=0.2,
+                   update=False):
+    """
+    Compare migration metrics with the baseline of this host
+
+    The baseline file is a json file of host name -> config name ->
+    metrics. The metrics are stored as baseline if there is no baseline
+    for the config on this host yet, or if update is True.
+
+    :param metrics: dict, got by get_completed_job_metrics()
+    :param baseline_file: path of the baseline file
+    :param config_name: name of the configuration, e.g. test shortname
+    :param tolerance: float, allowed regression ratio, e.g. 0.2 means
+                      20% slower is still acceptable
+    :param update: whether to store metrics as the new baseline
+    :raise: TestFail if any metric regresses beyond tolerance
+    """
+    host_name = socket.gethostname()
+    baselines = {}
+    if os.path.exists(baseline_file):
+        with open(baseline_file) as json_file:
+            baselines = json.load(json_file)
+    baseline = baselines.get(host_name, {}).get(config_name)
+    if baseline is None or update:
+        logging.info("Store baseline of %s on %s: %s",
+                     config_name, host_name, metrics)
+        baselines.setdefault(host_name, {})[config_name] = metrics
+        with open(baseline_file, 'w') as json_file:
+            json.dump(baselines, json_file, indent=2, sort_keys=True)
+        return
+
+    logging.info("Baseline of %s on %s: %s", config_name, host_name, baseline)
+    err_msgs = []
+    # The smaller the better for time and downtime, and the larger the
+    # better for bandwidth.
+    for name, larger_is_better in [('total_time', False), ('downtime', False),
+                                   ('bandwidth', True)]:
+        current, base = metrics.get(name), baseline.get(name)
+        if current is None or not base:
+            continue
+        if larger_is_better:
+            regressed = current < base * (1 - tolerance)
+        else:
+            regressed = current > base * (1 + tolerance)
+        if regressed:
+            err_msgs.append("%s is %s, baseline is %s" % (name, current, base))
+    if err_msgs:
+        raise exceptions.TestFail("Migration performance regressed beyond "
+                                  "%s%%: %s" % (tolerance * 100,
+                                                "; ".join(err_msgs)))
@@ -3,6 +3,7 @@ import os
 
 from avocado.core import exceptions
 from avocado.utils import process
+from virttest import virsh
 
 LOG = logging.getLogger('avocado.' + __name__)
 VIRSH_ARGS = {'debug': True, 'ignore_status': False}
@@ -86,3 +87,78 @@ def check_ownership(path, uid, gid):
         raise exceptions.TestFail(f'File ownership not correct, '
                                   f'should be {uid, gid}, '
                                   f'not {stat.st_uid, stat.st_gid}')
+
+
+def fill_guest_memory(vm, size_mb, fill_dir='/tmp/save_fill'):
+    """
+    Fill guest memory with incompressible data kept in a tmpfs
+
+    :param vm: vm instance
+    :param size_mb: size of data to fill in MiB
+    :param fill_dir: mount point of the tmpfs in guest
+    """
+    if not size_mb:
+        return
+    session = vm.wait_for_login()
+    try:
+        session.cmd(f'mkdir -p {fill_dir} && '
+                    f'mount -t tmpfs -o size={size_mb}M tmpfs {fill_dir}')
+        session.cmd(f'dd if=/dev/urandom of={fill_dir}/fill bs=1M '
+                    f'count={size_mb}', timeout=600)
+    finally:
+        session.close()
+    LOG.debug(f'Filled {size_mb}MiB of guest memory with random data')
+
+
+def save_restore_with_timing(vm, save_path, save_options='',
+                             restore_options=''):
+    """
+    Save and restore vm, and measure how long they take
+
+    :param vm: vm instance
+    :param save_path: path of the save file, or of the block device
+    :param save_options: options for virsh save
+    :param restore_options: options for virsh restore
+    :return: dict of save_time(s), restore_time(s), bytes_written and
+             save_mbps, restore_mbps, which are the MiB of written data
+             per second, the last three are None for block devices
+    """
+    save_result = virsh.save(vm.name, save_path, options=save_options,
+                             **VIRSH_ARGS)
+    # Sparse save files should not count holes, so use the allocated
+    # blocks. The written size is unknown for block devices.
+    bytes_written = None
+    if os.path.isfile(save_path):
+        bytes_written = os.stat(save_path).st_blocks * 512
+    restore_result = virsh.restore(save_path, options=restore_options,
+                                   **VIRSH_ARGS)
+    result = {'save_time': save_result.duration,
+              'restore_time': restore_result.duration,
+              'bytes_written': bytes_written,
+              'save_mbps': None, 'restore_mbps': None}
+    if bytes_written:
+        size_mb = bytes_written / 1048576.0
+        result['save_mbps'] = size_mb / save_result.duration
+        result['restore_mbps'] = size_mb / restore_result.duration
+    LOG.debug(f'Save and restore of {vm.name}: {result}')
+    return result
+
+
+def log_table(rows, columns, title=''):
+    """
+    Log rows of results as a table
+
+    :param rows: list of dict
+    :param columns: list of keys of the dict to show as columns
+    :param title: title of the table
+    """
+    def _format(value):
+        return f'{value:.2f}' if isinstance(value, float) else str(value)
+
+    cells = [columns] + [[_format(row.get(col, '')) for col in columns]
+                         for row in rows]
+    widths = [max(len(line[i]) for line in cells)
+              for i in range(len(columns))]
+    lines = ['  '.join(cell.rjust(width) for cell, width in zip(line, widths))
+             for line in cells]
+    LOG.info(f'{title}\n' + '\n'.join(lines))
@@ -14,6 +14,9 @@ from virttest import virsh
 from virttest.libvirt_xml import network_xml
 from virttest.libvirt_xml import vm_xml
 
+from provider.virtual_network import network_throughput
+from provider.virtual_network import ping_matrix
+
 VIRSH_ARGS = {'ignore_status': False, 'debug': True}
 
 LOG = logging.getLogger('avocado.' + __name__)
@@ -99,9 +102,12 @@ def ping_check(params, ips, session=None, force_ipv4=True, **args):
     :param session: vm session to ping from
     :param force_ipv4: whether to force ping with ipv4
     :param args: other kwargs
+    :return: list of dict, the result of every ping, see
+             ping_matrix.PingMatrix.run()
     """
     ping_patterns = {k: v for k, v in params.items() if '_ping_' in k}
 
+    matrix = ping_matrix.PingMatrix({'vm': session}, force_ipv4=force_ipv4)
     for pattern, expect_result in ping_patterns.items():
         source, destination = pattern.split('_ping_')
         if destination == 'outside' and not force_ipv4:
@@ -111,32 +117,15 @@ def ping_check(params, ips, session=None, force_ipv4=True, **args):
         if dest_ip is None:
             raise exceptions.TestError(f'IP of {destination} is None')
 
-        ping_args = args.get(pattern, {})
-
         LOG.info(f'TEST_STEP: Ping from {source} to {destination} '
                  f'(ip: {dest_ip})')
-        ping_session = session if source == 'vm' else None
-
-        def _ping():
-            """ Helper function to make use of wait_for """
-            status, output = utils_net.ping(dest=dest_ip, count=5,
-                                            timeout=10,
-                                            session=ping_session,
-                                            force_ipv4=force_ipv4,
-                                            **ping_args)
-            if status and "unreachable" in output and expect_result == 'pass':
-                return False
-            return status == 0
-
-        status = utils_misc.wait_for(_ping, timeout=15)
-        ping_result = (status is True) == (expect_result == 'pass')
-        msg = f'Expect ping from {source} to {destination} should ' \
-              f'{expect_result.upper()}, actual result is ' \
-              f'{"PASS" if ping_result else "FAIL"}'
-        if ping_result:
-            LOG.debug(msg)
-        else:
-            raise exceptions.TestFail(msg)
+        matrix.add(source, destination, dest_ip, expect_result == 'pass',
+                   **args.get(pattern, {}))
+
+    matrix.run()
+    matrix.log()
+    matrix.check()
+    return matrix.results
 
 
 def create_tap(tap_name, bridge_name, user, flag=''):
@@ -353,23 +342,30 @@ def check_iface_attrs(iface, key, expect_val):
                                   f'{expect_val}, NOT {actual_val}')
 
 
-def check_throughput(serv_runner, cli_runner, ip_addr, bw, th_type):
+def check_throughput(serv_runner, cli_runner, ip_addr, bw, th_type,
+                     backend='netperf', serv_iface=None, cli_iface=None):
     """
-    Check actual thoughput of network using netperf
+    Check actual thoughput of network
 
-    :param serv_runner: runner of netserver
-    :param cli_runner: runner of netperf client
+    :param serv_runner: runner of the server
+    :param cli_runner: runner of the client
     :param ip_addr: ip address
     :param bw: bandwidth setting
     :param th_type: inbound or outbound
-    """
-
-    serv_runner('netserver')
-    netperf_out = cli_runner(f'netperf -H {ip_addr}')
-    LOG.debug(netperf_out)
-    serv_runner('pkill netserver')
-
-    actual_throu = float(netperf_out.strip().splitlines()[-1].split()[-1])
+    :param backend: throughput backend, see network_throughput.BACKENDS
+    :param serv_iface: interface to count packets on of the server, the
+                       tap of the vm if the server runs on host
+    :param cli_iface: interface to count packets on of the client, the
+                      tap of the vm if the client runs on host
+    :return: dict of the result, see network_throughput.measure()
+    """
+    server = network_throughput.Endpoint(ip_addr, runner=serv_runner,
+                                         name='server', iface=serv_iface)
+    client = network_throughput.Endpoint(runner=cli_runner, name='client',
+                                         iface=cli_iface)
+    result = network_throughput.measure(backend, server, client)
+
+    actual_throu = result['bps'] / 1000000
     expect_throu = int(bw) * 8 / 1024
 
     msg = f'Expected {th_type}: {expect_throu}, actual {th_type}: {actual_throu}'
@@ -377,6 +373,7 @@ def check_throughput(serv_runner, cli_runner, ip_addr, bw, th_type):
         raise exceptions.TestFail(f'Actual {th_type} is not close to expected '
                                   f'{th_type}:\n{msg}')
     LOG.debug(msg)
+    return result
 
 
 def exec_netperf_test(params, env):
@@ -0,0 +1,499 @@
+import json
+import logging
+import re
+import time
+
+from avocado.core import exceptions
+from avocado.utils import process
+from virttest import utils_package
+
+LOG = logging.getLogger('avocado.' + __name__)
+
+# Commands are wrapped in "sh -c" so that runners without shell work too
+COUNTERS_CMD = ("sh -c \"head -1 /proc/stat; grep '^Tcp:' /proc/net/snmp; "
+                "cat /proc/net/dev\"")
+
+# netperf omni output selectors of request/response tests -> result keys
+RR_OUTPUT = {"TRANSACTION_RATE": "transactions",
+             "MEAN_LATENCY": "mean_latency",
+             "P50_LATENCY": "p50_latency",
+             "P99_LATENCY": "p99_latency"}
+
+
+class Endpoint(object):
+    """
+    One end of a throughput test, the host or a vm
+
+    Commands run by a runner if given, e.g. session.cmd, else in the
+    session if given, else on the host.
+    """
+
+    def __init__(self, ip=None, session=None, runner=None, name=None,
+                 iface=None):
+        """
+        :param ip: ip address of the endpoint, needed for a server
+        :param session: vm session, None for the host
+        :param runner: function which runs a command and returns its output
+        :param name: name of the endpoint in the results, e.g. "host"
+        :param iface: interface to count packets on, all the interfaces
+                      except lo if not set. Required on the host, where
+                      one frame is counted on the tap, the bridge and the
+                      physical nic.
+        """
+        self.ip = ip
+        self.session = session
+        self.runner = runner
+        self.name = name or ("vm" if session else "host")
+        self.iface = iface
+
+    @property
+    def on_host(self):
+        """
+        Whether the commands run on the host by this process
+        """
+        return self.session is None and self.runner is None
+
+    def cmd(self, command, timeout=60):
+        """
+        Run a command on the endpoint
+
+        :param command: command to run
+        :param timeout: seconds to wait for the command
+        :return: output of the command
+        """
+        if self.runner:
+            return self.runner(command)
+        if self.session:
+            return self.session.cmd_output(command, timeout=timeout)
+        return process.run(command, shell=True, timeout=timeout,
+                           ignore_status=True).stdout_text
+
+    def get_counters(self):
+        """
+        Get the cpu, tcp retransmit and packet counters of the endpoint
+
+        :return: dict with cpu_total, cpu_idle, retransmits and packets
+        """
+        if self.on_host and not self.iface:
+            raise exceptions.TestError("Interface to count packets on is "
+                                       "required on %s" % self.name)
+        output = self.cmd(COUNTERS_CMD)
+        counters = {'cpu_total': 0, 'cpu_idle': 0, 'retransmits': 0,
+                    'packets': 0}
+        tcp_fields = None
+        for line in output.splitlines():
+            fields = line.split()
+            if not fields:
+                continue
+            if fields[0] == "cpu":
+                values = [int(value) for value in fields[1:]]
+                counters['cpu_total'] = sum(values)
+                # idle and iowait
+                counters['cpu_idle'] = sum(values[3:5])
+            elif fields[0] == "Tcp:":
+                if tcp_fields is None:
+                    tcp_fields = fields
+                elif "RetransSegs" in tcp_fields:
+                    counters['retransmits'] = int(
+                        fields[tcp_fields.index("RetransSegs")])
+            elif ":" in fields[0] and fields[0] != "Inter-|":
+                dev, _, rest = line.partition(":")
+                dev = dev.strip()
+                values = rest.split()
+                if len(values) < 10:
+                    continue
+                if self.iface:
+                    if dev != self.iface:
+                        continue
+                elif dev == "lo":
+                    continue
+                # rx packets and tx packets
+                counters['packets'] += int(values[1]) + int(values[9])
+        return counters
+
+
+class Iperf3Backend(object):
+    """
+    iperf3, with json output
+
+    One server only runs one test at a time, so clients which run at the
+    same time need one server each, on their own ports.
+    """
+    name = "iperf3"
+    package = "iperf3"
+    concurrent_clients = False
+
+    def get_server_cmd(self, port=None):
+        cmd = "iperf3 -s -D"
+        if port:
+            cmd += " -p %s" % port
+        return cmd
+
+    def get_stop_server_cmd(self):
+        return "sh -c 'pkill -x iperf3; true'"
+
+    def get_client_cmd(self, server_ip, duration, streams, protocol,
+                       reverse, msg_size, port=None):
+        cmd = "iperf3 -c %s -t %s -P %s -J" % (server_ip, duration, streams)
+        if port:
+            cmd += " -p %s" % port
+        if protocol == "udp":
+            cmd += " -u -b 0"
+        if reverse:
+            cmd += " -R"
+        if msg_size:
+            cmd += " -l %s" % msg_size
+        return cmd
+
+    def parse_output(self, output):
+        """
+        :return: bits per second
+        """
+        result = json.loads(output[output.index("{"):])
+        if "error" in result:
+            raise exceptions.TestError("iperf3 failed: %s" % result["error"])
+        end = result["end"]
+        summary = end.get("sum_received") or end.get("sum")
+        return summary["bits_per_second"]
+
+
+class NetperfBackend(object):
+    """
+    netperf, every stream is one netperf process
+
+    With a port, the control connection uses the port and the data
+    connection uses the next one, so both can be forwarded, and only one
+    stream can run at a time.
+    """
+    name = "netperf"
+    package = "netperf"
+    concurrent_clients = True
+
+    def get_server_cmd(self, port=None):
+        if port:
+            return "netserver -p %s" % port
+        return "netserver"
+
+    def get_stop_server_cmd(self):
+        return "sh -c 'pkill -x netserver; true'"
+
+    def _get_cmd(self, server_ip, duration, test_type, output, port):
+        cmd = "netperf -H %s -l %s -t %s -f m -P 0" % (server_ip, duration,
+                                                      test_type)
+        if ":" in server_ip:
+            cmd += " -6"
+        if port:
+            cmd += " -p %s" % port
+        cmd += " -- -k %s" % output
+        if port:
+            cmd += " -P ,%s" % (int(port) + 1)
+        return cmd
+
+    def get_client_cmd(self, server_ip, duration, streams, protocol,
+                       reverse, msg_size, port=None):
+        test_type = {"tcp": "TCP_STREAM", "udp": "UDP_STREAM"}[protocol]
+        if reverse:
+            if protocol != "tcp":
+                raise exceptions.TestError("netperf can not reverse a %s "
+                                           "stream, swap the server and the "
+                                           "client instead" % protocol)
+            test_type = "TCP_MAERTS"
+        cmd = self._get_cmd(server_ip, duration, test_type, "THROUGHPUT",
+                            port)
+        if msg_size:
+            cmd += " -m %s" % msg_size
+        if streams == 1:
+            return cmd
+        return ("sh -c 'for i in $(seq %s); do %s & done; wait'"
+                % (streams, cmd))
+
+    def parse_output(self, output):
+        """
+        :return: bits per second
+        """
+        values = re.findall(r"^THROUGHPUT=([\d.]+)", output, re.M)
+        if not values:
+            raise exceptions.TestError("No throughput in netperf output: %s"
+                                       % output)
+        return sum(float(value) for value in values) * 1000000
+
+    def get_rr_cmd(self, server_ip, duration, test_type, msg_size=None,
+                   port=None):
+        cmd = self._get_cmd(server_ip, duration, test_type,
+                            ",".join(RR_OUTPUT), port)
+        if msg_size:
+            cmd += " -r %s,%s" % (msg_size, msg_size)
+        return cmd
+
+    def parse_rr_output(self, output):
+        """
+        :return: dict, transactions per second and latencies in us
+        """
+        values = dict(re.findall(r"^([A-Z0-9_]+)=([\d.]+)", output, re.M))
+        if "TRANSACTION_RATE" not in values:
+            raise exceptions.TestError("No transaction rate in netperf "
+                                       "output: %s" % output)
+        return {key: float(values[selector]) if selector in values else None
+                for selector, key in RR_OUTPUT.items()}
+
+
+class UperfBackend(object):
+    """
+    uperf, with a stream profile of one thread per stream
+
+    Every server address has its own profile file, so that the clients to
+    different servers can run at the same time on one endpoint.
+    """
+    name = "uperf"
+    package = "uperf"
+    concurrent_clients = True
+    PROFILE_PATH = "/tmp/uperf_stream_%s.xml"
+    # One line, so that it can be echoed in a shell session
+    PROFILE = ('<?xml version="1.0"?><profile name="stream">'
+               '<group nthreads="%(streams)s">'
+               '<transaction iterations="1"><flowop type="connect" '
+               'options="remotehost=%(ip)s protocol=%(protocol)s"/>'
+               '</transaction>'
+               '<transaction duration="%(duration)ss"><flowop type="%(op)s" '
+               'options="count=16 size=%(size)s"/></transaction>'
+               '<transaction iterations="1"><flowop type="disconnect"/>'
+               '</transaction></group></profile>')
+    UNITS = {'': 1, 'K': 1e3, 'M': 1e6, 'G': 1e9, 'T': 1e12}
+
+    def get_server_cmd(self, port=None):
+        if port:
+            raise exceptions.TestError("uperf does not support a fixed "
+                                       "data port")
+        return "sh -c 'nohup uperf -s > /dev/null 2>&1 &'"
+
+    def get_stop_server_cmd(self):
+        return "sh -c 'pkill -x uperf; true'"
+
+    def get_client_cmd(self, server_ip, duration, streams, protocol,
+                       reverse, msg_size, port=None):
+        profile = self.PROFILE % {'streams': streams, 'ip': server_ip,
+                                  'protocol': protocol, 'duration': duration,
+                                  'op': "read" if reverse else "write",
+                                  'size': msg_size or 65536}
+        profile_path = self.PROFILE_PATH % re.sub(r"\W", "_", server_ip)
+        return ("echo '%s' > %s; uperf -m %s"
+                % (profile, profile_path, profile_path))
+
+    def parse_output(self, output):
+        """
+        :return: bits per second
+        """
+        match = re.search(r"^\S+\s+[\d.]+s\s+[\d.]+[KMGT]?B\s+([\d.]+)"
+                          r"([KMGT]?)b/s", output, re.M)
+        if not match:
+            raise exceptions.TestError("No throughput in uperf output: %s"
+                                       % output)
+        return float(match.group(1)) * self.UNITS[match.group(2)]
+
+
+BACKENDS = {backend.name: backend for backend in
+            (Iperf3Backend, NetperfBackend, UperfBackend)}
+
+
+def get_backend(name):
+    """
+    Get a backend by name
+
+    :param name: "iperf3", "netperf" or "uperf"
+    :return: backend object
+    """
+    if name not in BACKENDS:
+        raise exceptions.TestError("Unsupported throughput backend %s, "
+                                   "choose from %s" % (name, list(BACKENDS)))
+    return BACKENDS[name]()
+
+
+def install_backend(backend_name, *endpoints):
+    """
+    Install the package of a backend on endpoints
+
+    The package is installed on the host or in the session of an endpoint,
+    so an endpoint with a runner only needs the package installed first.
+
+    :param backend_name: name of the backend
+    :param endpoints: Endpoint objects
+    """
+    backend = get_backend(backend_name)
+    for endpoint in endpoints:
+        if endpoint.runner and not endpoint.session:
+            raise exceptions.TestError("Can not install %s on %s which has "
+                                       "a runner only, give its session"
+                                       % (backend.package, endpoint.name))
+        if not utils_package.package_install(backend.package,
+                                             session=endpoint.session):
+            raise exceptions.TestError("Failed to install %s on %s"
+                                       % (backend.package, endpoint.name))
+
+
+def start_server(backend_name, server, port=None, restart=True):
+    """
+    Start the server of a backend
+
+    :param backend_name: name of the backend
+    :param server: Endpoint object of the server
+    :param port: port to listen on, the default one of the backend if None
+    :param restart: stop all the running servers of the backend first if
+                    True, set it to False to start several servers on
+                    different ports
+    """
+    backend = get_backend(backend_name)
+    if restart:
+        server.cmd(backend.get_stop_server_cmd())
+    server.cmd(backend.get_server_cmd(port))
+    time.sleep(1)
+
+
+def stop_server(backend_name, server):
+    """
+    Stop the server of a backend
+
+    :param backend_name: name of the backend
+    :param server: Endpoint object of the server
+    """
+    server.cmd(get_backend(backend_name).get_stop_server_cmd())
+
+
+def measure(backend_name, server, client, duration=10, streams=1,
+            protocol="tcp", reverse=False, msg_size=None,
+            manage_server=True, port=None):
+    """
+    Measure the throughput from a client to a server
+
+    The cpu usage, tcp retransmits and packets are taken from the
+    counters of both endpoints before and after the run, so they are the
+    same for all the backends.
+
+    :param backend_name: "iperf3", "netperf" or "uperf"
+    :param server: Endpoint object of the server, with ip
+    :param client: Endpoint object of the client
+    :param duration: seconds of the run
+    :param streams: number of parallel streams
+    :param protocol: "tcp" or "udp"
+    :param reverse: send from server to client if True
+    :param msg_size: bytes of every send
+    :param manage_server: start and stop the server around the run if
+                          True, set it to False when several clients share
+                          one server started by start_server()
+    :param port: port of the server, the default one of the backend if None
+    :return: dict with backend, protocol, streams, duration, gbps, pps,
+             cpu usage(%) and packets of every endpoint, and retransmits
+    """
+    backend = get_backend(backend_name)
+    if manage_server:
+        start_server(backend_name, server, port)
+    try:
+        before = {server.name: server.get_counters(),
+                  client.name: client.get_counters()}
+        begin = time.time()
+        output = client.cmd(backend.get_client_cmd(
+            server.ip, duration, streams, protocol, reverse, msg_size, port),
+            timeout=int(duration) + 60)
+        elapsed = time.time() - begin
+        after = {server.name: server.get_counters(),
+                 client.name: client.get_counters()}
+    finally:
+        if manage_server:
+            stop_server(backend_name, server)
+    LOG.debug("%s output: %s", backend.name, output)
+    bps = backend.parse_output(output)
+    result = {'backend': backend.name, 'protocol': protocol,
+              'streams': streams, 'duration': elapsed, 'reverse': reverse,
+              'msg_size': msg_size, 'server': server.name,
+              'client': client.name, 'bps': bps, 'gbps': bps / 1e9,
+              'cpu': {}, 'retransmits': 0}
+    for name in (server.name, client.name):
+        total = after[name]['cpu_total'] - before[name]['cpu_total']
+        idle = after[name]['cpu_idle'] - before[name]['cpu_idle']
+        result['cpu'][name] = (100.0 * (total - idle) / total
+                               if total else None)
+        result['retransmits'] += (after[name]['retransmits'] -
+                                  before[name]['retransmits'])
+    packets = (after[client.name]['packets'] -
+               before[client.name]['packets'])
+    result['pps'] = packets / elapsed if elapsed else None
+    LOG.info("%s %s %s streams %s -> %s: %.3f Gbps, %.0f pps, cpu %s, "
+             "retransmits %s", backend.name, protocol, streams, client.name,
+             server.name, result['gbps'], result['pps'] or 0, result['cpu'],
+             result['retransmits'])
+    return result
+
+
+def measure_rr(server, client, test_type="TCP_RR", duration=10,
+               msg_size=None, manage_server=True, port=None):
+    """
+    Measure the transaction rate and latency of a request/response test
+    by netperf
+
+    TCP_CRR opens a new connection for every transaction, so its
+    transaction rate is the connection setup rate.
+
+    :param server: Endpoint object of the server, with ip
+    :param client: Endpoint object of the client
+    :param test_type: "TCP_RR", "TCP_CRR" or "UDP_RR"
+    :param duration: seconds of the run
+    :param msg_size: bytes of every request and response
+    :param manage_server: start and stop the server around the run if True
+    :param port: port of the server, see NetperfBackend
+    :return: dict with test_type, server, client, duration, transactions
+             per second and mean, p50 and p99 latency in us
+    """
+    backend = get_backend("netperf")
+    if manage_server:
+        start_server(backend.name, server, port)
+    try:
+        begin = time.time()
+        output = client.cmd(backend.get_rr_cmd(
+            server.ip, duration, test_type, msg_size, port),
+            timeout=int(duration) + 60)
+        elapsed = time.time() - begin
+    finally:
+        if manage_server:
+            stop_server(backend.name, server)
+    LOG.debug("netperf output: %s", output)
+    result = {'test_type': test_type, 'server': server.name,
+              'client': client.name, 'duration': elapsed,
+              'msg_size': msg_size}
+    result.update(backend.parse_rr_output(output))
+    LOG.info("netperf %s %s -> %s: %.0f trans/s, latency mean %s us, "
+             "p99 %s us", test_type, client.name, server.name,
+             result['transactions'], result['mean_latency'],
+             result['p99_latency'])
+    return result
+
+
+def measure_from_params(params, server, client, **kwargs):
+    """
+    Measure the throughput with the settings in params
+
+    :param params: dict, get throughput_backend, throughput_duration,
+                   throughput_streams, throughput_protocol and
+                   throughput_msg_size
+    :param server: Endpoint object of the server
+    :param client: Endpoint object of the client
+    :param kwargs: overrides of the arguments of measure()
+    :return: dict of the result, see measure()
+    """
+    args = {'duration': int(params.get("throughput_duration", 10)),
+            'streams': int(params.get("throughput_streams", 1)),
+            'protocol': params.get("throughput_protocol", "tcp"),
+            'msg_size': params.get("throughput_msg_size")}
+    args.update(kwargs)
+    return measure(params.get("throughput_backend", "netperf"), server,
+                   client, **args)
+
+
+def save_results(results, path):
+    """
+    Save throughput results as a json file
+
+    :param results: list of dict got by measure()
+    :param path: path of the json file
+    """
+    with open(path, 'w') as result_file:
+        json.dump(results, result_file, indent=2)
+    LOG.debug("Throughput results are saved to %s", path)
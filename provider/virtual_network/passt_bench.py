@@ -0,0 +1,145 @@
+import json
+import logging
+
+from provider.virtual_network import network_throughput
+
+LOG = logging.getLogger('avocado.' + __name__)
+
+# metric -> (unit, whether a higher value is better)
+METRICS = {'tcp_throughput': ('Gbps', True),
+           'udp_throughput': ('Gbps', True),
+           'connection_rate': ('conn/s', True),
+           'rr_rate': ('trans/s', True),
+           'rr_latency': ('us', False),
+           'rr_latency_p99': ('us', False)}
+
+
+def measure_path(server, client, protocols=('tcp', 'udp'), backend='netperf',
+                 duration=10, port=None):
+    """
+    Measure all the metrics of one path
+
+    :param server: network_throughput.Endpoint object of the server, with
+                   the address the client reaches it by
+    :param client: network_throughput.Endpoint object of the client
+    :param protocols: protocols to measure the throughput of
+    :param backend: backend of the throughput test
+    :param duration: seconds of every run
+    :param port: port of the server, None for the default one
+    :return: dict, metric -> value
+    """
+    values = {}
+    for protocol in protocols:
+        result = network_throughput.measure(backend, server, client,
+                                            duration, protocol=protocol,
+                                            port=port)
+        values[f'{protocol}_throughput'] = result['gbps']
+    result = network_throughput.measure_rr(server, client, 'TCP_CRR',
+                                           duration, port=port)
+    values['connection_rate'] = result['transactions']
+    result = network_throughput.measure_rr(server, client, 'TCP_RR',
+                                           duration, port=port)
+    values['rr_rate'] = result['transactions']
+    values['rr_latency'] = result['mean_latency']
+    values['rr_latency_p99'] = result['p99_latency']
+    return values
+
+
+class BenchResults(object):
+    """
+    Results of passt and tap interfaces, and passt relative to tap
+
+    The relative value is the performance of passt over the one of tap,
+    i.e. the ratio of throughput or rate, and the inverse ratio of latency,
+    so it is below 1 whenever passt is slower.
+
+    Usage:
+    results = BenchResults()
+    results.add('passt', 'ipv4', 'host_to_vm', 'port_forward', values)
+    results.add('tap', 'ipv4', 'host_to_vm', 'direct', values)
+    results.log()
+    results.save(json_path)
+    """
+
+    def __init__(self):
+        self.results = []
+
+    def add(self, iface_type, ip_ver, direction, path, values):
+        """
+        Add the results of one path
+
+        :param iface_type: "passt" or "tap"
+        :param ip_ver: "ipv4" or "ipv6"
+        :param direction: "host_to_vm" or "vm_to_host"
+        :param path: "port_forward" or "direct"
+        :param values: dict, metric -> value, got by measure_path()
+        """
+        for metric, value in values.items():
+            result = {'iface_type': iface_type, 'ip_ver': ip_ver,
+                      'direction': direction, 'path': path,
+                      'metric': metric, 'value': value,
+                      'unit': METRICS[metric][0]}
+            LOG.debug("Benchmark result: %s", result)
+            self.results.append(result)
+
+    def get_comparison(self):
+        """
+        Compare passt with tap for every ip version, direction and metric
+
+        :return: list of dict with ip_ver, direction, metric, passt, tap
+                 and relative
+        """
+        values = {}
+        for result in self.results:
+            key = (result['ip_ver'], result['direction'], result['metric'])
+            values.setdefault(key, {})[result['iface_type']] = result['value']
+        comparison = []
+        for (ip_ver, direction, metric), value in values.items():
+            passt, tap = value.get('passt'), value.get('tap')
+            relative = None
+            if passt and tap:
+                relative = passt / tap if METRICS[metric][1] else tap / passt
+            comparison.append({'ip_ver': ip_ver, 'direction': direction,
+                               'metric': metric, 'passt': passt, 'tap': tap,
+                               'relative': relative})
+        return comparison
+
+    def get_violations(self, min_relative):
+        """
+        Get the comparisons where passt is too slow against tap
+
+        :param min_relative: float, min allowed relative value
+        :return: list of dict, see get_comparison()
+        """
+        return [item for item in self.get_comparison()
+                if item['relative'] is not None and
+                item['relative'] < min_relative]
+
+    def log(self):
+        """
+        Log the comparison as a table
+        """
+        LOG.info("  %-6s %-12s %-16s %-18s %-18s %-8s", 'ip', 'direction',
+                 'metric', 'passt', 'tap', 'relative')
+        for item in self.get_comparison():
+            unit = METRICS[item['metric']][0]
+            LOG.info("  %-6s %-12s %-16s %-18s %-18s %-8s", item['ip_ver'],
+                     item['direction'], item['metric'],
+                     "%.3f %s" % (item['passt'], unit)
+                     if item['passt'] is not None else None,
+                     "%.3f %s" % (item['tap'], unit)
+                     if item['tap'] is not None else None,
+                     "%.2f" % item['relative']
+                     if item['relative'] is not None else None)
+
+    def save(self, path):
+        """
+        Save the results and the comparison as a json file
+
+        :param path: path of the json file
+        """
+        with open(path, 'w') as result_file:
+            json.dump({'results': self.results,
+                       'comparison': self.get_comparison()},
+                      result_file, indent=2)
+        LOG.debug("Benchmark results are saved to %s", path)
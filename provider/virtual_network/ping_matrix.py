@@ -0,0 +1,236 @@
+import json
+import logging
+import re
+import threading
+import time
+
+from avocado.core import exceptions
+from avocado.utils import process
+
+LOG = logging.getLogger('avocado.' + __name__)
+
+OUTPUT_MARKER = "### ping_matrix"
+
+
+def get_ping_cmd(dest, count=3, deadline=15, interval=0.2, force_ipv4=True,
+                 interface=None, packetsize=None, ttl=None):
+    """
+    Get the ping command of one probe
+
+    With both count and deadline, ping exits as soon as count replies are
+    received, or when the deadline is reached.
+
+    :param dest: destination ip
+    :param count: number of replies to wait for
+    :param deadline: max seconds of the probe
+    :param interval: seconds between two echo requests
+    :param force_ipv4: whether to force ping with ipv4
+    :param interface: interface to ping from
+    :param packetsize: size of icmp payload
+    :param ttl: ip time to live
+    :return: str, ping command
+    """
+    command = "ping6" if ":" in dest else "ping"
+    command += " %s -c %s -w %s -i %s" % (dest, count, deadline, interval)
+    if interface:
+        command += " -I %s" % interface
+    if packetsize:
+        command += " -s %s" % packetsize
+    if ttl:
+        command += " -t %s" % ttl
+    if force_ipv4 and ":" not in dest:
+        command += " -4"
+    return command
+
+
+def parse_ping_output(output):
+    """
+    Parse the statistics of ping output
+
+    :param output: str, output of ping
+    :return: dict with transmitted, received, loss(%), rtt_min, rtt_avg,
+             rtt_max and rtt_mdev(ms), the rtt values are None without
+             any reply
+    """
+    stats = {'transmitted': 0, 'received': 0, 'loss': 100.0,
+             'rtt_min': None, 'rtt_avg': None, 'rtt_max': None,
+             'rtt_mdev': None}
+    match = re.search(r"(\d+) packets transmitted, (\d+) (?:packets )?"
+                      r"received", output)
+    if match:
+        stats['transmitted'] = int(match.group(1))
+        stats['received'] = int(match.group(2))
+    match = re.search(r"([\d.]+)% packet loss", output)
+    if match:
+        stats['loss'] = float(match.group(1))
+    match = re.search(r"= ([\d.]+)/([\d.]+)/([\d.]+)/([\d.]+) ms", output)
+    if match:
+        for key, value in zip(['rtt_min', 'rtt_avg', 'rtt_max', 'rtt_mdev'],
+                              match.groups()):
+            stats[key] = float(value)
+    return stats
+
+
+class PingMatrix(object):
+    """
+    Run the ping probes of a source x destination matrix concurrently
+
+    Every source runs all its probes at once in one shell command, either
+    in its session or on the host, and all the sources run in parallel.
+    A probe which is expected to pass exits as soon as it gets count
+    replies, a probe which is expected to fail runs until fail_deadline.
+
+    Usage:
+    matrix = PingMatrix({'vm': session})
+    matrix.add('vm', 'host', host_ip)
+    matrix.add('host', 'vm', vm_ip, expect_pass=False)
+    matrix.run()
+    matrix.log()
+    matrix.check()
+    """
+
+    def __init__(self, sessions=None, count=3, deadline=15, fail_deadline=5,
+                 interval=0.2, force_ipv4=True):
+        """
+        :param sessions: dict, source name -> session, the sources which
+                         are not in it ping from host
+        :param count: number of replies which make a probe pass
+        :param deadline: max seconds of a probe expected to pass
+        :param fail_deadline: seconds of a probe expected to fail
+        :param interval: seconds between two echo requests
+        :param force_ipv4: whether to force ping with ipv4
+        """
+        self.sessions = sessions or {}
+        self.count = count
+        self.deadline = deadline
+        self.fail_deadline = fail_deadline
+        self.interval = interval
+        self.force_ipv4 = force_ipv4
+        self.pairs = []
+        self.results = []
+
+    def add(self, source, destination, dest_ip, expect_pass=True,
+            **ping_args):
+        """
+        Add a probe to the matrix
+
+        :param source: source name
+        :param destination: destination name
+        :param dest_ip: destination ip
+        :param expect_pass: whether the ping is expected to pass
+        :param ping_args: interface, packetsize or ttl of the probe
+        """
+        deadline = self.deadline if expect_pass else self.fail_deadline
+        command = get_ping_cmd(dest_ip, self.count, deadline, self.interval,
+                               self.force_ipv4, **ping_args)
+        self.pairs.append({'source': source, 'destination': destination,
+                           'ip': dest_ip, 'expect_pass': expect_pass,
+                           'command': command, 'deadline': deadline})
+
+    def _run_source(self, source, pairs):
+        """
+        Run all the probes of a source at once and parse their results
+        """
+        probes = " ".join("(%s > $d/%s 2>&1) &" % (pair['command'], index)
+                          for index, pair in enumerate(pairs))
+        command = ("d=$(mktemp -d); %s wait; for i in $(seq 0 %s); do "
+                   "echo \"%s $i\"; cat $d/$i; done; rm -rf $d"
+                   % (probes, len(pairs) - 1, OUTPUT_MARKER))
+        timeout = max(pair['deadline'] for pair in pairs) + 30
+        begin = time.time()
+        session = self.sessions.get(source)
+        if session:
+            output = session.cmd_output(command, timeout=timeout)
+        else:
+            output = process.run(command, shell=True, timeout=timeout,
+                                 ignore_status=True).stdout_text
+        duration = time.time() - begin
+        outputs = re.split(r"^%s (\d+)$" % OUTPUT_MARKER, output,
+                           flags=re.M)[1:]
+        outputs = dict(zip(outputs[::2], outputs[1::2]))
+        for index, pair in enumerate(pairs):
+            probe_output = outputs.get(str(index), "")
+            LOG.debug("Ping from %s to %s: %s", source, pair['ip'],
+                      probe_output)
+            result = dict(pair)
+            result.update(parse_ping_output(probe_output))
+            result['reachable'] = result['received'] > 0
+            result['passed'] = result['reachable'] == pair['expect_pass']
+            result['source_duration'] = duration
+            self.results.append(result)
+
+    def run(self):
+        """
+        Run all the probes
+
+        :return: list of dict, the result of every probe
+        """
+        sources = {}
+        for pair in self.pairs:
+            sources.setdefault(pair['source'], []).append(pair)
+        self.results = []
+        errors = []
+
+        def _worker(source, pairs):
+            try:
+                self._run_source(source, pairs)
+            except Exception as detail:
+                errors.append(detail)
+
+        begin = time.time()
+        threads = [threading.Thread(target=_worker, args=(source, pairs))
+                   for source, pairs in sources.items()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise exceptions.TestError("Failed to run ping probes: %s"
+                                       % errors[0])
+        LOG.info("Ran %s ping probes from %s sources in %.2fs",
+                 len(self.pairs), len(sources), time.time() - begin)
+        return self.results
+
+    def get_failures(self):
+        """
+        Get the messages of the probes which do not meet expectation
+
+        :return: list of str
+        """
+        return ["Expect ping from %s to %s should %s, actual result is %s"
+                % (result['source'], result['destination'],
+                   "PASS" if result['expect_pass'] else "FAIL",
+                   "PASS" if result['reachable'] else "FAIL")
+                for result in self.results if not result['passed']]
+
+    def check(self):
+        """
+        Check all the probes meet expectation
+
+        :raise: TestFail if any probe does not meet expectation
+        """
+        failures = self.get_failures()
+        if failures:
+            raise exceptions.TestFail("; ".join(failures))
+
+    def log(self):
+        """
+        Log the results as a table, rtt in ms
+        """
+        LOG.info("  %-10s %-12s %-40s %-8s %-6s %-10s %-10s", 'source',
+                 'destination', 'ip', 'expect', 'loss', 'rtt_avg', 'rtt_max')
+        for result in self.results:
+            LOG.info("  %-10s %-12s %-40s %-8s %-6s %-10s %-10s",
+                     result['source'], result['destination'], result['ip'],
+                     "pass" if result['expect_pass'] else "fail",
+                     result['loss'], result['rtt_avg'], result['rtt_max'])
+
+    def save(self, path):
+        """
+        Save the results as a json file
+
+        :param path: path of the json file
+        """
+        with open(path, 'w') as result_file:
+            json.dump(self.results, result_file, indent=2)
+        LOG.debug("Ping results are saved to %s", path)
@@ -0,0 +1,175 @@
+import csv
+import json
+import logging
+
+from virttest import virsh
+
+LOG = logging.getLogger('avocado.' + __name__)
+
+VIRSH_ARGS = {'ignore_status': False, 'debug': True}
+
+
+def get_sweep_settings(averages, peak_ratio=2, burst=1024, floor_ratio=0):
+    """
+    Get the bandwidth settings of a sweep
+
+    :param averages: list of average rates in KiB/s
+    :param peak_ratio: peak rate over average rate
+    :param burst: burst size in KiB
+    :param floor_ratio: inbound floor over average rate, no floor if 0
+    :return: list of dict with inbound and outbound settings
+    """
+    settings = []
+    for average in averages:
+        bandwidth = {'average': str(average),
+                     'peak': str(int(average * peak_ratio)),
+                     'burst': str(burst)}
+        inbound = dict(bandwidth)
+        if floor_ratio:
+            inbound['floor'] = str(int(average * floor_ratio))
+        settings.append({'inbound': inbound, 'outbound': dict(bandwidth)})
+    return settings
+
+
+def set_bandwidth(vm_name, iface, setting):
+    """
+    Set the bandwidth of a live interface by domiftune
+
+    :param vm_name: name of the vm
+    :param iface: tap device or mac of the interface
+    :param setting: dict with inbound and outbound settings, see
+                    get_sweep_settings()
+    """
+    args = {}
+    for key in ('inbound', 'outbound'):
+        bandwidth = setting[key]
+        value = f'{bandwidth["average"]},{bandwidth["peak"]},' \
+                f'{bandwidth["burst"]}'
+        if key == 'inbound' and 'floor' in bandwidth:
+            value += f',{bandwidth["floor"]}'
+        args[key] = value
+    virsh.domiftune(vm_name, iface, **args, **VIRSH_ARGS)
+
+
+def get_expected_bps(bandwidth):
+    """
+    Get the expected throughput of a bandwidth setting
+
+    :param bandwidth: dict with average in KiB/s
+    :return: bits per second
+    """
+    return int(bandwidth['average']) * 1024 * 8
+
+
+class ShapingResults(object):
+    """
+    Achieved throughput and latency jitter under every shaping setting
+
+    Usage:
+    results = ShapingResults()
+    results.add(vm_name, 'inbound', bandwidth, throughput_result, ping)
+    results.log()
+    results.save(dir_path)
+    results.get_violations(0.1)
+    """
+    COLUMNS = ['vm', 'direction', 'average', 'peak', 'burst', 'floor',
+               'expected_mbps', 'actual_mbps', 'error', 'rtt_avg',
+               'jitter', 'loss', 'guests']
+
+    def __init__(self):
+        self.results = []
+
+    def add(self, vm_name, direction, bandwidth, throughput, ping=None,
+            guests=1):
+        """
+        Add the result of one guest under one setting
+
+        :param vm_name: name of the vm
+        :param direction: "inbound" or "outbound"
+        :param bandwidth: dict of the setting of the direction
+        :param throughput: dict got by network_throughput.measure()
+        :param ping: dict of the ping result got by ping_matrix.PingMatrix
+        :param guests: number of guests measured at the same time
+        """
+        expected = get_expected_bps(bandwidth)
+        result = {'vm': vm_name, 'direction': direction,
+                  'average': int(bandwidth['average']),
+                  'peak': int(bandwidth['peak']),
+                  'burst': int(bandwidth['burst']),
+                  'floor': int(bandwidth['floor'])
+                  if 'floor' in bandwidth else None,
+                  'expected_mbps': expected / 1e6,
+                  'actual_mbps': throughput['bps'] / 1e6,
+                  'error': (throughput['bps'] - expected) / expected,
+                  'rtt_avg': ping['rtt_avg'] if ping else None,
+                  'jitter': ping['rtt_mdev'] if ping else None,
+                  'loss': ping['loss'] if ping else None,
+                  'guests': guests}
+        LOG.debug("Shaping result: %s", result)
+        self.results.append(result)
+
+    def get_violations(self, max_error):
+        """
+        Get the results whose shaping error is over a limit
+
+        Results with a floor only fail when they get less than the floor.
+
+        :param max_error: float, allowed ratio of error
+        :return: list of dict
+        """
+        violations = []
+        for result in self.results:
+            if result['floor'] is not None:
+                floor_mbps = result['floor'] * 1024 * 8 / 1e6
+                if result['actual_mbps'] < floor_mbps * (1 - max_error):
+                    violations.append(result)
+            elif abs(result['error']) > max_error:
+                violations.append(result)
+        return violations
+
+    def log(self, width=40):
+        """
+        Log the results as a table, and the shaping error against the
+        configured rate as a text plot, one bar of "-" or "+" per result
+        with a scale of width for 100% error
+
+        :param width: characters of 100% error
+        """
+        LOG.info("  %-16s %-9s %-9s %-9s %-8s %-12s %-12s %-8s %-8s",
+                 'vm', 'direction', 'average', 'peak', 'floor',
+                 'expected', 'actual', 'error', 'jitter')
+        for result in self.results:
+            LOG.info("  %-16s %-9s %-9s %-9s %-8s %-12.2f %-12.2f %-8s %-8s",
+                     result['vm'], result['direction'], result['average'],
+                     result['peak'], result['floor'],
+                     result['expected_mbps'], result['actual_mbps'],
+                     "%+.1f%%" % (result['error'] * 100), result['jitter'])
+        for direction in ('inbound', 'outbound'):
+            results = sorted((result for result in self.results
+                              if result['direction'] == direction),
+                             key=lambda result: result['average'])
+            if not results:
+                continue
+            LOG.info("Shaping error of %s against average rate(KiB/s):",
+                     direction)
+            for result in results:
+                size = min(width, int(round(abs(result['error']) * width)))
+                bar = ('-' if result['error'] < 0 else '+') * size
+                LOG.info("  %10s %-16s %+7.1f%% |%s", result['average'],
+                         result['vm'], result['error'] * 100, bar)
+
+    def save(self, csv_path, json_path=None):
+        """
+        Save the results as csv, and optionally json
+
+        :param csv_path: path of the csv file
+        :param json_path: path of the json file
+        """
+        with open(csv_path, 'w', newline='') as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=self.COLUMNS)
+            writer.writeheader()
+            writer.writerows(self.results)
+        if json_path:
+            with open(json_path, 'w') as json_file:
+                json.dump(self.results, json_file, indent=2)
+        LOG.debug("Shaping results are saved to %s", csv_path)
@@ -1,5 +1,13 @@
+import os
+
 import nbd
 
+from avocado.utils import process
+
+from virttest import data_dir
+
+from provider.backup import nbd_reader
+
 
 def run(test, params, env):
     """
@@ -75,9 +83,49 @@ def run(test, params, env):
         if buf.is_zero(offset=6, size=2):
             test.fail('is_zero test failed: %s' % msg)
 
+    def test_parallel_read():
+        """
+        Read a sparse export over several connections
+
+        1) create a sparse nbd server by nbdkit
+        2) read the data extents of it over parallel connections
+        3) check only the data extents are read
+        4) check the content by qemu-img compare
+        """
+        image_size = int(params.get('image_size', 1073741824))
+        connections = int(params.get('nbd_connections', 4))
+        tmp_dir = data_dir.get_tmp_dir()
+        socket_path = os.path.join(tmp_dir, 'parallel_read.sock')
+        pid_file = os.path.join(tmp_dir, 'parallel_read.pid')
+        output_path = os.path.join(tmp_dir, 'parallel_read.raw')
+        uri = 'nbd+unix:///?socket=%s' % socket_path
+
+        process.run('nbdkit -r -U %s -P %s sparse-random size=%d'
+                    % (socket_path, pid_file, image_size), shell=True)
+        try:
+            reader = nbd_reader.ParallelNBDReader(uri, connections)
+            stats = reader.read_to_file(output_path)
+            test.log.info('Parallel read stats: %s', stats)
+            if stats['size'] != image_size:
+                test.fail('Read size %s, expected %s' %
+                          (stats['size'], image_size))
+            if not 0 < stats['bytes'] < image_size:
+                test.fail('Read %s bytes, expected only the data extents '
+                          'of %s bytes' % (stats['bytes'], image_size))
+            process.run('qemu-img compare -f raw -F raw %s "%s"'
+                        % (output_path, uri), shell=True)
+        finally:
+            process.run('kill $(cat %s)' % pid_file, shell=True,
+                        ignore_status=True)
+            for path in (output_path, pid_file):
+                if os.path.exists(path):
+                    os.remove(path)
+
     if checkpoint == 'get_size':
         test_get_size()
     elif checkpoint == 'is_zero':
         test_is_zero()
+    elif checkpoint == 'parallel_read':
+        test_parallel_read()
     else:
         test.error('Not found testcase: %s' % checkpoint)